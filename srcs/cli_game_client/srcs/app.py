@@ -20,14 +20,16 @@ class LobbyScreen(Screen):
         yield Footer()
 
     def on_mount(self):
-        self.polling_task = self.set_interval(2.0, self.poll_room)
-
-    async def poll_room(self):
-        result = await self.app.services.game.check_room(self.app.room_code)
-        if result.get("player_count") == 2:
-            self.polling_task.stop()
-            pongGameScreen = PongGameScreen()
-            self.app.switch_screen(pongGameScreen)
+        self.lobby = self.app.services.game.watch_room(self.app.room_code, self.on_room_status)
+
+    def on_room_status(self, status):
+        # Called from the lobby socket's thread
+        if status.get("player_count") == 2:
+            self.lobby.close()
+            self.app.call_from_thread(lambda: self.app.switch_screen(PongGameScreen()))
+        elif status.get("type") == "room_closed":
+            self.lobby.close()
+            self.app.call_from_thread(self.query_one("#lobbyMessage", Label).update, "Room closed")
            
 
 
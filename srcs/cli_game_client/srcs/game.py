@@ -29,16 +29,27 @@ class BallWidget(Static):
 
 
 
+# Paddle keys and the key_event direction they map to
+KEY_DIRECTIONS = {
+    "a": "up", "up": "up",
+    "q": "down", "down": "down",
+}
+
+
 class PaddleKeyHandler:
     def __init__(self, delay_ms=400):
         self._delay = delay_ms / 1000
         self._pressed_keys: dict[str, float] = {}  # tracks active keys
 
-    def key_pressed(self, key: str):
+    def key_pressed(self, key: str) -> bool:
+        """Returns True if the key was not already held"""
         now = time.monotonic()
+        newly_pressed = key not in self._pressed_keys
         self._pressed_keys[key] = now
+        return newly_pressed
 
-    def release_expired_keys(self):
+    def release_expired_keys(self) -> list[str]:
+        """Release keys not repeated within the delay; returns the released keys"""
         now = time.monotonic()
         keys_to_release = []
         for key, pressed_time in self._pressed_keys.items():
@@ -48,6 +59,8 @@ class PaddleKeyHandler:
         for key in keys_to_release:
             del self._pressed_keys[key]
 
+        return keys_to_release
+
     def is_key_pressed(self, key: str) -> bool:
         return key in self._pressed_keys
 
@@ -99,19 +112,24 @@ class PongGameScreen(Screen):
         self.update_time = self.set_interval(0.01, self.update_game)
 
     def update_game(self):
-        self.key_handler.release_expired_keys()
+        released_keys = self.key_handler.release_expired_keys()
 
-        active_keys = list(self.key_handler._pressed_keys.keys())
-        direction_map = {
-            "a": -1, "q": 1,
-            "up": -1, "down": 1
-        }
+        if self.game.uses_key_input():
+            # The server moves the paddle; only tell it when a key is let go
+            for key in released_keys:
+                self.game.send_keypress(KEY_DIRECTIONS[key], False)
+        else:
+            active_keys = list(self.key_handler._pressed_keys.keys())
+            direction_map = {
+                "a": -1, "q": 1,
+                "up": -1, "down": 1
+            }
 
-        # Move paddle continuously based on currently "pressed" keys
-        for key in active_keys:
-            if key in direction_map:
-                direction = direction_map[key]
-                self.game.move_paddle(direction * 10)  # Adjust movement scalar as needed
+            # Move paddle continuously based on currently "pressed" keys
+            for key in active_keys:
+                if key in direction_map:
+                    direction = direction_map[key]
+                    self.game.move_paddle(direction * 10)  # Adjust movement scalar as needed
 
 
         state = self.game.get_game_state()
@@ -143,9 +161,9 @@ class PongGameScreen(Screen):
         # if key in direction_map:
         #     direction = direction_map[key]
             # self.game.move_paddle(direction * 25)
-        if key in ["a", "q", "up", "down"]:
-            
-            self.key_handler.key_pressed(key)
+        if key in KEY_DIRECTIONS:
+            if self.key_handler.key_pressed(key) and self.game.uses_key_input():
+                self.game.send_keypress(KEY_DIRECTIONS[key], True)
 
     def handle_game_over(self, data):
         self.update_time.stop()
@@ -163,6 +181,8 @@ import websocket
 import time
 import ssl
 
+from srcs.protocol import decode_state_frame
+
 VERIFY_HTTP_CERTIFICATE = False
 
 class OnlinePongService:
@@ -198,7 +218,7 @@ class OnlinePongService:
 
     def connect(self):
         print("Connect Pong Online Service")
-        url = f"{self.server_url}/ws/game/{self.room_code}/?token=${self.token}"
+        url = f"{self.server_url}/ws/game/{self.room_code}/?proto=bin&token=${self.token}"
         self.ws = websocket.WebSocketApp(
             url,
             on_message=self.on_message,
@@ -229,7 +249,10 @@ class OnlinePongService:
         print(f"[WS] Error: {error}")
 
     def on_message(self, ws, message):
-        data = json.loads(message)
+        if isinstance(message, bytes):
+            data = decode_state_frame(message)
+        else:
+            data = json.loads(message)
         event_type = data.get("type")
 
         if event_type in ("game_state", "game_state_delta"):
@@ -261,7 +284,12 @@ class OnlinePongService:
             self.ws.send(json.dumps(payload))
 
     def send_keypress(self, key, is_pressed):
-        {"type":"key_event","key":key,"is_down": is_pressed,"player_number":self.player_number,"timestamp":int(time.time() * 1000)}
+        if self.player_number:
+            self.send({"type":"key_event","key":key,"is_down": is_pressed,"player_number":self.player_number,"timestamp":int(time.time() * 1000)})
+
+    def uses_key_input(self):
+        """True when the server integrates paddle motion from key events"""
+        return self.last_state.get("input_mode") == "keys"
 
     def move_paddle(self, position_delta):
         if self.player_number:
@@ -0,0 +1,59 @@
+import struct
+
+# Binary game state frames sent by pong_game when connecting with ?proto=bin.
+# Must stay in sync with pong_game/app/game/protocol.py.
+
+FRAME_HEADER = struct.Struct("<BBHI")
+ACKS = struct.Struct("<II")
+FLAG_FULL_STATE = 1
+FLAG_INPUT_ACKS = 2
+
+NUMERIC_FIELDS = (
+    "status",
+    "player_1_score",
+    "player_2_score",
+    "player_1_paddle_y",
+    "player_2_paddle_y",
+    "ball_x",
+    "ball_y",
+    "ball_speed_x",
+    "ball_speed_y",
+    "is_paused",
+    "last_loser",
+)
+
+STATUS_NAMES = ("WAITING", "ONGOING", "FINISHED")
+
+
+def decode_state_frame(frame: bytes) -> dict:
+    """Decode a binary game state frame into a game_state_delta message."""
+    _, flags, mask, tick = FRAME_HEADER.unpack_from(frame)
+    count = bin(mask).count("1")
+    values = iter(struct.unpack_from(f"<{count}f", frame, FRAME_HEADER.size))
+
+    message = {
+        "type": "game_state_delta",
+        "is_full_state": bool(flags & FLAG_FULL_STATE),
+        "tick": tick,
+    }
+
+    for index, name in enumerate(NUMERIC_FIELDS):
+        if mask >> index & 1:
+            message[name] = next(values)
+
+    if "status" in message:
+        code = int(message["status"])
+        message["status"] = STATUS_NAMES[code] if 0 <= code < len(STATUS_NAMES) else None
+    for name in ("player_1_score", "player_2_score"):
+        if name in message:
+            message[name] = int(message[name])
+    if "is_paused" in message:
+        message["is_paused"] = bool(message["is_paused"])
+    if "last_loser" in message:
+        message["last_loser"] = int(message["last_loser"]) or None
+
+    if flags & FLAG_INPUT_ACKS:
+        player_1_ack, player_2_ack = ACKS.unpack_from(frame, FRAME_HEADER.size + 4 * count)
+        message["input_acks"] = {"1": player_1_ack, "2": player_2_ack}
+
+    return message
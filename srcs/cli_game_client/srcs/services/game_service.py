@@ -1,5 +1,9 @@
 import os
+import ssl
+import json
+import threading
 import httpx
+import websocket
 from .auth_service import AuthService
 
 
@@ -51,3 +55,13 @@ class GameService:
                 headers=self._get_headers()
             )
             return response.json()
+
+    def watch_room(self, room_code: str, on_status):
+        """Call on_status with every status the room's lobby socket pushes; returns the socket"""
+        ws = websocket.WebSocketApp(
+            f"{self.app.config.ws_url}/ws/lobby/{room_code}/",
+            on_message=lambda ws, message: on_status(json.loads(message))
+        )
+        kwargs = {} if self.app.config.verify_cert else {"sslopt": {"cert_reqs": ssl.CERT_NONE}}
+        threading.Thread(target=ws.run_forever, kwargs=kwargs, daemon=True).start()
+        return ws
@@ -8,6 +8,7 @@ export class GameHistoryComponent extends Component {
         super();
 
         this.gameHistory = [];
+        this.hasMore = false;
     }
 
     static async create() {
@@ -26,11 +27,28 @@ export class GameHistoryComponent extends Component {
 
         gameHistoryProvider.historyStream.listen((history) => {
             this.gameHistory = history;
+            this.hasMore = gameHistoryProvider.hasMore;
             this.updateComponent();
         });
         gameHistoryProvider.updateHistory();
     }
 
+    _onRefresh()
+    {
+        const loadMoreButton = document.getElementById('loadMoreGamesButton');
+        if (!loadMoreButton) return;
+
+        loadMoreButton.removeEventListener('click', this._loadMoreHandler);
+        this._loadMoreHandler = () => {
+            loadMoreButton.disabled = true;
+            GameHistoryProvider.getInstance().loadMore().catch((error) => {
+                console.error("Failed to load more games:", error);
+                loadMoreButton.disabled = false;
+            });
+        };
+        loadMoreButton.addEventListener('click', this._loadMoreHandler);
+    }
+
     _getComponentHtml() {
         return `
         		<h3 class="text-center">Game History</h3>
@@ -62,6 +80,11 @@ export class GameHistoryComponent extends Component {
 						</tbody>
 					</table>
 				</div>
+				${this.hasMore ? `
+				<div class="text-center">
+					<button id="loadMoreGamesButton" class="btn btn-outline-secondary btn-sm">Load more</button>
+				</div>
+				` : ''}
         `
     }
 }
\ No newline at end of file
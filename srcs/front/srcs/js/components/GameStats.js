@@ -1,13 +1,14 @@
 import { Component } from "../core/Component.js";
-import { GameHistoryProvider } from "../data/providers/GameHistoryProvider.js";
+import { BackendApi } from "../data/api/backendApi.js";
 import { MyProfileProvider } from "../data/providers/MyProfileProvider.js"
 
 export class GameStatsComponent extends Component {
     constructor() {
         super();
 
-        this.win_count = 0;
-        this.lose_count = 0;
+        this._backend = new BackendApi();
+        this.userId = null;
+        this.stats = null;
     }
 
     static async create() {
@@ -17,33 +18,42 @@ export class GameStatsComponent extends Component {
     }
 
     async init() {
-        let gameHistoryProvider = GameHistoryProvider.getInstance();
-        gameHistoryProvider.historyStream.listen((history) => {
-            this.updateWinLoseCounts(history);
-            this.updateComponent();
+        let myProfileProvider = MyProfileProvider.getInstance();
+        myProfileProvider.userProfileStream.listen((profile) => {
+            if (profile && profile.userId && profile.userId !== this.userId) {
+                this.userId = profile.userId;
+                this.updateStats();
+            }
         });
-        gameHistoryProvider.updateHistory();
     }
 
-    updateWinLoseCounts(gameHistory) {
-        this.win_count = 0;
-        this.lose_count = 0;
+    async updateStats() {
+        try {
+            this.stats = await this._backend.getUserStats(this.userId);
+        } catch (error) {
+            console.error("Failed to load stats:", error);
+            return;
+        }
+        this.updateComponent();
+    }
 
-        gameHistory.forEach((game) => {
-            if (game.result) {
-                this.win_count++;
-            } else {
-                this.lose_count++;
-            }
-        });
+    _formatStreak(streak) {
+        if (streak > 0) return `${streak}W`;
+        if (streak < 0) return `${-streak}L`;
+        return "-";
     }
 
     _getComponentHtml() {
+        const stats = this.stats ?? {};
+
         return `
             <div class="stats-box">
                 <h3>Stats</h3>
-                <p><strong>Wins:</strong> ${this.win_count}</p>
-                <p><strong>Losses:</strong> ${this.lose_count}</p>
+                <p><strong>Wins:</strong> ${stats.wins ?? 0}</p>
+                <p><strong>Losses:</strong> ${stats.losses ?? 0}</p>
+                <p><strong>Points:</strong> ${stats.points_for ?? 0} - ${stats.points_against ?? 0}</p>
+                <p><strong>Streak:</strong> ${this._formatStreak(stats.current_streak ?? 0)}</p>
+                <p><strong>Best streak:</strong> ${stats.best_streak ?? 0}</p>
             </div>
         `;
     }
@@ -0,0 +1,65 @@
+// Binary game state frames sent by pong_game when connecting with ?proto=bin.
+// Must stay in sync with pong_game/app/game/protocol.py.
+//
+//   header   kind (u8), flags (u8), changed-field mask (u16), server tick (u32)
+//   body     one little-endian float32 per bit set in the mask, in NUMERIC_FIELDS order
+//   acks     with FLAG_INPUT_ACKS: last applied input sequence of player 1 and 2 (u32 each)
+
+export const NUMERIC_FIELDS = [
+    'status',
+    'player_1_score',
+    'player_2_score',
+    'player_1_paddle_y',
+    'player_2_paddle_y',
+    'ball_x',
+    'ball_y',
+    'ball_speed_x',
+    'ball_speed_y',
+    'is_paused',
+    'last_loser',
+];
+
+const HEADER_SIZE = 8;
+const FLAG_FULL_STATE = 1;
+const FLAG_INPUT_ACKS = 2;
+const STATUS_NAMES = ['WAITING', 'ONGOING', 'FINISHED'];
+
+export function decodeStateFrame(buffer) {
+    const view = new DataView(buffer);
+    const flags = view.getUint8(1);
+    const mask = view.getUint16(2, true);
+
+    const message = {
+        type: 'game_state_delta',
+        is_full_state: (flags & FLAG_FULL_STATE) !== 0,
+        tick: view.getUint32(4, true),
+    };
+
+    let offset = HEADER_SIZE;
+    NUMERIC_FIELDS.forEach((name, index) => {
+        if (mask & (1 << index)) {
+            message[name] = view.getFloat32(offset, true);
+            offset += 4;
+        }
+    });
+
+    if ('status' in message) {
+        message.status = STATUS_NAMES[message.status] || null;
+    }
+    if ('is_paused' in message) {
+        message.is_paused = message.is_paused !== 0;
+    }
+    if ('last_loser' in message) {
+        message.last_loser = message.last_loser || null;
+    }
+    if (flags & FLAG_INPUT_ACKS) {
+        message.input_acks = {
+            '1': view.getUint32(offset, true),
+            '2': view.getUint32(offset + 4, true),
+        };
+    }
+
+    return message;
+}
+
+export default decodeStateFrame;
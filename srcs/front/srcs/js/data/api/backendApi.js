@@ -98,8 +98,14 @@ export class BackendApi {
 	}
 
 	// ==== Game ====
-	async getUserGameHistory() {
-		const response = await this._httpClient.get("api/game/list/", {});
+	async getUserGameHistory(cursor = null) {
+		const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+		const response = await this._httpClient.get(`api/game/list/${query}`, {});
+		return response.json()
+	}
+
+	async getUserStats(userId) {
+		const response = await this._httpClient.get(`api/users/${userId}/stats/`, {});
 		return response.json()
 	}
 
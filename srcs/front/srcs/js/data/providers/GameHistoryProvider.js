@@ -19,6 +19,7 @@ export class GameHistoryProvider {
     constructor() {
         this._backend = new BackendApi();
         this._history = Stream.withDefault([]);
+        this._nextCursor = null;
     }
 
     async init() {
@@ -29,10 +30,32 @@ export class GameHistoryProvider {
         return this._history;
     }
 
+    get hasMore() {
+        return this._nextCursor !== null;
+    }
+
     async updateHistory() {
         let rawHistoryData = await this._backend.getUserGameHistory();
 
-        let gameHistory = rawHistoryData.games.map((game) => {
+        this._nextCursor = rawHistoryData.next_cursor ?? null;
+        this._history.value = this._formatGames(rawHistoryData.games);
+        return this._history.value;
+    }
+
+    async loadMore() {
+        if (!this.hasMore) {
+            return this._history.value;
+        }
+
+        let rawHistoryData = await this._backend.getUserGameHistory(this._nextCursor);
+
+        this._nextCursor = rawHistoryData.next_cursor ?? null;
+        this._history.value = [...this._history.value, ...this._formatGames(rawHistoryData.games)];
+        return this._history.value;
+    }
+
+    _formatGames(games) {
+        return games.map((game) => {
             const formattedDate = new Date(game.game_date).toLocaleString('en-US', {
                 year: 'numeric',
                 month: 'long',
@@ -51,9 +74,6 @@ export class GameHistoryProvider {
                 result: game.PlayerA_isWinner
             });
         });
-
-        this._history.value = gameHistory;
-        return this._history.value;
     }
 
     static getInstance() {
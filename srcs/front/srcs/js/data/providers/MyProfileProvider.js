@@ -4,13 +4,15 @@ import { MockedBackendApi } from "../api/mockedBackendApi.js";
 
 
 
-function createProfile({ username = null, avatarUrl = "", friendList = [] } = {}) {
+function createProfile({ userId = null, username = null, avatarUrl = "", friendList = [] } = {}) {
 	return {
+		userId,
 		username,
 		avatarUrl,
 		friendList,
 		copyWith: function (updates) {
 			return createProfile({
+				userId: updates.userId ?? this.userId,
 				username: updates.username ?? this.username,
 				avatarUrl: updates.avatarUrl ?? this.avatarUrl,
 				friendList: updates.friendList ?? this.friendList,
@@ -157,6 +159,7 @@ export class MyProfileProvider {
 		let rawFriendList = await this._backend.getFriendList();
 
 		let userData = {
+			userId: rawUserData.id,
 			username: rawUserData.nickname,
 			avatarUrl: rawUserData.avatar_url ?? "/public/avatars/default/peng_head_def.webp",
 			friendList: rawFriendList.friends.map((friend) => {
@@ -168,6 +171,7 @@ export class MyProfileProvider {
 			})
 		};
 		this._userProfile.value = createProfile({
+			userId: userData.userId,
 			username: userData.username,
 			avatarUrl: userData.avatarUrl,
 			friendList: userData.friendList
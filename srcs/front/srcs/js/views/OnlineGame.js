@@ -1,6 +1,7 @@
 import AbstractView from "./AbstractView.js";
 import Game from "./Game.js";
 import GameConstants from "../core/GameConstants.js";
+import { decodeStateFrame } from "../core/StateProtocol.js";
 import { RouterService } from "../services/router/RouterService.js";
 import CONFIG from "../config.js";
 
@@ -30,6 +31,7 @@ class SimpleWebSocket {
 
         try {
             this.socket = new WebSocket(this.url);
+            this.socket.binaryType = 'arraybuffer';
 
             this.socket.onopen = (event) => {
                 this.isConnecting = false;
@@ -41,7 +43,9 @@ class SimpleWebSocket {
 
             this.socket.onmessage = (event) => {
                 try {
-                    const data = JSON.parse(event.data);
+                    const data = event.data instanceof ArrayBuffer ?
+                        decodeStateFrame(event.data) :
+                        JSON.parse(event.data);
 
                     if (data.type === 'ping') {
                         this.socket.send(JSON.stringify({
@@ -192,6 +196,10 @@ export default class OnlineGame extends Game {
         this.accumulator = 0;
 
         this._lastSentPosition = null;
+        this.inputSequence = 0;
+        this.ackedSequence = 0;
+        this.pendingInputs = [];
+        this.inputMode = 'position';
         this._lastStatusUpdate = 0;
         this._lastDebugUpdate = 0;
         this._lastMessageTime = 0;
@@ -419,9 +427,9 @@ export default class OnlineGame extends Game {
     initializeSocket() {
         const token = this.getAuthToken();
 
-        let wsUrl = `${CONFIG.APP_URL.replace(/^http/, "ws")}/ws/game/${this.roomCode}/`;
+        let wsUrl = `${CONFIG.APP_URL.replace(/^http/, "ws")}/ws/game/${this.roomCode}/?proto=bin`;
         if (token) {
-            wsUrl += `?token=${encodeURIComponent(token)}`;
+            wsUrl += `&token=${encodeURIComponent(token)}`;
         }
 
         this.socket = new SimpleWebSocket(wsUrl, {
@@ -508,12 +516,25 @@ export default class OnlineGame extends Game {
         const input = {
             key,
             is_down: isDown,
-            player_number: this.playerNumber
+            player_number: this.playerNumber,
+            sequence: this.nextInputSequence()
         };
 
         this.socket.send('key_event', input);
     }
 
+    nextInputSequence() {
+        const sequence = ++this.inputSequence;
+
+        // Inputs the server has not acknowledged yet, oldest first
+        this.pendingInputs.push(sequence);
+        if (this.pendingInputs.length > 64) {
+            this.pendingInputs.shift();
+        }
+
+        return sequence;
+    }
+
     gameLoop(timestamp) {
         if (this.gameOver) return;
 
@@ -568,6 +589,9 @@ export default class OnlineGame extends Game {
     update(deltaTime) {
         this.interpolateOpponentPaddle();
 
+        // In 'keys' mode the server moves paddles from key events alone
+        if (this.inputMode === 'keys') return;
+
         const now = Date.now();
         if (now - this.lastPaddleUpdate > this.paddleUpdateRate) {
             this.sendPaddlePosition();
@@ -620,6 +644,7 @@ export default class OnlineGame extends Game {
 
     handleGameState(data) {
         this.serverState = { ...data };
+        this.inputMode = data.input_mode || this.inputMode;
 
         this.player1Score = data.player_1_score;
         this.player2Score = data.player_2_score;
@@ -646,14 +671,18 @@ export default class OnlineGame extends Game {
         this.paused = data.is_paused;
         this.lastLoser = data.last_loser;
 
+        // While some of our inputs are unacknowledged the server's paddle is
+        // behind the local one, so only correct drift once it has caught up
+        const inputsPending = this.pendingInputs.length > 0;
+
         if (this.playerNumber === 1) {
             const serverY = data.player_1_paddle_y;
-            if (Math.abs(this.player1Y - serverY) > 20) {
+            if (!inputsPending && Math.abs(this.player1Y - serverY) > 20) {
                 this.player1Y = this.player1Y * 0.8 + serverY * 0.2;
             }
         } else if (this.playerNumber === 2) {
             const serverY = data.player_2_paddle_y;
-            if (Math.abs(this.player2Y - serverY) > 20) {
+            if (!inputsPending && Math.abs(this.player2Y - serverY) > 20) {
                 this.player2Y = this.player2Y * 0.8 + serverY * 0.2;
             }
         } else {
@@ -763,8 +792,13 @@ export default class OnlineGame extends Game {
             return;
         }
 
+        if (data.input_acks && this.playerNumber) {
+            this.ackedSequence = data.input_acks[this.playerNumber] || this.ackedSequence;
+            this.pendingInputs = this.pendingInputs.filter((sequence) => sequence > this.ackedSequence);
+        }
+
         Object.entries(data).forEach(([key, value]) => {
-            if (key !== 'type' && key !== 'timestamp' && key !== 'is_full_state') {
+            if (key !== 'type' && key !== 'timestamp' && key !== 'is_full_state' && key !== 'input_acks') {
                 this.serverState[key] = value;
             }
         });
@@ -1038,7 +1072,8 @@ export default class OnlineGame extends Game {
 
         this.socket.send('paddle_position', {
             player_number: this.playerNumber,
-            position: position
+            position: position,
+            sequence: this.nextInputSequence()
         });
     }
 
@@ -10,7 +10,7 @@ export default class StartGame extends AbstractView {
 	constructor() {
 		super();
 		this.setTitle("StartGame");
-		this.pollingInterval = null;
+		this.lobbySocket = null;
 		this.eventsAttached = false;
 		this._isCreatingGame = false;
 		
@@ -62,6 +62,7 @@ export default class StartGame extends AbstractView {
 			this.roomCodeInput = await super.loadElement("roomCodeInput");
 			this.roomCodeDisplay = await super.loadElement("roomCodeDisplay");
 			this.closeWaitingModal = await super.loadElement("closeWaitingModal");
+			this.quickMatchButton = await super.loadElement("quickMatchButton");
 		} catch (e) {
 			console.error("Error loading elements:", e);
 		}
@@ -157,12 +158,21 @@ export default class StartGame extends AbstractView {
 			}
 		}
 
+		if(this.quickMatchButton) {
+			this.quickMatchButton.addEventListener('click', (e) => {
+				e.preventDefault();
+
+				if (this.matchmakingSocket) {
+					this.stopQuickMatch();
+				} else {
+					this.startQuickMatch();
+				}
+			});
+		}
+
 		if(this.closeWaitingModal) {
 			this.closeWaitingModal.addEventListener('click', () => {
-				if (this.pollingInterval) {
-					clearInterval(this.pollingInterval);
-					this.pollingInterval = null;
-				}
+				this.stopWatchingRoom();
 
 				const roomCode = localStorage.getItem('current_room_code');
 				if (roomCode) {
@@ -271,7 +281,7 @@ export default class StartGame extends AbstractView {
                     modalSubtext.innerHTML = `Share this code with your opponent: <strong>${data.room_code}</strong>`;
                 }
 
-                this.pollForSecondPlayer(data.room_code);
+                this.watchForSecondPlayer(data.room_code);
             } else {
                 console.error("Error creating room:", data.error);
                 alert(`Error creating room: ${data.error}`);
@@ -466,18 +476,8 @@ export default class StartGame extends AbstractView {
 		}
 	}
 
-	pollForSecondPlayer(roomCode) {
-        if(this.pollingInterval) {
-            clearInterval(this.pollingInterval);
-        }
-
-        let pollCount = 0;
-        let lastPlayerCount = 1;
-
-        const authToken = this.getAuthToken();
-
-        let errorCount = 0;
-        let pollInterval = 2000;
+	watchForSecondPlayer(roomCode) {
+        this.stopWatchingRoom();
 
         const updateWaitingText = (seconds) => {
             const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
@@ -492,112 +492,92 @@ export default class StartGame extends AbstractView {
         let waitingSeconds = 0;
         updateWaitingText(waitingSeconds);
 
-        const waitingTimer = setInterval(() => {
+        this.waitingTimer = setInterval(() => {
             waitingSeconds++;
             updateWaitingText(waitingSeconds);
         }, 1000);
 
-        this.pollingInterval = setInterval(async () => {
-            try {
-                pollCount++;
+        this.connectLobby(roomCode, 0);
+    }
 
-                const headers = {};
-                if (authToken) {
-                    headers['Authorization'] = `Bearer ${authToken}`;
-                }
+    connectLobby(roomCode, errorCount) {
+        const socket = new WebSocket(`${CONFIG.APP_URL.replace(/^http/, "ws")}/ws/lobby/${roomCode}/`);
+        this.lobbySocket = socket;
 
-                const response = await fetch(`${CONFIG.API_URL}/api/room/check/${roomCode}/`, {
-                    method: 'GET',
-                    headers: headers,
-                    credentials: 'include',
-                    mode: 'cors'
-                });
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            errorCount = 0;
 
-                if (!response.ok) {
-                    throw new Error(`HTTP error ${response.status}`);
+            if (data.type === 'room_status' && data.player_2_id) {
+                this.stopWatchingRoom();
+
+                const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
+                if (waitingText) {
+                    waitingText.innerHTML = '<i class="bi bi-controller"></i> Player found! Starting game...';
                 }
 
-                const data = await response.json();
+                const spinner = document.querySelector('#waiting_modal .spinner-border');
+                if (spinner) {
+                    spinner.className = 'text-success';
+                    spinner.innerHTML = '<i class="bi bi-check-circle" style="font-size: 3rem;"></i>';
+                }
 
-                if(data.success) {
-                    errorCount = 0;
+                const roomCodeDisplay = document.querySelector('#roomCodeDisplay');
+                if (roomCodeDisplay) {
+                    roomCodeDisplay.classList.add('bg-success', 'text-white');
+                    setTimeout(() => {
+                        roomCodeDisplay.classList.remove('bg-success', 'text-white');
+                    }, 500);
+                }
 
-                    if (data.player_count > lastPlayerCount) {
-                        const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
-                        if (waitingText) {
-                            waitingText.innerHTML = '<i class="bi bi-person-check"></i> Player found! Starting game...';
-                        }
+                setTimeout(() => {
+                    this.cleanupModalsBeforeNavigation();
+                    RouterService.getInstance().navigateTo('/online-game?room=' + roomCode);
+                }, 800);
+            } else if (data.type === 'room_closed') {
+                this.stopWatchingRoom();
 
-                        const spinner = document.querySelector('#waiting_modal .spinner-border');
-                        if (spinner) {
-                            spinner.className = 'text-success';
-                            spinner.innerHTML = '<i class="bi bi-check-circle" style="font-size: 3rem;"></i>';
-                        }
-                    }
+                alert("Room no longer exists. Please create a new room.");
 
-                    lastPlayerCount = data.player_count;
-
-                    if(data.player_2_id) {
-                        clearInterval(this.pollingInterval);
-                        clearInterval(waitingTimer);
-                        this.pollingInterval = null;
-
-                        const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
-                        if (waitingText) {
-                            waitingText.innerHTML = '<i class="bi bi-controller"></i> Player found! Starting game...';
-                        }
-
-                        const roomCodeDisplay = document.querySelector('#roomCodeDisplay');
-                        if (roomCodeDisplay) {
-                            roomCodeDisplay.classList.add('bg-success', 'text-white');
-                            setTimeout(() => {
-                                roomCodeDisplay.classList.remove('bg-success', 'text-white');
-                            }, 500);
-                        }
-
-                        setTimeout(() => {
-                            this.cleanupModalsBeforeNavigation();
-                            RouterService.getInstance().navigateTo('/online-game?room=' + roomCode);
-                        }, 800);
-                    }
-                } else {
-
-                    if (data.error && data.error.includes("not found")) {
-                        clearInterval(this.pollingInterval);
-                        clearInterval(waitingTimer);
-                        this.pollingInterval = null;
-
-                        alert("Room no longer exists. Please create a new room.");
-
-                        try {
-                            const modalInstance = bootstrap.Modal.getInstance(document.getElementById('waiting_modal'));
-                            if (modalInstance) {
-                                modalInstance.hide();
-                            }
-                        } catch (e) {
-                            console.error("Error closing modal:", e);
-                        }
+                try {
+                    const modalInstance = bootstrap.Modal.getInstance(document.getElementById('waiting_modal'));
+                    if (modalInstance) {
+                        modalInstance.hide();
                     }
+                } catch (e) {
+                    console.error("Error closing modal:", e);
                 }
-            } catch (error) {
-                errorCount++;
-
-                if (errorCount > 3) {
-                    console.log("Multiple errors detected, slowing down polling");
-                    clearInterval(this.pollingInterval);
-                    pollInterval = 5000;
+            }
+        };
 
-                    this.pollingInterval = setInterval(() => {
-                        this.pollForSecondPlayer(roomCode);
-                    }, pollInterval);
+        socket.onclose = () => {
+            if (this.lobbySocket !== socket) return;
 
-                    const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
-                    if (waitingText) {
-                        waitingText.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Connection issues. Still waiting...';
-                    }
+            errorCount++;
+            if (errorCount > 3) {
+                const waitingText = document.querySelector('#waiting_modal .fw-bold:not(.modal-title)');
+                if (waitingText) {
+                    waitingText.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Connection issues. Still waiting...';
                 }
             }
-        }, pollInterval);
+
+            this.lobbyReconnect = setTimeout(() => {
+                this.connectLobby(roomCode, errorCount);
+            }, errorCount > 3 ? 5000 : 1000);
+        };
+    }
+
+    stopWatchingRoom() {
+        clearInterval(this.waitingTimer);
+        clearTimeout(this.lobbyReconnect);
+        this.waitingTimer = null;
+        this.lobbyReconnect = null;
+
+        const socket = this.lobbySocket;
+        this.lobbySocket = null;
+        if (socket) {
+            socket.close();
+        }
     }
 
 	getAuthToken() {
@@ -681,6 +661,64 @@ export default class StartGame extends AbstractView {
 		}
 	}
 	
+	startQuickMatch() {
+		const token = this.getAuthToken();
+		if (!token) {
+			alert("Please sign in to use quick match.");
+			return;
+		}
+
+		const wsUrl = `${CONFIG.APP_URL.replace(/^http/, "ws")}/ws/matchmaking/?token=${encodeURIComponent(token)}`;
+		const socket = new WebSocket(wsUrl);
+		this.matchmakingSocket = socket;
+
+		this.quickMatchButton.textContent = "SEARCHING... (CANCEL)";
+
+		socket.onopen = () => {
+			socket.send(JSON.stringify({ type: 'join_queue' }));
+		};
+
+		socket.onmessage = (event) => {
+			const data = JSON.parse(event.data);
+
+			if (data.type === 'match_found') {
+				localStorage.setItem('current_room_code', data.room_code);
+				localStorage.setItem('current_player_number', data.player_number.toString());
+				localStorage.setItem('current_player_id', data.player_id);
+
+				this.stopQuickMatch();
+				this.cleanupModalsBeforeNavigation();
+				takeMeThere(location.origin + '/online-game?room=' + data.room_code);
+			} else if (data.type === 'error') {
+				alert("Quick match failed: " + data.message);
+				this.stopQuickMatch();
+			}
+		};
+
+		socket.onclose = () => {
+			if (this.matchmakingSocket === socket) {
+				this.matchmakingSocket = null;
+				this.quickMatchButton.textContent = "QUICK MATCH";
+			}
+		};
+	}
+
+	stopQuickMatch() {
+		const socket = this.matchmakingSocket;
+		this.matchmakingSocket = null;
+
+		if (socket) {
+			if (socket.readyState === WebSocket.OPEN) {
+				socket.send(JSON.stringify({ type: 'leave_queue' }));
+			}
+			socket.close();
+		}
+
+		if (this.quickMatchButton) {
+			this.quickMatchButton.textContent = "QUICK MATCH";
+		}
+	}
+
 	_cleanupLocalGameState() {
 		localStorage.removeItem('current_room_code');
 		localStorage.removeItem('current_player_number');
@@ -790,6 +828,13 @@ export default class StartGame extends AbstractView {
                                         </div>
                                     </div>
                                 </div>
+                                <div class="row my-3 p-4">
+                                    <div class="col">
+                                        <div class="d-grid gap-2">
+                                            <button id="quickMatchButton" class="btn btn-lg p-3 blackie startpage-btn" type="button">QUICK MATCH</button>
+                                        </div>
+                                    </div>
+                                </div>
                                 <div class="row my-3 p-4">
                                     <div class="col">
                                         <div class="input-group mb-3">
@@ -0,0 +1,31 @@
+#!/bin/sh
+# Generates the pong_game upstream with one server per daphne worker.
+# Rooms are routed by code with the same consistent hash the workers use
+# (app/game/sharding.py), so both sockets of a room reach its owner.
+
+set -e
+
+PONG_WORKER_COUNT=${PONG_WORKER_COUNT:-1}
+PONG_WORKER_HOST=${PONG_WORKER_HOST:-pong-game}
+PONG_BASE_PORT=${PONG_BASE_PORT:-8000}
+
+OUTPUT=/etc/nginx/conf.d/pong-upstream.conf
+
+{
+    echo 'map $uri $pong_room {'
+    echo '    ~^/ws/game/(?<room>\w+)/ $room;'
+    echo '    ~^/api/room/(?:check|owner)/(?<room>\w+)/ $room;'
+    echo '    default $request_id;'
+    echo '}'
+    echo
+    echo 'upstream pong_game {'
+    echo '    hash $pong_room consistent;'
+    i=0
+    while [ "$i" -lt "$PONG_WORKER_COUNT" ]; do
+        echo "    server $PONG_WORKER_HOST:$((PONG_BASE_PORT + i));"
+        i=$((i + 1))
+    done
+    echo '}'
+} > "$OUTPUT"
+
+echo "$0: Generated $OUTPUT with $PONG_WORKER_COUNT pong_game worker(s)"
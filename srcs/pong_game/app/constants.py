@@ -6,6 +6,8 @@ CANVAS_HEIGHT = 600
 PADDLE_WIDTH = 12
 PADDLE_HEIGHT = 120
 PADDLE_SPEED = 12
+# PADDLE_SPEED is in pixels per frame at this rate, the rate clients render at
+PADDLE_SPEED_RATE = 60
 
 # Ball properties
 BALL_SIZE = 20
@@ -17,6 +19,12 @@ SPEED_INCREASE_FACTOR = 1.02
 RUBBER_BAND_FACTOR = 0.98
 ANGLE_LIMIT = 0.75
 
+# Fixed-timestep physics: speeds are expressed in pixels per step at PHYSICS_RATE
+PHYSICS_RATE = 30
+MAX_SUBSTEP_DISTANCE = BALL_SIZE / 2
+MAX_SUBSTEPS = 8
+MAX_PHYSICS_CATCHUP = 0.25
+
 # Game rules
 WINNING_SCORE = 10
 
@@ -1,3 +1,6 @@
 from .game import GameConsumer
+from .replay import ReplayConsumer
+from .matchmaking import MatchmakingConsumer
+from .lobby import LobbyConsumer
 
-__all__ = ['GameConsumer']
+__all__ = ['GameConsumer', 'ReplayConsumer', 'MatchmakingConsumer', 'LobbyConsumer']
@@ -0,0 +1,57 @@
+import logging
+from urllib.parse import parse_qs
+import jwt
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JwtAuthMixin:
+    """Query string and JWT helpers shared by the WebSocket consumers"""
+
+    def get_token_from_scope(self):
+        """Extract token from query string or cookies"""
+        query_string = self.scope.get('query_string', b'').decode('utf-8')
+        cookies = self.scope.get('cookies', {})
+
+        if 'token=' in query_string:
+            token = query_string.split('token=')[1].split('&')[0]
+            return token
+
+        return cookies.get('access_token')
+
+    def get_query_param(self, name):
+        """Read a single query string parameter"""
+        query_string = self.scope.get('query_string', b'').decode('utf-8')
+        values = parse_qs(query_string).get(name)
+        return values[0] if values else None
+
+    async def authenticate_user(self):
+        """Authenticate user with JWT token"""
+        if not self.token:
+            logger.warning("Authentication attempted with no token")
+            return None
+
+        try:
+            payload = jwt.decode(
+                self.token,
+                settings.SECRET_KEY,
+                algorithms=["HS256"]
+            )
+
+            user_id = payload.get('user_id')
+            username = payload.get('username')
+
+            if not user_id:
+                logger.warning("Token missing user_id")
+                return None
+
+            logger.info(f"Authentication successful for user {user_id}")
+            return {
+                'user_id': user_id,
+                'username': username or f"Player-{user_id}"
+            }
+
+        except jwt.PyJWTError as e:
+            logger.error(f"JWT authentication failed: {str(e)}")
+            return None
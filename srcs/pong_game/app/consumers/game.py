@@ -1,17 +1,25 @@
-import json
 import asyncio
+import json
 import logging
+import math
 import random
 import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from ..game.manager import GameManager
-from ..constants import SERVER_UPDATE_RATE
-import jwt
+from ..game.fanout import RoomBroadcaster
+from ..game.sharding import ShardRouter
+from ..game.actions import player_fields
+from ..game.protocol import encode_state_text
+from ..game.inputs import TokenBucket, InputQueue, paddle_position_value, serve_speed_values
+from ..game.recovery import RecoveryManager
+from ..game.netcode import LatencyEstimator, input_sequence
+from ..game.results import ResultOutbox
+from .auth import JwtAuthMixin
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-class GameConsumer(AsyncWebsocketConsumer):
+class GameConsumer(JwtAuthMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for the Pong game.
     """
@@ -25,10 +33,14 @@ class GameConsumer(AsyncWebsocketConsumer):
         self.player_id = None
         self.username = None
 
-        self.game_loop_task = None
-        self.last_sent_state = None
-        
         self.token = self.get_token_from_scope()
+        self.binary_protocol = self.get_query_param('proto') == 'bin'
+        self.is_spectator = self.get_query_param('role') == 'spectator'
+        if self.is_spectator:
+            self.room_group_name = f'spectate_{self.room_code}'
+        self.rate_limiter = TokenBucket(settings.GAME_INPUT_RATE, settings.GAME_INPUT_BURST)
+        self.latency = LatencyEstimator()
+        self.ping_task = None
 
         logger.info(f"WebSocket connection attempt to room {self.room_code}")
 
@@ -39,23 +51,39 @@ class GameConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        game = GameManager.get_game(self.room_code)
+        if self.is_spectator:
+            await RoomBroadcaster.register_spectator(self.room_code, self)
+        else:
+            await RoomBroadcaster.register(self.room_code, self)
+
+        ShardRouter.ensure_inbox()
+        ResultOutbox.ensure_started()
+        await RecoveryManager.wait_ready()
+        await ShardRouter.aclaim(self.room_code)
+
+        game = await GameManager.aget_game(self.room_code, refresh=not ShardRouter.is_local(self.room_code))
         if game:
             await self.send_full_game_state(game)
+        elif self.is_spectator:
+            await self.send_error("Room not found")
+            await self.close()
+            return
         else:
             game = GameManager.create_game(self.room_code)
             await self.send_full_game_state(game)
 
+        if not self.is_spectator:
+            self.ping_task = asyncio.create_task(self.ping_loop())
+
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         logger.info(f"WebSocket disconnection from room {self.room_code} with code {close_code}")
 
-        if self.game_loop_task:
-            self.game_loop_task.cancel()
-            try:
-                await self.game_loop_task
-            except asyncio.CancelledError:
-                pass
+        if self.ping_task:
+            self.ping_task.cancel()
+
+        if self.rate_limiter.dropped:
+            logger.info(f"Dropped {self.rate_limiter.dropped} rate-limited frames from {self.player_id} in room {self.room_code}")
 
         if self.player_number:
             GameManager.update_player_session(self.room_code, self.player_id, connected=False)
@@ -70,10 +98,15 @@ class GameConsumer(AsyncWebsocketConsumer):
                 }
             )
 
-            game = GameManager.get_game(self.room_code)
-            if game and game.status == 'ONGOING' and not game.is_paused:
-                game.is_paused = True
-                GameManager.save_game(game)
+            await ShardRouter.dispatch(self.room_code, 'release_keys', player_number=self.player_number)
+            await ShardRouter.dispatch(
+                self.room_code, 'pause', player_number=self.player_number, announce=False
+            )
+
+        if self.is_spectator:
+            await RoomBroadcaster.unregister_spectator(self.room_code, self)
+        else:
+            await RoomBroadcaster.unregister(self.room_code, self)
 
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -82,12 +115,22 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         """Handle incoming WebSocket messages"""
+        if not self.rate_limiter.allow():
+            InputQueue.record_rate_limited()
+            if self.rate_limiter.dropped == 1:
+                logger.warning(f"Rate limiting WebSocket frames from {self.player_id} in room {self.room_code}")
+            return
+
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
 
             logger.debug(f"Received message of type {message_type}")
 
+            if self.is_spectator and message_type != 'pong':
+                await self.send_error("Spectators cannot send game commands")
+                return
+
             if message_type == 'join_game':
                 await self.handle_join_game(data)
             elif message_type == 'key_event':
@@ -99,7 +142,7 @@ class GameConsumer(AsyncWebsocketConsumer):
             elif message_type == 'resume_game':
                 await self.handle_resume_game(data)
             elif message_type == 'pong':
-                pass  # Simplified: ignore pong messages
+                self.handle_pong(data)
             else:
                 await self.send_error(f"Unknown message type: {message_type}")
 
@@ -109,47 +152,6 @@ class GameConsumer(AsyncWebsocketConsumer):
             logger.exception("Error in receive")
             await self.send_error(f"Server error: {str(e)}")
 
-    def get_token_from_scope(self):
-        """Extract token from query string or cookies"""
-        query_string = self.scope.get('query_string', b'').decode('utf-8')
-        cookies = self.scope.get('cookies', {})
-
-        if 'token=' in query_string:
-            token = query_string.split('token=')[1].split('&')[0]
-            return token
-
-        return cookies.get('access_token')
-
-    async def authenticate_user(self):
-        """Authenticate user with JWT token"""
-        if not self.token:
-            logger.warning("Authentication attempted with no token")
-            return None
-
-        try:
-            payload = jwt.decode(
-                self.token,
-                settings.SECRET_KEY,
-                algorithms=["HS256"]
-            )
-
-            user_id = payload.get('user_id')
-            username = payload.get('username')
-
-            if not user_id:
-                logger.warning("Token missing user_id")
-                return None
-
-            logger.info(f"Authentication successful for user {user_id}")
-            return {
-                'user_id': user_id,
-                'username': username or f"Player-{user_id}"
-            }
-
-        except jwt.PyJWTError as e:
-            logger.error(f"JWT authentication failed: {str(e)}")
-            return None
-
     async def handle_join_game(self, data):
         """Handle player joining the game"""
         player_id = data.get('player_id')
@@ -173,7 +175,9 @@ class GameConsumer(AsyncWebsocketConsumer):
         
         logger.info(f"Player joining with username: {self.username}")
 
-        game = GameManager.get_game(self.room_code)
+        is_owner = ShardRouter.is_local(self.room_code)
+
+        game = await GameManager.aget_game(self.room_code, refresh=not is_owner)
         if not game:
             logger.info(f"Creating new game for room {self.room_code}")
             game = GameManager.create_game(self.room_code)
@@ -192,6 +196,9 @@ class GameConsumer(AsyncWebsocketConsumer):
         
         # Save the updated game state
         GameManager.save_game(game)
+
+        if not is_owner:
+            await ShardRouter.dispatch(self.room_code, 'sync_players', fields=player_fields(game))
         
         # Log the current game state usernames for debugging
         logger.info(f"Game state usernames - Player 1: {game.player_1_username}, Player 2: {game.player_2_username}")
@@ -211,22 +218,14 @@ class GameConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             {
                 'type': 'game_state_update',
-                'delta': game.to_dict(),
-                'sequence': 0,
-                'is_full_state': True
+                'text': encode_state_text(game.to_dict(), is_full_state=True)
             }
         )
 
         await self.send_full_game_state(game)
 
-        if (game.player_1_id and game.player_2_id and
-            game.status != 'FINISHED' and not self.game_loop_task):
-
-            game.status = 'ONGOING'
-            GameManager.save_game(game)
-
-            logger.info(f"Starting game loop for room {self.room_code}")
-            self.game_loop_task = asyncio.create_task(self.game_loop())
+        if game.player_1_id and game.player_2_id and game.status != 'FINISHED':
+            await ShardRouter.dispatch(self.room_code, 'start')
 
     async def handle_key_event(self, data):
         """Handle keyboard input from clients"""
@@ -234,236 +233,92 @@ class GameConsumer(AsyncWebsocketConsumer):
             return
 
         key = data.get('key', '').lower()
-        is_down = data.get('is_down', False)
+        is_down = bool(data.get('is_down', False))
         player_number = data.get('player_number')
 
         if player_number != self.player_number:
             return
 
-        game = GameManager.get_game(self.room_code)
-        if not game:
-            return
-
-        if self.player_number == 1:
-            if key in ('w', 'arrowup'):
-                game.player_1_moving_up = is_down
-            elif key in ('s', 'arrowdown'):
-                game.player_1_moving_down = is_down
-        elif self.player_number == 2:
-            if key in ('w', 'arrowup'):
-                game.player_2_moving_up = is_down
-            elif key in ('s', 'arrowdown'):
-                game.player_2_moving_down = is_down
-
-        GameManager.save_game(game)
+        await ShardRouter.dispatch(
+            self.room_code, 'key_event', player_number=self.player_number, key=key, is_down=is_down,
+            sequence=input_sequence(data.get('sequence')), rtt=self.latency.rtt
+        )
 
     async def handle_paddle_position(self, data):
         """
         Handle paddle position updates from clients
         """
-        if not self.player_number:
+        if not self.player_number or settings.GAME_INPUT_MODE == 'keys':
             return
 
         player_number = data.get('player_number')
-        position = data.get('position')
+        position = paddle_position_value(data.get('position'))
 
         # Basic validation - player can only update their own paddle
-        if player_number != self.player_number:
+        if player_number != self.player_number or position is None:
             return
 
-        game = GameManager.get_game(self.room_code)
-        if not game:
-            return
-
-        # Validate the position is within bounds
-        if position < 0:
-            position = 0
-        elif position > game.canvas_height - game.paddle_height:
-            position = game.canvas_height - game.paddle_height
-
-        # Update the game state with the validated client position
-        if player_number == 1:
-            game.player_1_paddle_y = position
-        elif player_number == 2:
-            game.player_2_paddle_y = position
+        await ShardRouter.dispatch(
+            self.room_code, 'paddle_position', player_number=self.player_number, position=position,
+            sequence=input_sequence(data.get('sequence')), rtt=self.latency.rtt
+        )
 
-        GameManager.save_game(game)
+    def handle_pong(self, data):
+        """Update the round-trip estimate from the echo of one of our pings"""
+        sent_at = data.get('time')
+        if type(sent_at) in (int, float) and math.isfinite(sent_at):
+            self.latency.update(time.time() * 1000 - sent_at)
+
+    async def ping_loop(self):
+        """Ping the client every GAME_PING_INTERVAL seconds to measure its round trip"""
+        while True:
+            await self.send(text_data=json.dumps({
+                'type': 'ping',
+                'time': time.time() * 1000,
+                'rtt': self.latency.rtt
+            }))
+            await asyncio.sleep(settings.GAME_PING_INTERVAL)
 
     async def handle_pause_game(self, data):
         """Handle game pause request"""
         if not self.player_number:
             return
 
-        game = GameManager.get_game(self.room_code)
-        if not game:
-            return
-
-        game.is_paused = True
-        GameManager.save_game(game)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'game_paused',
-                'player_number': self.player_number
-            }
-        )
+        await ShardRouter.dispatch(self.room_code, 'pause', player_number=self.player_number)
 
     async def handle_resume_game(self, data):
         """Handle game resume request"""
         if not self.player_number:
             return
 
-        game = GameManager.get_game(self.room_code)
-        if not game:
-            return
-
         ball_speed_x = data.get('ball_speed_x', None)
         ball_speed_y = data.get('ball_speed_y', None)
 
-        game.is_paused = False
-
-        if ball_speed_x is not None and ball_speed_y is not None:
-            game.ball_speed_x = ball_speed_x
-            game.ball_speed_y = ball_speed_y
-        elif game.ball_speed_x == 0 and game.ball_speed_y == 0:
-            game.resume_ball()
-
-        GameManager.save_game(game)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'game_resumed',
-                'player_number': self.player_number,
-                'ball_speed_x': game.ball_speed_x,
-                'ball_speed_y': game.ball_speed_y
-            }
+        # Without a serve the server picks one; a malformed one drops the resume
+        if ball_speed_x is not None or ball_speed_y is not None:
+            serve = serve_speed_values(ball_speed_x, ball_speed_y)
+            if serve is None:
+                return
+            ball_speed_x, ball_speed_y = serve
+
+        await ShardRouter.dispatch(
+            self.room_code, 'resume',
+            player_number=self.player_number,
+            ball_speed_x=ball_speed_x,
+            ball_speed_y=ball_speed_y
         )
 
-    async def game_loop(self):
-        """Main game loop with fixed update rate"""
-        try:
-            frame_duration = 1 / SERVER_UPDATE_RATE
-
-            while True:
-                loop_start = time.time()
-
-                game = GameManager.get_game(self.room_code)
-                if not game or game.status == 'FINISHED':
-                    break
-
-                changed = False
-                if not game.is_paused:
-                    scorer = game.update()
-                    changed = True
-
-                    if scorer > 0:
-                        await self.handle_goal_scored(game, scorer)
-
-                    winner = game.check_for_winner()
-                    if winner > 0:
-                        await self.handle_game_over(game, winner)
-                        break
-
-                if changed:
-                    GameManager.save_game(game)
-
-                new_state = game.to_dict()
-                
-                if self.last_sent_state:
-                    delta = GameManager.calculate_state_delta(self.last_sent_state, new_state)
-                    
-                    if len(delta) > 2:
-                        await self.channel_layer.group_send(
-                            self.room_group_name,
-                            {
-                                'type': 'game_state_update',
-                                'delta': delta
-                            }
-                        )
-                        self.last_sent_state = new_state
-                else:
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'game_state_update',
-                            'delta': new_state,
-                            'is_full_state': True
-                        }
-                    )
-                    self.last_sent_state = new_state
-
-                elapsed = time.time() - loop_start
-                sleep_time = max(0, frame_duration - elapsed)
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            logger.exception("Error in game loop")
-
-    async def handle_goal_scored(self, game, scorer):
-        """Handle goal scored event"""
-        player_1_username = game.player_1_username or "Player 1"
-        player_2_username = game.player_2_username or "Player 2"
-        
-        logger.info(f"Goal scored by player {scorer} ({player_1_username if scorer == 1 else player_2_username})")
-        
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'goal_scored',
-                'scorer': scorer,
-                'player_1_score': game.player_1_score,
-                'player_2_score': game.player_2_score,
-                'player_1_username': player_1_username,
-                'player_2_username': player_2_username,
-                'timestamp': time.time() * 1000
-            }
-        )
-
-    async def handle_game_over(self, game, winner):
-        """Handle game over event and record game result"""
-        game.status = 'FINISHED'
-        GameManager.save_game(game)
-        
-        player_1_username = game.player_1_username or "Player 1"
-        player_2_username = game.player_2_username or "Player 2"
-        
-        winner_username = player_1_username if winner == 1 else player_2_username
-        logger.info(f"Game over - Winner: Player {winner} ({winner_username})")
-        
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'game_over',
-                'winner': winner,
-                'player_1_score': game.player_1_score,
-                'player_2_score': game.player_2_score,
-                'player_1_username': player_1_username,
-                'player_2_username': player_2_username,
-                'timestamp': time.time() * 1000
-            }
-        )
-        
-        try:
-            logger.info(f"Recording game result for room {self.room_code}")
-            await GameManager.record_game_result(game)
-        except Exception as e:
-            logger.error(f"Failed to record game result: {str(e)}")
-
     async def send_full_game_state(self, game):
         """Send full game state to the client"""
         state_dict = game.to_dict()
-        self.last_sent_state = state_dict
-        
+
         logger.info(f"Sending full game state with usernames - P1: {state_dict.get('player_1_username')}, P2: {state_dict.get('player_2_username')}")
 
         await self.send(text_data=json.dumps({
             'type': 'game_state',
             'is_full_state': True,
+            'input_mode': settings.GAME_INPUT_MODE,
+            'role': 'spectator' if self.is_spectator else 'player',
             **state_dict
         }))
 
@@ -475,16 +330,18 @@ class GameConsumer(AsyncWebsocketConsumer):
         }))
 
     async def game_state_update(self, event):
-        """Handle game state update from channel layer"""
-        delta = event['delta']
-        is_full_state = event.get('is_full_state', False)
-
-        if 'type' not in delta:
-            delta['type'] = 'game_state_delta'
+        """Forward a pre-encoded game state update"""
+        if RoomBroadcaster.is_local_origin(event):
+            return
 
-        delta['is_full_state'] = is_full_state
+        if self.binary_protocol and event.get('bytes'):
+            await self.send(bytes_data=event['bytes'])
+        else:
+            await self.send(text_data=event['text'])
 
-        await self.send(text_data=json.dumps(delta))
+    async def spectator_state(self, event):
+        """Forward a spectator-tier keyframe"""
+        await self.game_state_update(event)
 
     async def player_joined(self, event):
         """Handle player_joined message from channel layer"""
@@ -511,6 +368,9 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     async def game_paused(self, event):
         """Handle game_paused message from channel layer"""
+        if RoomBroadcaster.is_local_origin(event):
+            return
+
         await self.send(text_data=json.dumps({
             'type': 'game_paused',
             'player_number': event['player_number'],
@@ -519,6 +379,9 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     async def game_resumed(self, event):
         """Handle game_resumed message from channel layer"""
+        if RoomBroadcaster.is_local_origin(event):
+            return
+
         await self.send(text_data=json.dumps({
             'type': 'game_resumed',
             'player_number': event['player_number'],
@@ -529,6 +392,9 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     async def goal_scored(self, event):
         """Handle goal_scored message from channel layer"""
+        if RoomBroadcaster.is_local_origin(event):
+            return
+
         await self.send(text_data=json.dumps({
             'type': 'goal_scored',
             'scorer': event['scorer'],
@@ -541,6 +407,9 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     async def game_over(self, event):
         """Handle game_over message from channel layer"""
+        if RoomBroadcaster.is_local_origin(event):
+            return
+
         await self.send(text_data=json.dumps({
             'type': 'game_over',
             'winner': event['winner'],
@@ -548,5 +417,10 @@ class GameConsumer(AsyncWebsocketConsumer):
             'player_2_score': event['player_2_score'],
             'player_1_username': event.get('player_1_username'),
             'player_2_username': event.get('player_2_username'),
+            'replay_id': event.get('replay_id'),
             'timestamp': event['timestamp']
         }))
+
+    async def room_members_changed(self, event):
+        """Another socket joined or left this room on some worker"""
+        RoomBroadcaster.mark_stale(event['room_code'])
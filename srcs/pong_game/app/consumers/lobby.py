@@ -0,0 +1,53 @@
+import json
+import logging
+from channels.generic.websocket import AsyncWebsocketConsumer
+from ..game.manager import GameManager
+from ..game.sharding import ShardRouter
+from ..game.lobby import RoomLobby, lobby_group
+
+logger = logging.getLogger(__name__)
+
+
+class LobbyConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for a room's waiting lobby.
+
+    Sends the room status on connect, then again whenever a player joins,
+    the game starts or the room is closed. Clients only listen.
+    """
+
+    async def connect(self):
+        """Subscribe to the room's status and send the current one"""
+        self.room_code = self.scope['url_route']['kwargs']['room_code']
+        self.group_name = lobby_group(self.room_code)
+
+        await self.accept()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        game = await GameManager.aget_game(self.room_code, refresh=not ShardRouter.is_local(self.room_code))
+        if game:
+            await self.room_status({'type': 'room_status', **RoomLobby.status(game)})
+        else:
+            await self.room_closed({'type': 'room_closed', 'room_code': self.room_code})
+
+    async def disconnect(self, close_code):
+        """Unsubscribe from the room's status"""
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        """The lobby is push-only"""
+        pass
+
+    async def room_status(self, event):
+        """Forward a room status change"""
+        await self.send(text_data=json.dumps({**event, 'success': True}))
+
+    async def room_closed(self, event):
+        """Tell the client the room is gone and stop"""
+        await self.send(text_data=json.dumps({
+            'type': 'room_closed',
+            'success': False,
+            'room_code': event['room_code'],
+            'error': 'Room not found'
+        }))
+        await self.close()
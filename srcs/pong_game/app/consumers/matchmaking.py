@@ -0,0 +1,104 @@
+import json
+import logging
+from channels.generic.websocket import AsyncWebsocketConsumer
+from ..game.manager import REDIS_AVAILABLE, async_redis_client
+from ..game.matchmaking import Matchmaker, match_key, player_group
+from .auth import JwtAuthMixin
+
+logger = logging.getLogger(__name__)
+
+
+class MatchmakingConsumer(JwtAuthMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for the matchmaking queue.
+
+    Authenticated players send join_queue / leave_queue; the room of their
+    match is pushed to them as match_found. Closing the socket leaves the queue.
+    """
+
+    async def connect(self):
+        """Authenticate the player and subscribe to their match notifications"""
+        self.player_id = None
+        self.queued = False
+        self.token = self.get_token_from_scope()
+
+        await self.accept()
+
+        user_info = await self.authenticate_user()
+        if not user_info or not REDIS_AVAILABLE:
+            await self.send_error("Matchmaking requires a signed-in player")
+            await self.close()
+            return
+
+        self.player_id = str(user_info['user_id'])
+        self.username = user_info['username']
+
+        await self.channel_layer.group_add(player_group(self.player_id), self.channel_name)
+
+        room_code = await async_redis_client.get(match_key(self.player_id))
+        if room_code:
+            await self.send(text_data=json.dumps({'type': 'match_pending', 'room_code': room_code}))
+
+    async def disconnect(self, close_code):
+        """Leave the queue"""
+        if not self.player_id:
+            return
+
+        if self.queued:
+            await Matchmaker.dequeue(self.player_id)
+
+        await self.channel_layer.group_discard(player_group(self.player_id), self.channel_name)
+
+    async def receive(self, text_data):
+        """Handle queue commands"""
+        if not self.player_id:
+            return
+
+        try:
+            data = json.loads(text_data)
+            message_type = data.get('type')
+
+            if message_type == 'join_queue':
+                rating = await Matchmaker.fetch_rating(self.player_id)
+                queue_size = await Matchmaker.enqueue(self.player_id, data.get('username') or self.username, rating)
+                self.queued = True
+
+                await self.send(text_data=json.dumps({
+                    'type': 'queue_joined',
+                    'rating': rating,
+                    'queue_size': queue_size
+                }))
+            elif message_type == 'leave_queue':
+                await Matchmaker.dequeue(self.player_id)
+                self.queued = False
+
+                await self.send(text_data=json.dumps({'type': 'queue_left'}))
+            elif message_type == 'pong':
+                pass
+            else:
+                await self.send_error(f"Unknown message type: {message_type}")
+
+        except json.JSONDecodeError:
+            await self.send_error("Invalid JSON format")
+        except Exception as e:
+            logger.exception("Error in matchmaking receive")
+            await self.send_error(f"Server error: {str(e)}")
+
+    async def send_error(self, message):
+        """Send error message to the client"""
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'message': message
+        }))
+
+    async def match_found(self, event):
+        """Push a match created by any worker's pairing pass"""
+        self.queued = False
+
+        await self.send(text_data=json.dumps({
+            'type': 'match_found',
+            'room_code': event['room_code'],
+            'player_number': event['player_number'],
+            'player_id': event['player_id'],
+            'opponent': event['opponent']
+        }))
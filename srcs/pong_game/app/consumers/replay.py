@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import struct
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from ..game.replay import ReplayReader
+from ..game.protocol import decode_state_frame
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer streaming a saved replay at its recorded pace.
+
+    Query parameters: speed (playback rate), tick (start tick) and proto=bin
+    for binary frames. Clients control playback with seek, speed, pause and
+    play messages.
+    """
+
+    async def connect(self):
+        """Open the replay and start streaming it"""
+        self.replay_id = self.scope['url_route']['kwargs']['replay_id']
+        self.playback = None
+        self.reader = None
+
+        query = parse_qs(self.scope['query_string'].decode())
+        self.binary_protocol = query.get('proto', [None])[0] == 'bin'
+        self.speed = self.parse_speed(query.get('speed', [1])[0])
+        self.playing = asyncio.Event()
+        self.playing.set()
+
+        try:
+            self.reader = await ReplayReader.aopen(self.replay_id)
+        except (OSError, ValueError, struct.error):
+            await self.close(code=4404)
+            return
+
+        await self.accept()
+
+        await self.send(text_data=json.dumps({
+            'type': 'replay_info',
+            **self.reader.header,
+            'keyframe_ticks': self.reader.keyframe_ticks
+        }))
+
+        self.start_playback(self.parse_tick(query.get('tick', [None])[0]))
+
+    async def disconnect(self, close_code):
+        """Stop streaming and close the replay file"""
+        if self.playback:
+            self.playback.cancel()
+        if self.reader:
+            self.reader.close()
+
+    async def receive(self, text_data):
+        """Handle playback control messages"""
+        try:
+            data = json.loads(text_data)
+            message_type = data.get('type')
+
+            if message_type == 'seek':
+                self.start_playback(self.parse_tick(data.get('tick')))
+            elif message_type == 'speed':
+                self.speed = self.parse_speed(data.get('speed'))
+            elif message_type == 'pause':
+                self.playing.clear()
+            elif message_type == 'play':
+                self.playing.set()
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON received: {text_data}")
+
+    def parse_speed(self, value):
+        try:
+            speed = float(value)
+        except (TypeError, ValueError):
+            return 1.0
+        return min(max(speed, 0.25), settings.GAME_REPLAY_MAX_SPEED)
+
+    def parse_tick(self, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def start_playback(self, from_tick):
+        if self.playback:
+            self.playback.cancel()
+        self.playback = asyncio.get_running_loop().create_task(self.play(from_tick))
+
+    async def play(self, from_tick):
+        """
+        Send frames from the keyframe before from_tick, catching up to
+        from_tick at once and then sleeping between frames by the recorded
+        tick gap divided by the playback speed.
+        """
+        frame_duration = 1 / self.reader.header['tick_rate']
+        previous = None
+
+        try:
+            async for tick, frame in self.reader.aframes(from_tick):
+                if previous is not None and (from_tick is None or tick > from_tick):
+                    await asyncio.sleep((tick - previous) * frame_duration / self.speed)
+                await self.playing.wait()
+                previous = tick
+
+                if self.binary_protocol:
+                    await self.send(bytes_data=frame)
+                else:
+                    await self.send(text_data=json.dumps(decode_state_frame(frame)))
+
+            await self.send(text_data=json.dumps({'type': 'replay_end', 'tick': previous}))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception(f"Error streaming replay {self.replay_id}")
@@ -0,0 +1,181 @@
+import logging
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .manager import GameManager
+from .scheduler import RoomScheduler
+from .inputs import InputQueue, paddle_position_value, serve_speed_values
+from .fanout import RoomBroadcaster
+from .lobby import RoomLobby
+from .recovery import RecoveryManager
+from .netcode import Netcode
+
+logger = logging.getLogger(__name__)
+
+PLAYER_FIELDS = (
+    'player_1_id', 'player_2_id', 'player_1_username', 'player_2_username', 'status',
+)
+
+
+def player_fields(game):
+    """The room metadata a non-owner worker may change, for sync_players"""
+    return {name: getattr(game, name) for name in PLAYER_FIELDS}
+
+
+class RoomActions:
+    """
+    Commands that change a room's simulation state.
+
+    These only ever run on the worker that owns the room (see ShardRouter),
+    either directly from a local consumer or after being forwarded from
+    another worker, so the owner's GameState stays the single writer.
+    """
+
+    @classmethod
+    async def run(cls, room_code, action, payload):
+        """Run a command by name and journal it for crash recovery"""
+        await getattr(cls, action)(room_code, **payload)
+        RecoveryManager.record(room_code, action, payload)
+        RoomScheduler.wake(room_code)
+
+    @classmethod
+    async def key_event(cls, room_code, player_number, key, is_down, sequence=None, rtt=None):
+        """Apply a key press or release to a player's paddle"""
+        Netcode.receive_input(room_code, player_number, sequence, rtt)
+
+        if RoomScheduler.is_scheduled(room_code):
+            InputQueue.submit(room_code, player_number, ('key', key), is_down)
+            return
+
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            return
+
+        game.set_key(player_number, key, is_down)
+        GameManager.save_game(game)
+        Netcode.process_inputs(room_code)
+
+    @classmethod
+    async def release_keys(cls, room_code, player_number):
+        """Stop a departed player's paddle"""
+        InputQueue.discard(room_code, player_number)
+
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            return
+
+        game.release_keys(player_number)
+        GameManager.save_game(game)
+
+    @classmethod
+    async def paddle_position(cls, room_code, player_number, position, sequence=None, rtt=None):
+        """Move a player's paddle to a client-reported position"""
+        position = paddle_position_value(position)
+        if position is None or settings.GAME_INPUT_MODE == 'keys':
+            return
+
+        Netcode.receive_input(room_code, player_number, sequence, rtt)
+
+        if RoomScheduler.is_scheduled(room_code):
+            InputQueue.submit(room_code, player_number, ('paddle',), position)
+            return
+
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            return
+
+        game.set_paddle_position(player_number, position)
+        GameManager.save_game(game)
+        Netcode.process_inputs(room_code)
+
+    @classmethod
+    async def pause(cls, room_code, player_number, announce=True):
+        """Pause the room, telling every member unless announce is False"""
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            return
+
+        if not announce:
+            if game.status != 'ONGOING' or game.is_paused:
+                return
+
+        game.is_paused = True
+        GameManager.save_game(game)
+
+        if announce:
+            event = {
+                'type': 'game_paused',
+                'player_number': player_number
+            }
+            await get_channel_layer().group_send(f'game_{room_code}', event)
+            await cls._notify_spectators(room_code, event)
+
+    @classmethod
+    async def resume(cls, room_code, player_number, ball_speed_x=None, ball_speed_y=None):
+        """Resume the room, serving a new ball if it was reset after a goal"""
+        serve = None
+        if ball_speed_x is not None or ball_speed_y is not None:
+            serve = serve_speed_values(ball_speed_x, ball_speed_y)
+            if serve is None:
+                return
+
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            return
+
+        game.is_paused = False
+
+        if serve is not None:
+            game.ball_speed_x, game.ball_speed_y = serve
+        elif game.ball_speed_x == 0 and game.ball_speed_y == 0:
+            game.resume_ball()
+
+        GameManager.save_game(game)
+
+        event = {
+            'type': 'game_resumed',
+            'player_number': player_number,
+            'ball_speed_x': game.ball_speed_x,
+            'ball_speed_y': game.ball_speed_y
+        }
+        await get_channel_layer().group_send(f'game_{room_code}', event)
+        await cls._notify_spectators(room_code, event)
+
+    @classmethod
+    async def _notify_spectators(cls, room_code, event):
+        if room_code in RoomBroadcaster.spectated_rooms():
+            await RoomBroadcaster.broadcast_spectators(room_code, event)
+
+    @classmethod
+    async def sync_players(cls, room_code, fields):
+        """Adopt player assignments made by another worker's view or consumer"""
+        game = await GameManager.aget_game(room_code)
+        if not game:
+            game = GameManager.create_game(room_code)
+
+        for name in PLAYER_FIELDS:
+            if name in fields:
+                setattr(game, name, fields[name])
+
+        GameManager.save_game(game)
+
+    @classmethod
+    async def start(cls, room_code):
+        """Start simulating the room once both players are in"""
+        game = await GameManager.aget_game(room_code)
+        if not game or game.status == 'FINISHED' or RoomScheduler.is_scheduled(room_code):
+            return
+
+        if not (game.player_1_id and game.player_2_id):
+            return
+
+        game.status = 'ONGOING'
+        GameManager.save_game(game)
+        RoomLobby.notify(room_code, game)
+
+        RoomScheduler.start_room(room_code)
+
+    @classmethod
+    async def delete(cls, room_code):
+        """Stop and drop the room"""
+        RoomScheduler.stop_room(room_code)
+        GameManager.delete_game(room_code)
@@ -0,0 +1,164 @@
+import logging
+from ..constants import SPEED_INCREASE_FACTOR, RUBBER_BAND_FACTOR, ANGLE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class BatchPhysicsEngine:
+    """
+    Vectorized version of GameState.update for many rooms at once.
+
+    Rooms are loaded into NumPy columns, stepped together in a single pass
+    and written back. Every operation mirrors GameState.update in the same
+    order and in float64, so results are bit-for-bit identical.
+    """
+
+    STATE_COLUMNS = (
+        'ball_x', 'ball_y', 'ball_speed_x', 'ball_speed_y',
+        'player_1_paddle_y', 'player_2_paddle_y',
+    )
+    SCORE_COLUMNS = ('player_1_score', 'player_2_score', 'last_loser')
+    CONSTANT_COLUMNS = (
+        'canvas_width', 'canvas_height', 'paddle_width', 'paddle_height',
+        'ball_size', 'winning_score',
+    )
+
+    def __init__(self):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("BatchPhysicsEngine requires numpy")
+
+        self.size = 0
+        self.columns = {}
+        self.is_paused = np.zeros(0, dtype=bool)
+        self.scorer = np.zeros(0, dtype=np.int64)
+
+    def load(self, games):
+        """Copy the rooms' physics state into columns, one row per game"""
+        self.size = len(games)
+
+        for name in self.STATE_COLUMNS + self.CONSTANT_COLUMNS:
+            self.columns[name] = np.fromiter(
+                (getattr(game, name) for game in games), dtype=np.float64, count=self.size
+            )
+        for name in self.SCORE_COLUMNS:
+            self.columns[name] = np.fromiter(
+                (getattr(game, name) or 0 for game in games), dtype=np.int64, count=self.size
+            )
+
+        self.is_paused = np.fromiter((game.is_paused for game in games), dtype=bool, count=self.size)
+        self.scorer = np.zeros(self.size, dtype=np.int64)
+
+    def store(self, games):
+        """Write the stepped columns back into the rooms they were loaded from"""
+        state = [self.columns[name].tolist() for name in self.STATE_COLUMNS]
+        scores_1 = self.columns['player_1_score'].tolist()
+        scores_2 = self.columns['player_2_score'].tolist()
+        last_losers = self.columns['last_loser'].tolist()
+        paused = self.is_paused.tolist()
+
+        for row, game in enumerate(games):
+            if game.is_paused:
+                continue
+
+            for name, values in zip(self.STATE_COLUMNS, state):
+                setattr(game, name, values[row])
+
+            game.player_1_score = scores_1[row]
+            game.player_2_score = scores_2[row]
+            game.last_loser = last_losers[row] or None
+            game.is_paused = paused[row]
+
+    def step(self):
+        """
+        Advance every loaded room by one GameState.update.
+        Returns (scored, finished): row indices of rooms where a goal was
+        scored this step, and of those whose scorer reached winning_score.
+        The scoring player of each row is left in self.scorer.
+        """
+        c = self.columns
+        active = ~self.is_paused
+
+        ball_radius = c['ball_size'] / 2
+        width = c['canvas_width']
+        height = c['canvas_height']
+        paddle_width = c['paddle_width']
+        paddle_height = c['paddle_height']
+        paddle_1 = c['player_1_paddle_y']
+        paddle_2 = c['player_2_paddle_y']
+        score_1 = c['player_1_score']
+        score_2 = c['player_2_score']
+
+        ball_x = c['ball_x'] + c['ball_speed_x']
+        ball_y = c['ball_y'] + c['ball_speed_y']
+        speed_x = c['ball_speed_x']
+        speed_y = c['ball_speed_y']
+
+        top = ball_y - ball_radius <= 0
+        bottom = ~top & (ball_y + ball_radius >= height)
+        ball_y = np.where(top, ball_radius, np.where(bottom, height - ball_radius, ball_y))
+        speed_y = np.where(top | bottom, speed_y * -1, speed_y)
+
+        hit_1 = (
+            (ball_x - ball_radius <= paddle_width) &
+            (ball_y >= paddle_1) &
+            (ball_y <= paddle_1 + paddle_height)
+        )
+        hit_2 = ~hit_1 & (
+            (ball_x + ball_radius >= width - paddle_width) &
+            (ball_y >= paddle_2) &
+            (ball_y <= paddle_2 + paddle_height)
+        )
+        hit = hit_1 | hit_2
+
+        paddle_center = np.where(hit_1, paddle_1, paddle_2) + paddle_height / 2
+        relative_intersect_y = ball_y - paddle_center
+        normalized_intersect = relative_intersect_y / (paddle_height / 2)
+        angle = normalized_intersect * ANGLE_LIMIT
+
+        ball_x = np.where(hit_1, paddle_width + ball_radius,
+                          np.where(hit_2, width - paddle_width - ball_radius, ball_x))
+        speed_x = np.where(hit_1, np.abs(speed_x), np.where(hit_2, -np.abs(speed_x), speed_x))
+        speed_y = np.where(hit, angle * 6, speed_y)
+
+        speed_x = np.where(hit, speed_x * SPEED_INCREASE_FACTOR, speed_x)
+        speed_y = np.where(hit, speed_y * SPEED_INCREASE_FACTOR, speed_y)
+
+        leading = (hit_1 & (score_1 > score_2 + 3)) | (hit_2 & (score_2 > score_1 + 3))
+        speed_x = np.where(leading, speed_x * RUBBER_BAND_FACTOR, speed_x)
+        speed_y = np.where(leading, speed_y * RUBBER_BAND_FACTOR, speed_y)
+
+        goal_2 = active & (ball_x - ball_radius <= 0)
+        goal_1 = active & ~goal_2 & (ball_x + ball_radius >= width)
+        goal = goal_1 | goal_2
+
+        ball_x = np.where(goal, width / 2, ball_x)
+        ball_y = np.where(goal, height / 2, ball_y)
+        speed_x = np.where(goal, 0.0, speed_x)
+        speed_y = np.where(goal, 0.0, speed_y)
+
+        c['ball_x'] = np.where(active, ball_x, c['ball_x'])
+        c['ball_y'] = np.where(active, ball_y, c['ball_y'])
+        c['ball_speed_x'] = np.where(active, speed_x, c['ball_speed_x'])
+        c['ball_speed_y'] = np.where(active, speed_y, c['ball_speed_y'])
+
+        c['player_1_score'] = score_1 + goal_1
+        c['player_2_score'] = score_2 + goal_2
+        c['last_loser'] = np.where(goal_2, 1, np.where(goal_1, 2, c['last_loser']))
+        self.is_paused = self.is_paused | goal
+        self.scorer = np.where(goal_2, 2, np.where(goal_1, 1, 0))
+
+        scored = np.flatnonzero(goal)
+        winning_score = c['winning_score'][scored]
+        finished = scored[
+            (c['player_1_score'][scored] >= winning_score) |
+            (c['player_2_score'][scored] >= winning_score)
+        ]
+
+        return scored, finished
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import random
+import string
+import time
+from django.conf import settings
+from .manager import GameManager, REDIS_AVAILABLE, redis_client, async_redis_client
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH
+
+FEISTEL_ROUNDS = 4
+
+# Pops up to ARGV[2] codes whose quarantine ended before ARGV[1], dropping
+# those whose room was opened again meanwhile (its storage.meta_key exists)
+POP_RECYCLED_SCRIPT = """
+local codes = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local free = {}
+if #codes > 0 then
+    redis.call('ZREM', KEYS[1], unpack(codes))
+    for _, code in ipairs(codes) do
+        if redis.call('EXISTS', 'room:' .. code .. ':meta') == 0 then
+            free[#free + 1] = code
+        end
+    end
+end
+return free
+"""
+
+
+def encode_code(index):
+    """Room code of an index in [0, CODE_SPACE)"""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        index, digit = divmod(index, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class RoomCodeAllocator:
+    """
+    Hands out room codes that are unique across all workers.
+
+    Fresh codes come from a shared Redis counter (room_codes:next) passed
+    through a keyed Feistel permutation of the code space, so consecutive
+    rooms get unrelated codes and no code is issued twice. Counter values are
+    reserved GAME_ROOM_CODE_BLOCK at a time; codes in a block that another
+    worker owns on the hash ring are handed to that worker's free list
+    (room_codes:free:<worker>) instead of being wasted. Deleted rooms' codes
+    wait in room_codes:quarantine for GAME_ROOM_CODE_QUARANTINE seconds
+    before they are reused. Clients can open a room under any code, so a
+    code is only handed out if no room is using it yet.
+    """
+
+    _key = None
+    _local_counter = None
+    _pop_recycled = None
+    _apop_recycled = None
+
+    @classmethod
+    def permute(cls, index):
+        """Keyed bijection of [0, CODE_SPACE), by cycle-walking a 32-bit Feistel network"""
+        if cls._key is None:
+            cls._key = hashlib.blake2b(settings.SECRET_KEY.encode(), digest_size=32).digest()
+
+        value = index
+        while True:
+            left, right = value >> 16, value & 0xFFFF
+            for round_number in range(FEISTEL_ROUNDS):
+                digest = hashlib.blake2b(bytes((round_number, right >> 8, right & 0xFF)), digest_size=2, key=cls._key).digest()
+                left, right = right, left ^ int.from_bytes(digest, 'little')
+            value = (left << 16) | right
+            if value < CODE_SPACE:
+                return value
+
+    @classmethod
+    def code_for(cls, index):
+        return encode_code(cls.permute(index % CODE_SPACE))
+
+    @classmethod
+    def allocate(cls, ring=None):
+        """Reserve a code owned by this worker (sync, for HTTP views)"""
+        if not REDIS_AVAILABLE:
+            return cls._allocate_local()
+
+        worker = settings.PONG_WORKER_ID
+        free_key = storage.free_codes_key(worker)
+
+        while True:
+            room_code = redis_client.lpop(free_key)
+            if not room_code:
+                if cls._pop_recycled is None:
+                    cls._pop_recycled = redis_client.register_script(POP_RECYCLED_SCRIPT)
+
+                block = settings.GAME_ROOM_CODE_BLOCK
+                recycled = cls._pop_recycled(keys=[storage.QUARANTINE_CODES_KEY], args=[time.time(), block])
+                end = redis_client.incrby(storage.NEXT_CODE_KEY, block)
+
+                room_code, handoffs = cls._distribute(ring, recycled, end - block, end)
+                if handoffs:
+                    with redis_client.pipeline(transaction=False) as pipe:
+                        for key, codes in handoffs.items():
+                            pipe.rpush(key, *codes)
+                        pipe.execute()
+
+            if room_code and not cls._in_use(room_code, redis_client.exists(storage.meta_key(room_code))):
+                return room_code
+
+    @classmethod
+    async def aallocate(cls, ring=None):
+        """Reserve a code owned by this worker without blocking the event loop"""
+        if not REDIS_AVAILABLE:
+            return cls._allocate_local()
+
+        worker = settings.PONG_WORKER_ID
+        free_key = storage.free_codes_key(worker)
+
+        while True:
+            room_code = await async_redis_client.lpop(free_key)
+            if not room_code:
+                if cls._apop_recycled is None:
+                    cls._apop_recycled = async_redis_client.register_script(POP_RECYCLED_SCRIPT)
+
+                block = settings.GAME_ROOM_CODE_BLOCK
+                recycled = await cls._apop_recycled(keys=[storage.QUARANTINE_CODES_KEY], args=[time.time(), block])
+                end = await async_redis_client.incrby(storage.NEXT_CODE_KEY, block)
+
+                room_code, handoffs = cls._distribute(ring, recycled, end - block, end)
+                if handoffs:
+                    async with async_redis_client.pipeline(transaction=False) as pipe:
+                        for key, codes in handoffs.items():
+                            pipe.rpush(key, *codes)
+                        await pipe.execute()
+
+            if room_code and not cls._in_use(room_code, await async_redis_client.exists(storage.meta_key(room_code))):
+                return room_code
+
+    @classmethod
+    def _distribute(cls, ring, recycled, start, end):
+        """
+        Split recycled codes and the fresh codes of counter values [start, end)
+        by owner. Returns one code for this worker, if any, and the rest as
+        {free list key: codes}.
+        """
+        worker = settings.PONG_WORKER_ID
+        handoffs = {}
+        room_code = None
+
+        candidates = list(recycled) + [cls.code_for(index) for index in range(start, end)]
+        for code in candidates:
+            owner = (ring.get(code) if ring else None) or worker
+            if owner == worker and room_code is None:
+                room_code = code
+            else:
+                handoffs.setdefault(storage.free_codes_key(owner), []).append(code)
+
+        return room_code, handoffs
+
+    @classmethod
+    def _in_use(cls, room_code, stored):
+        """Whether a room already exists under a code, here or (stored) in Redis"""
+        if stored or room_code in GameManager._games:
+            logger.warning(f"Skipping room code {room_code}, a room is already using it")
+            return True
+        return False
+
+    @classmethod
+    def _allocate_local(cls):
+        """Without Redis this worker is alone: walk the permutation from a random start"""
+        if cls._local_counter is None:
+            cls._local_counter = random.randrange(CODE_SPACE)
+
+        while True:
+            cls._local_counter += 1
+            room_code = cls.code_for(cls._local_counter)
+            if GameManager.get_game(room_code) is None:
+                return room_code
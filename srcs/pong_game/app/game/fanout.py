@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .manager import REDIS_AVAILABLE, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+ROOM_WORKERS_TTL = 3600
+
+# How long a room's remote-member check is trusted when this worker has no
+# socket in the room, and so gets no room_members_changed events for it
+REMOTE_MEMBERS_CACHE_TTL = 1.0
+
+
+class RoomBroadcaster:
+    """
+    In-process registry of the sockets connected to each room.
+
+    Room broadcasts are delivered straight to the local consumers of a room,
+    reusing the payload the scheduler already encoded. The channel layer is
+    only used when another worker also has members in that room; which
+    workers host a room is tracked in the Redis hash room_workers:<room_code>
+    and re-read after a membership change, or at most every
+    REMOTE_MEMBERS_CACHE_TTL while this worker has no socket in the room.
+
+    Spectators form a separate tier: they are not room members, only get the
+    scheduler's low-rate keyframes and match events, and are reached on other
+    workers through the spectate_<room_code> group, tracked the same way in
+    room_spectators:<room_code>.
+    """
+
+    _local_members = {}
+    _remote_rooms = {}
+    _stale_rooms = set()
+
+    _local_spectators = {}
+    _remote_spectators = {}
+    _stale_spectators = set()
+
+    @classmethod
+    async def register(cls, room_code, consumer):
+        """Add a local consumer to a room and tell the other workers"""
+        cls._local_members.setdefault(room_code, set()).add(consumer)
+        await cls._update_membership(room_code, 1, 'room_workers')
+
+    @classmethod
+    async def unregister(cls, room_code, consumer):
+        """Remove a local consumer from a room and tell the other workers"""
+        members = cls._local_members.get(room_code)
+        if not members or consumer not in members:
+            return
+
+        members.discard(consumer)
+        if not members:
+            del cls._local_members[room_code]
+            cls._remote_rooms.pop(room_code, None)
+            cls._stale_rooms.discard(room_code)
+            if room_code not in cls._local_spectators:
+                cls._stale_spectators.discard(room_code)
+
+        await cls._update_membership(room_code, -1, 'room_workers')
+
+    @classmethod
+    async def register_spectator(cls, room_code, consumer):
+        """Add a local spectator to a room and tell the other workers"""
+        cls._local_spectators.setdefault(room_code, set()).add(consumer)
+        await cls._update_membership(room_code, 1, 'room_spectators')
+
+    @classmethod
+    async def unregister_spectator(cls, room_code, consumer):
+        """Remove a local spectator from a room and tell the other workers"""
+        spectators = cls._local_spectators.get(room_code)
+        if not spectators or consumer not in spectators:
+            return
+
+        spectators.discard(consumer)
+        if not spectators:
+            del cls._local_spectators[room_code]
+            if room_code not in cls._local_members:
+                cls._stale_spectators.discard(room_code)
+
+        await cls._update_membership(room_code, -1, 'room_spectators')
+
+    @classmethod
+    def mark_stale(cls, room_code):
+        """Re-read the room's worker and spectator sets before their next broadcast"""
+        cls._stale_rooms.add(room_code)
+        cls._stale_spectators.add(room_code)
+
+    @classmethod
+    def forget_room(cls, room_code):
+        """Drop what is known of a stopped room's remote members and spectators"""
+        cls._remote_rooms.pop(room_code, None)
+        cls._stale_rooms.discard(room_code)
+        cls._remote_spectators.pop(room_code, None)
+        cls._stale_spectators.discard(room_code)
+
+    @classmethod
+    def spectated_rooms(cls):
+        """Rooms with spectators here or, as last read, on another worker"""
+        return cls._local_spectators.keys() | cls._remote_spectators.keys() | cls._stale_spectators
+
+    @classmethod
+    def local_member_count(cls, room_code):
+        """Number of sockets connected to this room on this worker"""
+        return len(cls._local_members.get(room_code, ()))
+
+    @classmethod
+    async def broadcast(cls, room_code, event):
+        """
+        Deliver an event to every member of a room: directly to local sockets,
+        and through the channel layer only if other workers have members.
+        """
+        members = cls._local_members.get(room_code)
+        if members:
+            handler_name = event['type']
+            results = await asyncio.gather(
+                *(getattr(consumer, handler_name)(event) for consumer in list(members)),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error delivering {handler_name} in room {room_code}: {str(result)}")
+
+        if await cls._has_remote_members(room_code):
+            await get_channel_layer().group_send(
+                f'game_{room_code}',
+                {**event, 'origin': settings.PONG_WORKER_ID}
+            )
+
+        if event['type'] != 'game_state_update' and room_code in cls.spectated_rooms():
+            await cls.broadcast_spectators(room_code, event)
+
+    @classmethod
+    async def broadcast_spectators(cls, room_code, event):
+        """Deliver an event to a room's spectators, on this worker and others"""
+        spectators = cls._local_spectators.get(room_code)
+        if spectators:
+            handler_name = event['type']
+            results = await asyncio.gather(
+                *(getattr(consumer, handler_name)(event) for consumer in list(spectators)),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error delivering {handler_name} to spectators of room {room_code}: {str(result)}")
+
+        if await cls._has_remote_spectators(room_code):
+            await get_channel_layer().group_send(
+                f'spectate_{room_code}',
+                {**event, 'origin': settings.PONG_WORKER_ID}
+            )
+
+    @classmethod
+    def is_local_origin(cls, event):
+        """Check whether a channel-layer event was already delivered locally"""
+        return event.get('origin') == settings.PONG_WORKER_ID
+
+    @classmethod
+    async def _has_remote_members(cls, room_code):
+        if not REDIS_AVAILABLE:
+            return False
+
+        cached = cls._remote_rooms.get(room_code)
+        # Without a local socket this worker is not in game_<room_code> and
+        # never hears of membership changes, so the cached answer expires
+        expired = (
+            cached is not None
+            and room_code not in cls._local_members
+            and time.monotonic() - cached[1] > REMOTE_MEMBERS_CACHE_TTL
+        )
+
+        if cached is None or expired or room_code in cls._stale_rooms:
+            cls._stale_rooms.discard(room_code)
+            try:
+                workers = await async_redis_client.hgetall(f"room_workers:{room_code}")
+                remote = any(
+                    worker_id != settings.PONG_WORKER_ID and int(count) > 0
+                    for worker_id, count in workers.items()
+                )
+            except Exception as e:
+                logger.error(f"Error reading room workers for {room_code}: {str(e)}")
+                remote = True
+            cached = cls._remote_rooms[room_code] = (remote, time.monotonic())
+
+        return cached[0]
+
+    @classmethod
+    async def _has_remote_spectators(cls, room_code):
+        if not REDIS_AVAILABLE:
+            return False
+
+        if room_code in cls._stale_spectators:
+            cls._stale_spectators.discard(room_code)
+            try:
+                workers = await async_redis_client.hgetall(f"room_spectators:{room_code}")
+                remote = any(
+                    worker_id != settings.PONG_WORKER_ID and int(count) > 0
+                    for worker_id, count in workers.items()
+                )
+            except Exception as e:
+                logger.error(f"Error reading room spectators for {room_code}: {str(e)}")
+                remote = True
+
+            # Only rooms with remote spectators are remembered, so this stays small
+            if remote:
+                cls._remote_spectators[room_code] = True
+            else:
+                cls._remote_spectators.pop(room_code, None)
+
+        return room_code in cls._remote_spectators
+
+    @classmethod
+    async def _update_membership(cls, room_code, increment, prefix):
+        if room_code in cls._local_members or room_code in cls._local_spectators:
+            cls.mark_stale(room_code)
+
+        if not REDIS_AVAILABLE:
+            return
+
+        key = f"{prefix}:{room_code}"
+        try:
+            async with async_redis_client.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, settings.PONG_WORKER_ID, increment)
+                pipe.expire(key, ROOM_WORKERS_TTL)
+                count, _ = await pipe.execute()
+
+            if count <= 0:
+                await async_redis_client.hdel(key, settings.PONG_WORKER_ID)
+
+            # Workers that only serve the room's spectators track its members too
+            channel_layer = get_channel_layer()
+            event = {'type': 'room_members_changed', 'room_code': room_code}
+            await channel_layer.group_send(f'game_{room_code}', event)
+            await channel_layer.group_send(f'spectate_{room_code}', event)
+        except Exception as e:
+            logger.error(f"Error updating room workers for {room_code}: {str(e)}")
@@ -0,0 +1,137 @@
+import logging
+import math
+import time
+from ..constants import BALL_INITIAL_SPEED_X, BALL_INITIAL_SPEED_Y
+
+logger = logging.getLogger(__name__)
+
+
+def finite_float(value):
+    """A client-sent number as a finite float, or None if it is not one"""
+    if isinstance(value, bool):
+        return None
+
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return value if math.isfinite(value) else None
+
+
+def paddle_position_value(position):
+    """A client-reported paddle position as a finite float, or None if it is not one"""
+    return finite_float(position)
+
+
+def serve_speed_values(ball_speed_x, ball_speed_y):
+    """
+    A client-chosen serve as finite floats, each within the initial ball speed,
+    or None if either is not a number.
+    """
+    speed_x = finite_float(ball_speed_x)
+    speed_y = finite_float(ball_speed_y)
+    if speed_x is None or speed_y is None:
+        return None
+
+    return (
+        max(-BALL_INITIAL_SPEED_X, min(speed_x, BALL_INITIAL_SPEED_X)),
+        max(-BALL_INITIAL_SPEED_Y, min(speed_y, BALL_INITIAL_SPEED_Y)),
+    )
+
+
+class TokenBucket:
+    """
+    Per-socket rate limiter: allows `rate` frames per second on average,
+    with bursts of up to `burst` frames.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at', 'dropped')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.dropped = 0
+
+    def allow(self):
+        """Take a token if one is available; counts the frame as dropped otherwise"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        self.dropped += 1
+        return False
+
+
+class InputQueue:
+    """
+    Inputs received for simulated rooms, held until the room's next step.
+
+    Only the latest input of each kind per player is kept (the last paddle
+    position, the last state of each key), so a room costs the same per tick
+    however fast its clients send. The scheduler drains a room's inputs into
+    its GameState at the start of every step.
+    """
+
+    _pending = {}
+    _stats = {
+        'received': 0,
+        'coalesced': 0,
+        'applied': 0,
+        'rate_limited': 0,
+    }
+
+    @classmethod
+    def submit(cls, room_code, player_number, kind, value):
+        """Queue an input, replacing any pending input of the same kind"""
+        room_inputs = cls._pending.setdefault(room_code, {})
+        key = (player_number, kind)
+
+        cls._stats['received'] += 1
+        if key in room_inputs:
+            cls._stats['coalesced'] += 1
+
+        room_inputs[key] = value
+
+    @classmethod
+    def drain_into(cls, room_code, game):
+        """Apply and clear a room's pending inputs. Returns the number applied."""
+        room_inputs = cls._pending.pop(room_code, None)
+        if not room_inputs:
+            return 0
+
+        for (player_number, kind), value in room_inputs.items():
+            if kind[0] == 'key':
+                game.set_key(player_number, kind[1], value)
+            elif kind[0] == 'paddle':
+                game.set_paddle_position(player_number, value)
+
+        cls._stats['applied'] += len(room_inputs)
+        return len(room_inputs)
+
+    @classmethod
+    def discard(cls, room_code, player_number=None):
+        """Drop a room's pending inputs, or only one player's"""
+        if player_number is None:
+            cls._pending.pop(room_code, None)
+            return
+
+        room_inputs = cls._pending.get(room_code)
+        if room_inputs:
+            for key in [key for key in room_inputs if key[0] == player_number]:
+                del room_inputs[key]
+
+    @classmethod
+    def record_rate_limited(cls):
+        cls._stats['rate_limited'] += 1
+
+    @classmethod
+    def stats(cls):
+        """Counters of received, coalesced, applied and rate-limited inputs"""
+        return dict(cls._stats)
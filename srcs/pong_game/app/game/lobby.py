@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import json
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from .manager import GameManager
+
+logger = logging.getLogger(__name__)
+
+
+def lobby_group(room_code):
+    return f"lobby_{room_code}"
+
+
+class RoomLobby:
+    """
+    Room status for waiting players.
+
+    The status check_room returns is pushed to the room's lobby_<room_code>
+    group whenever its player count changes, the game starts or the room is
+    closed, so waiting clients subscribe once instead of polling.
+    """
+
+    _pending = set()
+
+    @classmethod
+    def status(cls, game):
+        """The room status served by check_room and the lobby socket"""
+        room_code = game.room_code
+        player_count = (1 if game.player_1_id else 0) + (1 if game.player_2_id else 0)
+
+        active_sessions = 0
+        for player_id in (game.player_1_id, game.player_2_id):
+            if player_id:
+                session = GameManager.get_player_session(room_code, player_id)
+                if session and session.connected:
+                    active_sessions += 1
+
+        return {
+            'room_code': room_code,
+            'status': game.status,
+            'player_count': player_count,
+            'active_sessions': active_sessions,
+            'player_1_id': game.player_1_id,
+            'player_2_id': game.player_2_id,
+            'is_paused': game.is_paused,
+            'created_at': game.created_at
+        }
+
+    @classmethod
+    def etag(cls, status):
+        """Validator for a room status, for conditional check_room requests"""
+        digest = hashlib.sha1(json.dumps(status, sort_keys=True, default=str).encode()).hexdigest()
+        return f'"{digest[:16]}"'
+
+    @classmethod
+    def notify(cls, room_code, game=None):
+        """
+        Push a room's status to its lobby, or tell it the room is closed when
+        game is None. Works from both async code and sync views.
+        """
+        if game is None:
+            event = {'type': 'room_closed', 'room_code': room_code}
+        else:
+            event = {'type': 'room_status', **cls.status(game)}
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                async_to_sync(channel_layer.group_send)(lobby_group(room_code), event)
+            except Exception as e:
+                logger.error(f"Error notifying lobby of room {room_code}: {str(e)}")
+        else:
+            task = loop.create_task(channel_layer.group_send(lobby_group(room_code), event))
+            cls._pending.add(task)
+            task.add_done_callback(cls._log_error)
+
+    @classmethod
+    def _log_error(cls, task):
+        cls._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error notifying lobby: {str(task.exception())}")
@@ -1,15 +1,13 @@
 import logging
-import random
-import string
 import time
 import redis
-import json
-import aiohttp
+import redis.asyncio as aioredis
 import asyncio
+import heapq
 from django.conf import settings
-from .state import GameState
+from .state import GameState, StateSnapshot
 from .player import PlayerSession
-import os
+from . import storage
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +18,12 @@ try:
         db=settings.REDIS_DB,
         decode_responses=True
     )
+    async_redis_client = aioredis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
     redis_client.ping()
     REDIS_AVAILABLE = True
     logger.info("Redis connection established")
@@ -33,19 +37,23 @@ class GameManager:
     _games = {}
     _player_sessions = {}
     _player_to_room = {}
-
-    _games = {}
-    _player_sessions = {}
-    _player_to_room = {}
-    _cleanup_scheduled = False
+    _room_sessions = {}
+    _expiry_heap = []
+    _room_deadlines = {}
+    _cleanup_task = None
+
+    _dirty_games = set()
+    _deleted_games = {}
+    _dirty_sessions = set()
+    _persisted = {}
+    _ttl_refreshed_at = {}
+    _flush_task = None
 
     @classmethod
-    def generate_room_code(cls, length=6):
-        """Generate a unique room code"""
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-            if code not in cls._games:
-                return code
+    def generate_room_code(cls):
+        """Reserve a unique room code"""
+        from .codes import RoomCodeAllocator
+        return RoomCodeAllocator.allocate()
 
     @classmethod
     def create_game(cls, room_code=None):
@@ -60,112 +68,433 @@ class GameManager:
         cls._games[room_code] = game
 
         if REDIS_AVAILABLE:
-            cls.cache_game_state(game)
+            # On the event loop the first write goes through the flusher, which
+            # writes every field of a room it has not persisted yet
+            cls._persisted.pop(room_code, None)
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                cls.cache_game_state(game)
+            else:
+                cls.mark_dirty(room_code)
 
-        if not cls._cleanup_scheduled:
-            cls._schedule_cleanup()
+        cls.schedule_expiry(room_code, settings.INACTIVE_GAME_TTL)
+        cls.ensure_cleanup()
 
         return game
 
     @classmethod
-    def _schedule_cleanup(cls):
-        """Schedule periodic cleanup of finished games and inactive sessions"""
-        cls._cleanup_scheduled = True
+    def ensure_cleanup(cls):
+        """Start the expiry job on the running event loop, if not already started"""
+        if cls._cleanup_task is not None and not cls._cleanup_task.done():
+            return
 
-        async def cleanup_job():
-            while True:
-                try:
-                    await asyncio.sleep(settings.GAME_CLEANUP_INTERVAL)
-                    logger.info("Running periodic game cleanup")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
 
-                    rooms = list(cls._games.keys())
+        cls._cleanup_task = loop.create_task(cls._cleanup_job())
 
-                    for room_code in rooms:
-                        game = cls._games.get(room_code)
-                        if not game:
-                            continue
+    @classmethod
+    async def _cleanup_job(cls):
+        """Evict expired rooms every CLEANUP_INTERVAL"""
+        while True:
+            try:
+                await asyncio.sleep(settings.CLEANUP_INTERVAL)
+                evicted = cls.evict_expired()
+                if evicted:
+                    logger.info(f"Evicted {evicted} expired games")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in cleanup job: {str(e)}")
 
-                        if game.status == 'FINISHED' and (time.time() - game.created_at > 3600):
-                            logger.info(f"Cleaning up finished game: {room_code}")
-                            cls.delete_game(room_code)
+    @classmethod
+    def schedule_expiry(cls, room_code, ttl):
+        """(Re)schedule a room's next expiry check ttl seconds from now"""
+        deadline = time.time() + ttl
+        cls._room_deadlines[room_code] = deadline
+        heapq.heappush(cls._expiry_heap, (deadline, room_code))
 
-                except Exception as e:
-                    logger.error(f"Error in cleanup job: {str(e)}")
+    @classmethod
+    def evict_expired(cls, now=None):
+        """
+        Pop every room whose deadline has passed and either delete it or push
+        its next deadline. Superseded heap entries are skipped, so each run
+        costs O(expired log n) instead of a scan of every room.
+        Returns the number of rooms deleted.
+        """
+        now = now or time.time()
+        heap = cls._expiry_heap
+        evicted = 0
 
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        while heap and heap[0][0] <= now:
+            deadline, room_code = heapq.heappop(heap)
+            if cls._room_deadlines.get(room_code) != deadline:
+                continue
+            del cls._room_deadlines[room_code]
+
+            next_check = cls._next_expiry_check(room_code, now)
+            if next_check is None:
+                cls._evict(room_code)
+                evicted += 1
+            else:
+                cls._room_deadlines[room_code] = next_check
+                heapq.heappush(heap, (next_check, room_code))
 
-        loop.create_task(cleanup_job())
+        return evicted
 
     @classmethod
-    def get_game(cls, room_code):
-        """Get a game by room code, first checking Redis then memory"""
-        if room_code in cls._games:
+    def _evict(cls, room_code):
+        """Delete an expired room, or only forget it if another worker owns it"""
+        from .sharding import ShardRouter
+
+        if ShardRouter.is_local(room_code):
+            logger.info(f"Cleaning up expired game: {room_code}")
+            cls.delete_game(room_code)
+            ShardRouter.release(room_code)
+        else:
+            cls.forget_game(room_code)
+
+    @classmethod
+    def _next_expiry_check(cls, room_code, now):
+        """
+        Decide a room's fate at its deadline: None to evict it, else when to look again.
+        Finished rooms go once FINISHED_GAME_TTL has passed. Others go once no
+        player has been connected for DISCONNECTED_PLAYER_TTL (or, with no
+        players at all, after INACTIVE_GAME_TTL).
+        """
+        game = cls._games.get(room_code)
+        if not game or game.status == 'FINISHED':
+            return None
+
+        sessions = [cls._player_sessions[(room_code, player_id)] for player_id in cls._room_sessions.get(room_code, ())]
+        if any(session.connected for session in sessions):
+            return now + settings.INACTIVE_GAME_TTL
+
+        if not sessions:
+            return None
+
+        last_seen = max(session.disconnect_time or session.last_active for session in sessions)
+        if now - last_seen >= settings.DISCONNECTED_PLAYER_TTL:
+            return None
+
+        return last_seen + settings.DISCONNECTED_PLAYER_TTL
+
+    @classmethod
+    def get_game(cls, room_code, refresh=False):
+        """
+        Get a game by room code, first checking memory then Redis.
+        With refresh, Redis is re-read even if a copy is cached; workers use
+        this for rooms another worker owns, whose local copy may be stale.
+        """
+        if room_code in cls._games and not (refresh and REDIS_AVAILABLE):
             return cls._games[room_code]
 
         if REDIS_AVAILABLE:
-            state_json = redis_client.get(f"game:{room_code}")
-            if state_json:
-                try:
-                    state_dict = json.loads(state_json)
-                    game = GameState(room_code)
+            try:
+                with redis_client.pipeline(transaction=False) as pipe:
+                    for key in storage.room_keys(room_code):
+                        pipe.hgetall(key)
+                    meta, state, sessions = pipe.execute()
+            except Exception as e:
+                logger.error(f"Error reading game from Redis: {str(e)}")
+                return cls._games.get(room_code)
+            return cls._load_game(room_code, meta, state, sessions, refresh)
 
-                    for key, value in state_dict.items():
-                        if key != 'timestamp' and hasattr(game, key):
-                            setattr(game, key, value)
+        return None
 
-                    cls._games[room_code] = game
-                    return game
-                except Exception as e:
-                    logger.error(f"Error loading game from Redis: {str(e)}")
+    @classmethod
+    async def aget_game(cls, room_code, refresh=False):
+        """Async variant of get_game that never blocks the event loop on Redis"""
+        if room_code in cls._games and not (refresh and REDIS_AVAILABLE):
+            return cls._games[room_code]
+
+        if REDIS_AVAILABLE:
+            try:
+                async with async_redis_client.pipeline(transaction=False) as pipe:
+                    for key in storage.room_keys(room_code):
+                        pipe.hgetall(key)
+                    meta, state, sessions = await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error reading game from Redis: {str(e)}")
+                return cls._games.get(room_code)
+            return cls._load_game(room_code, meta, state, sessions, refresh)
 
         return None
 
+    @classmethod
+    def _load_game(cls, room_code, meta, state, sessions, replace=False):
+        """
+        Rebuild a game from its meta and state hashes, adopting any player
+        sessions this worker does not know yet.
+        replace overwrites an existing in-memory copy instead of returning it.
+        """
+        if not state:
+            return cls._games.get(room_code)
+
+        if room_code in cls._games and not replace:
+            return cls._games[room_code]
+
+        try:
+            game = GameState(room_code)
+            storage.apply_fields(game, meta)
+            storage.apply_fields(game, state)
+
+            for player_id, raw in sessions.items():
+                if (room_code, player_id) not in cls._player_sessions:
+                    cls._track_session(storage.decode_session(room_code, player_id, raw))
+
+            cls._games[room_code] = game
+            cls._reset_persisted(game)
+            if room_code not in cls._room_deadlines:
+                cls.schedule_expiry(room_code, settings.INACTIVE_GAME_TTL)
+                cls.ensure_cleanup()
+            return game
+        except Exception as e:
+            logger.error(f"Error loading game from Redis: {str(e)}")
+
+        return cls._games.get(room_code)
+
+    @classmethod
+    def restore_game(cls, room_code, meta, state, sessions):
+        """Rebuild a game from hashes read by the caller, replacing any cached copy"""
+        return cls._load_game(room_code, meta, state, sessions, replace=True)
+
+    @classmethod
+    def _reset_persisted(cls, game):
+        """Record the game's current fields as what Redis holds"""
+        snapshot = cls._persisted.get(game.room_code)
+        if snapshot is None:
+            snapshot = cls._persisted[game.room_code] = StateSnapshot()
+        game.snapshot_into(snapshot)
+
     @classmethod
     def save_game(cls, game):
-        """Save game to in-memory storage and Redis cache"""
+        """
+        Save game to in-memory storage and schedule a Redis write.
+        From the event loop the room is only marked dirty and written by the
+        background flusher; sync callers (HTTP views) write through directly.
+        """
         cls._games[game.room_code] = game
 
         if REDIS_AVAILABLE:
-            cls.cache_game_state(game)
+            cls.mark_dirty(game.room_code)
 
         return game
 
+    @classmethod
+    def mark_dirty(cls, room_code):
+        """Queue a room for the next coalesced Redis flush"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            game = cls._games.get(room_code)
+            if game:
+                cls.cache_game_meta(game)
+            return
+
+        cls._deleted_games.pop(room_code, None)
+        cls._dirty_games.add(room_code)
+        cls._ensure_flusher(loop)
+
+    @classmethod
+    def _mark_session_dirty(cls, session):
+        """Queue a player session for the next flush, or write it through from sync code"""
+        if not REDIS_AVAILABLE or session.player_id is None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                with redis_client.pipeline(transaction=False) as pipe:
+                    cls._write_session(pipe, session)
+                    pipe.execute()
+            except Exception as e:
+                logger.error(f"Redis session write error: {str(e)}")
+            return
+
+        cls._dirty_sessions.add((session.room_code, session.player_id))
+        cls._ensure_flusher(loop)
+
+    @classmethod
+    def _write_session(cls, pipe, session):
+        key = storage.sessions_key(session.room_code)
+        pipe.hset(key, session.player_id, storage.encode_session(session))
+        pipe.expire(key, storage.ROOM_KEY_TTL)
+        pipe.hset(storage.PLAYER_ROOM_KEY, session.player_id, session.room_code)
+
+    @classmethod
+    def _ensure_flusher(cls, loop):
+        if cls._flush_task is None or cls._flush_task.done():
+            cls._flush_task = loop.create_task(cls._flush_job())
+
+    @classmethod
+    async def _flush_job(cls):
+        """Flush dirty rooms every GAME_PERSIST_INTERVAL_MS until nothing is pending"""
+        interval = settings.GAME_PERSIST_INTERVAL_MS / 1000
+
+        while cls._dirty_games or cls._deleted_games or cls._dirty_sessions:
+            await asyncio.sleep(interval)
+            await cls.flush_dirty()
+
+    @classmethod
+    async def flush_dirty(cls):
+        """
+        Write every dirty room, session and pending delete in one pipelined batch.
+        Each room only HSETs the fields that changed since its last flush.
+        """
+        if not REDIS_AVAILABLE or not (cls._dirty_games or cls._deleted_games or cls._dirty_sessions):
+            return 0
+
+        dirty, cls._dirty_games = cls._dirty_games, set()
+        deleted, cls._deleted_games = cls._deleted_games, {}
+        dirty_sessions, cls._dirty_sessions = cls._dirty_sessions, set()
+
+        now = time.time()
+        ttl_refresh_interval = storage.ROOM_KEY_TTL / 5
+        written = {}
+
+        try:
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                for room_code in dirty:
+                    game = cls._games.get(room_code)
+                    if not game:
+                        continue
+
+                    snapshot = cls._persisted.get(room_code)
+                    first_write = snapshot is None
+                    if first_write:
+                        snapshot = cls._persisted[room_code] = StateSnapshot()
+                    mask = game.snapshot_into(snapshot)
+
+                    state = storage.state_mapping(game, mask)
+                    meta = storage.meta_mapping(game, None if first_write else mask)
+                    if state:
+                        pipe.hset(storage.state_key(room_code), mapping=state)
+                    if meta:
+                        pipe.hset(storage.meta_key(room_code), mapping=meta)
+                    if first_write:
+                        pipe.zrem(storage.QUARANTINE_CODES_KEY, room_code)
+
+                    if now - cls._ttl_refreshed_at.get(room_code, 0) > ttl_refresh_interval:
+                        for key in storage.room_keys(room_code):
+                            pipe.expire(key, storage.ROOM_KEY_TTL)
+                        written[room_code] = now
+
+                for room_code, player_id in dirty_sessions:
+                    session = cls._player_sessions.get((room_code, player_id))
+                    if session:
+                        cls._write_session(pipe, session)
+
+                for room_code, player_ids in deleted.items():
+                    pipe.delete(*storage.room_keys(room_code))
+                    if player_ids:
+                        pipe.hdel(storage.PLAYER_ROOM_KEY, *player_ids)
+                    cls._quarantine_code(pipe, room_code)
+
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis flush error: {str(e)}")
+            for room_code in dirty:
+                cls._persisted.pop(room_code, None)
+            cls._dirty_games |= dirty
+            cls._deleted_games.update(deleted)
+            cls._dirty_sessions |= dirty_sessions
+            return 0
+
+        cls._ttl_refreshed_at.update(written)
+        return len(dirty) + len(deleted)
+
     @classmethod
     def delete_game(cls, room_code):
         """Remove a game instance"""
-        if room_code in cls._games:
-            del cls._games[room_code]
+        player_ids = list(cls._room_sessions.get(room_code, ()))
+        cls.forget_game(room_code)
 
         if REDIS_AVAILABLE:
-            redis_client.delete(f"game:{room_code}")
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                try:
+                    with redis_client.pipeline(transaction=False) as pipe:
+                        pipe.delete(*storage.room_keys(room_code))
+                        if player_ids:
+                            pipe.hdel(storage.PLAYER_ROOM_KEY, *player_ids)
+                        cls._quarantine_code(pipe, room_code)
+                        pipe.execute()
+                except Exception as e:
+                    logger.error(f"Redis delete error: {str(e)}")
+            else:
+                cls._deleted_games[room_code] = player_ids
+                cls._ensure_flusher(loop)
 
-        keys_to_remove = []
-        for key in cls._player_sessions:
-            if key[0] == room_code:
-                keys_to_remove.append(key)
+        from .lobby import RoomLobby
+        RoomLobby.notify(room_code)
 
-        for key in keys_to_remove:
-            if key in cls._player_sessions:
-                player_id = key[1]
-                if player_id in cls._player_to_room:
-                    del cls._player_to_room[player_id]
-                del cls._player_sessions[key]
+    @classmethod
+    def _quarantine_code(cls, pipe, room_code):
+        """Queue a deleted room's code for reuse once GAME_ROOM_CODE_QUARANTINE has passed"""
+        pipe.zadd(storage.QUARANTINE_CODES_KEY, {room_code: time.time() + settings.GAME_ROOM_CODE_QUARANTINE})
+
+    @classmethod
+    def forget_game(cls, room_code):
+        """Drop this worker's in-memory copy of a room and its sessions, leaving Redis alone"""
+        cls._games.pop(room_code, None)
+        cls._dirty_games.discard(room_code)
+        cls._persisted.pop(room_code, None)
+        cls._ttl_refreshed_at.pop(room_code, None)
+        cls._room_deadlines.pop(room_code, None)
+
+        for player_id in cls._room_sessions.pop(room_code, ()):
+            cls._player_sessions.pop((room_code, player_id), None)
+            cls._dirty_sessions.discard((room_code, player_id))
+            if cls._player_to_room.get(player_id) == room_code:
+                del cls._player_to_room[player_id]
 
     @classmethod
     def cache_game_state(cls, game):
-        """Store game state in Redis cache with TTL"""
+        """Write a room's full meta and state hashes with TTL"""
         if not REDIS_AVAILABLE:
             return False
 
+        room_code = game.room_code
         try:
-            state_dict = game.to_dict()
-            state_json = json.dumps(state_dict)
+            with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(storage.meta_key(room_code), mapping=storage.meta_mapping(game))
+                pipe.hset(storage.state_key(room_code), mapping=storage.state_mapping(game))
+                for key in storage.room_keys(room_code):
+                    pipe.expire(key, storage.ROOM_KEY_TTL)
+                # A code reopened while quarantined must not be handed out again
+                pipe.zrem(storage.QUARANTINE_CODES_KEY, room_code)
+                pipe.execute()
+
+            cls._reset_persisted(game)
+            return True
+        except Exception as e:
+            logger.error(f"Redis caching error: {str(e)}")
+            return False
 
-            redis_client.set(f"game:{game.room_code}", state_json, ex=300)  # 5 minute expiration
+    @classmethod
+    def cache_game_meta(cls, game):
+        """
+        Write a room's metadata and status from sync code (HTTP views).
+        Hot fields are left to the owner's flusher, so a view on another worker
+        never overwrites them with its older copy.
+        """
+        if not REDIS_AVAILABLE:
+            return False
+
+        room_code = game.room_code
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(storage.meta_key(room_code), mapping=storage.meta_mapping(game))
+                pipe.hset(storage.state_key(room_code), 'status', game.status)
+                pipe.expire(storage.meta_key(room_code), storage.ROOM_KEY_TTL)
+                pipe.expire(storage.state_key(room_code), storage.ROOM_KEY_TTL)
+                pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Redis caching error: {str(e)}")
@@ -182,12 +511,17 @@ class GameManager:
             connected=True
         )
 
-        key = (room_code, player_id)
-        cls._player_sessions[key] = session
-        cls._player_to_room[player_id] = room_code
+        cls._track_session(session)
+        cls._mark_session_dirty(session)
 
         return session
 
+    @classmethod
+    def _track_session(cls, session):
+        cls._player_sessions[(session.room_code, session.player_id)] = session
+        cls._player_to_room[session.player_id] = session.room_code
+        cls._room_sessions.setdefault(session.room_code, set()).add(session.player_id)
+
     @classmethod
     def get_player_session(cls, room_code, player_id):
         """Get a player session"""
@@ -204,6 +538,7 @@ class GameManager:
                 session.mark_connected()
             else:
                 session.mark_disconnected()
+                cls.schedule_expiry(room_code, settings.DISCONNECTED_PLAYER_TTL)
 
                 game = cls.get_game(room_code)
                 if game:
@@ -221,6 +556,7 @@ class GameManager:
                     ):
                         logger.info(f"Solo player disconnected from waiting game {room_code}")
 
+            cls._mark_session_dirty(session)
             return session
 
         if connected and room_code and player_id:
@@ -239,6 +575,7 @@ class GameManager:
         if session:
             session.connected = True
             session.last_active = time.time()
+            cls._mark_session_dirty(session)
             return session.player_number, username
 
         if not game.player_1_id:
@@ -247,6 +584,7 @@ class GameManager:
             cls.save_game(game)
 
             cls.add_player_session(room_code, player_id, 1, username)
+            cls._notify_lobby(game)
             return 1, username
 
         elif not game.player_2_id:
@@ -255,10 +593,16 @@ class GameManager:
             cls.save_game(game)
 
             cls.add_player_session(room_code, player_id, 2, username)
+            cls._notify_lobby(game)
             return 2, username
 
         return None, username
 
+    @classmethod
+    def _notify_lobby(cls, game):
+        from .lobby import RoomLobby
+        RoomLobby.notify(game.room_code, game)
+
     @classmethod
     def calculate_state_delta(cls, old_state, new_state):
         """
@@ -281,27 +625,9 @@ class GameManager:
 
     @classmethod
     async def record_game_result(cls, game):
-        """Send game result to user_management service"""
+        """Queue a finished game's result for user_management (see ResultOutbox)"""
         if game.status != 'FINISHED':
             return
 
-        try:
-            game_data = {
-                'player_1': int(game.player_1_id),
-                'player_2': int(game.player_2_id),
-                'score_1': game.player_1_score,
-                'score_2': game.player_2_score,
-            }
-            api_key = os.getenv('INTERNAL_API_TOKEN')
-            async with aiohttp.ClientSession() as session:
-                url = f"{settings.USER_MANAGEMENT_URL}/api/game/add/"
-                headers = {'Content-Type': 'application/json', 'X-API-Key': api_key}
-                logger.info(f"POST Request to {url} with data: {game_data}")
-                async with session.post(url, json=game_data, headers=headers) as response:
-                    if response.status != 201:
-                        logger.error(f"Failed to record game result: {await response.text()}")
-                    else:
-                        logger.info(f"Game result recorded successfully for {game.room_code}")
-
-        except Exception as e:
-            logger.error(f"Error recording game result: {str(e)}")
+        from .results import ResultOutbox
+        await ResultOutbox.submit(game)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .manager import GameManager, REDIS_AVAILABLE, async_redis_client
+from .sharding import ShardRouter
+from .services import UserManagementClient
+
+logger = logging.getLogger(__name__)
+
+# Redis layout of the queue
+#
+#   matchmaking:queue         zset    player_id scored by rating
+#   matchmaking:joined        hash    player_id -> time the player started waiting
+#   matchmaking:usernames     hash    player_id -> username
+#   matchmaking:match:<id>    string  room_code of the player's last match, for reconnects
+
+QUEUE_KEY = "matchmaking:queue"
+JOINED_KEY = "matchmaking:joined"
+USERNAMES_KEY = "matchmaking:usernames"
+MATCH_KEY_TTL = 60
+
+# Walks up to ARGV[6] players of the rating-ordered queue from rank ARGV[5]
+# and pairs neighbours whose rating gap fits the window of the longer-waiting
+# one, which widens from ARGV[2] by ARGV[3] per second waited up to ARGV[4].
+# Pairs are removed from the queue in the same atomic step, so workers can
+# run it concurrently. Returns the rank to resume from (-1 once the end of the
+# queue was reached) followed by the paired player ids.
+PAIR_SCRIPT = """
+local now = tonumber(ARGV[1])
+local base, growth, max_window = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local start, batch = tonumber(ARGV[5]), tonumber(ARGV[6])
+
+local entries = redis.call('ZRANGE', KEYS[1], start, start + batch - 1, 'WITHSCORES')
+local result = {-1}
+local i = 1
+
+while i + 3 <= #entries do
+    local a, b = entries[i], entries[i + 2]
+    local gap = tonumber(entries[i + 3]) - tonumber(entries[i + 1])
+    local since = math.min(
+        tonumber(redis.call('HGET', KEYS[2], a) or now),
+        tonumber(redis.call('HGET', KEYS[2], b) or now)
+    )
+
+    if gap <= math.min(max_window, base + growth * (now - since)) then
+        redis.call('ZREM', KEYS[1], a, b)
+        redis.call('HDEL', KEYS[2], a, b)
+        table.insert(result, a)
+        table.insert(result, b)
+        i = i + 4
+    else
+        i = i + 2
+    end
+end
+
+local count = #entries / 2
+if count == batch then
+    result[1] = math.max(start, start + count - (#result - 1) - 1)
+end
+return result
+"""
+
+
+def match_key(player_id):
+    return f"matchmaking:match:{player_id}"
+
+
+def player_group(player_id):
+    return f"matchmaking.{player_id}"
+
+
+class Matchmaker:
+    """
+    Skill-based matchmaking queue shared by all workers.
+
+    Waiting players are kept in a Redis sorted set by rating. Every worker
+    with queued players runs a pairing pass every GAME_MATCHMAKING_INTERVAL
+    seconds; each pass pairs rating neighbours atomically (PAIR_SCRIPT),
+    creates their room on this worker and pushes it to both players'
+    matchmaking sockets through the channel layer.
+    """
+
+    _pair_script = None
+    _pair_task = None
+
+    @classmethod
+    async def fetch_rating(cls, player_id):
+        """A player's rating from user_management, or the default one"""
+        try:
+            url = f"/api/users/{int(player_id)}/rating/"
+            async with UserManagementClient.session().get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                if response.status == 200:
+                    return float((await response.json())['rating'])
+                logger.warning(f"Could not fetch rating of player {player_id}: HTTP {response.status}")
+        except Exception as e:
+            logger.error(f"Error fetching rating of player {player_id}: {str(e)}")
+
+        return float(settings.GAME_MATCHMAKING_DEFAULT_RATING)
+
+    @classmethod
+    async def enqueue(cls, player_id, username, rating):
+        """Add a player to the queue, keeping their wait time if already queued"""
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(match_key(player_id))
+            pipe.zadd(QUEUE_KEY, {player_id: rating})
+            pipe.hsetnx(JOINED_KEY, player_id, time.time())
+            pipe.hset(USERNAMES_KEY, player_id, username or '')
+            pipe.zcard(QUEUE_KEY)
+            results = await pipe.execute()
+
+        cls.ensure_pairing()
+        return results[-1]
+
+    @classmethod
+    async def dequeue(cls, player_id):
+        """Remove a player from the queue. Returns whether they were queued."""
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(QUEUE_KEY, player_id)
+            pipe.hdel(JOINED_KEY, player_id)
+            pipe.hdel(USERNAMES_KEY, player_id)
+            removed, _, _ = await pipe.execute()
+
+        return bool(removed)
+
+    @classmethod
+    def ensure_pairing(cls):
+        """Run pairing passes on this worker while the queue is not empty"""
+        if cls._pair_task is None or cls._pair_task.done():
+            cls._pair_task = asyncio.get_running_loop().create_task(cls._pairing_job())
+
+    @classmethod
+    async def _pairing_job(cls):
+        while True:
+            await asyncio.sleep(settings.GAME_MATCHMAKING_INTERVAL)
+            try:
+                await cls.pair_players()
+                if not await async_redis_client.zcard(QUEUE_KEY):
+                    return
+            except Exception as e:
+                logger.error(f"Error pairing players: {str(e)}")
+
+    @classmethod
+    async def pair_players(cls):
+        """Run one pairing pass over the whole queue. Returns the rooms created."""
+        if cls._pair_script is None:
+            cls._pair_script = async_redis_client.register_script(PAIR_SCRIPT)
+
+        rooms = []
+        start = 0
+        now = time.time()
+
+        while start >= 0:
+            result = await cls._pair_script(
+                keys=[QUEUE_KEY, JOINED_KEY],
+                args=[
+                    now,
+                    settings.GAME_MATCHMAKING_WINDOW,
+                    settings.GAME_MATCHMAKING_WINDOW_GROWTH,
+                    settings.GAME_MATCHMAKING_MAX_WINDOW,
+                    start,
+                    max(2, settings.GAME_MATCHMAKING_BATCH),
+                ]
+            )
+            start = int(result[0])
+            paired = result[1:]
+
+            for player_1_id, player_2_id in zip(paired[::2], paired[1::2]):
+                rooms.append(await cls._create_match(player_1_id, player_2_id))
+
+        return rooms
+
+    @classmethod
+    async def _create_match(cls, player_1_id, player_2_id):
+        """Create a paired room owned by this worker and tell both players"""
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.hmget(USERNAMES_KEY, player_1_id, player_2_id)
+            pipe.hdel(USERNAMES_KEY, player_1_id, player_2_id)
+            usernames, _ = await pipe.execute()
+        player_1_username, player_2_username = (username or None for username in usernames)
+
+        room_code = await ShardRouter.agenerate_local_room_code()
+        await ShardRouter.aclaim(room_code)
+
+        game = GameManager.create_game(room_code)
+        game.player_1_id = player_1_id
+        game.player_1_username = player_1_username
+        game.player_2_id = player_2_id
+        game.player_2_username = player_2_username
+        GameManager.save_game(game)
+
+        GameManager.add_player_session(room_code, player_1_id, 1, player_1_username)
+        GameManager.add_player_session(room_code, player_2_id, 2, player_2_username)
+
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(match_key(player_1_id), room_code, ex=MATCH_KEY_TTL)
+            pipe.set(match_key(player_2_id), room_code, ex=MATCH_KEY_TTL)
+            await pipe.execute()
+
+        # Players may land on another worker, which reads the room from Redis
+        await GameManager.flush_dirty()
+
+        logger.info(f"Matched {player_1_id} and {player_2_id} in room {room_code}")
+
+        channel_layer = get_channel_layer()
+        for player_number, player_id, opponent in (
+            (1, player_1_id, player_2_username),
+            (2, player_2_id, player_1_username),
+        ):
+            await channel_layer.group_send(player_group(player_id), {
+                'type': 'match_found',
+                'room_code': room_code,
+                'player_number': player_number,
+                'player_id': player_id,
+                'opponent': opponent,
+            })
+
+        return room_code
@@ -0,0 +1,202 @@
+import logging
+from array import array
+from django.conf import settings
+from .state import NUMERIC_SNAPSHOT_FIELDS
+from ..constants import SERVER_UPDATE_RATE
+
+logger = logging.getLogger(__name__)
+
+_BALL_X = NUMERIC_SNAPSHOT_FIELDS.index('ball_x')
+_BALL_Y = NUMERIC_SNAPSHOT_FIELDS.index('ball_y')
+_BALL_SPEED_X = NUMERIC_SNAPSHOT_FIELDS.index('ball_speed_x')
+_IS_PAUSED = NUMERIC_SNAPSHOT_FIELDS.index('is_paused')
+
+# Acks are sent back as uint32 (see protocol.ACKS)
+MAX_INPUT_SEQUENCE = 0xFFFFFFFF
+
+
+def input_sequence(value):
+    """A client's input sequence number if it is one that can be acked, else None"""
+    if type(value) is int and 0 <= value <= MAX_INPUT_SEQUENCE:
+        return value
+    return None
+
+
+class LatencyEstimator:
+    """
+    Smoothed round-trip time of one socket, from ping/pong samples
+    (the TCP estimator: srtt gains 1/8 of each error, rttvar 1/4).
+    """
+
+    __slots__ = ('srtt', 'rttvar')
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def update(self, rtt):
+        """Add a round-trip sample in milliseconds"""
+        if rtt < 0:
+            return
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) / 4
+            self.srtt += (rtt - self.srtt) / 8
+
+    @property
+    def rtt(self):
+        """Estimated round trip in milliseconds, or None before the first sample"""
+        return None if self.srtt is None else round(self.srtt, 1)
+
+
+class StateHistory:
+    """
+    Ring of a room's last authoritative numeric states, one per simulated
+    tick, stored in preallocated arrays so recording never allocates.
+    """
+
+    __slots__ = ('ticks', 'states', 'next')
+
+    def __init__(self, size):
+        self.ticks = [-1] * size
+        self.states = [array('d', [0.0] * len(NUMERIC_SNAPSHOT_FIELDS)) for _ in range(size)]
+        self.next = 0
+
+    def record(self, tick, values):
+        self.ticks[self.next] = tick
+        self.states[self.next][:] = values
+        self.next = (self.next + 1) % len(self.ticks)
+
+    def latest(self):
+        """The most recently recorded state"""
+        index = (self.next - 1) % len(self.ticks)
+        return self.states[index] if self.ticks[index] >= 0 else None
+
+    def since(self, tick):
+        """States recorded at or after tick, oldest first"""
+        size = len(self.ticks)
+        for offset in range(size):
+            index = (self.next + offset) % size
+            if self.ticks[index] >= tick:
+                yield self.ticks[index], self.states[index]
+
+
+class Netcode:
+    """
+    Per-room lag compensation and input acknowledgement on the room's owner.
+
+    The scheduler records every simulated state in a short StateHistory.
+    When a goal is conceded, the conceding player's paddle, as they last
+    reported it, is checked against the ball in the states they could have
+    been seeing (their round trip back, capped at GAME_MAX_REWIND_MS); if
+    it covered the ball at the paddle, the goal is undone and the ball
+    bounces instead. Input sequence numbers are acknowledged once the
+    inputs are applied, in the next state delta sent to the room.
+    """
+
+    _histories = {}
+    _latencies = {}
+    _received = {}
+    _processed = {}
+    _acked = {}
+    _stats = {
+        'rewinds': 0,
+        'granted_hits': 0,
+    }
+
+    @classmethod
+    def record_state(cls, room_code, tick, snapshot):
+        """Remember a room's state at a simulated tick"""
+        history = cls._histories.get(room_code)
+        if history is None:
+            history = cls._histories[room_code] = StateHistory(settings.GAME_REWIND_HISTORY)
+        history.record(tick, snapshot.values)
+
+    @classmethod
+    def receive_input(cls, room_code, player_number, sequence=None, rtt=None):
+        """Note a player's input sequence and latest round-trip estimate, as it arrives"""
+        if rtt is not None:
+            cls._latencies.setdefault(room_code, {})[player_number] = rtt
+        if sequence:
+            received = cls._received.setdefault(room_code, {})
+            received[player_number] = max(sequence, received.get(player_number, 0))
+
+    @classmethod
+    def process_inputs(cls, room_code):
+        """Mark every input received for a room as applied"""
+        received = cls._received.pop(room_code, None)
+        if received:
+            cls._processed.setdefault(room_code, {}).update(received)
+
+    @classmethod
+    def take_acks(cls, room_code):
+        """
+        The last applied input sequence of each player, as (player 1, player 2),
+        if it changed since the last call. Otherwise None.
+        """
+        processed = cls._processed.get(room_code)
+        if not processed:
+            return None
+
+        acks = (processed.get(1, 0), processed.get(2, 0))
+        if cls._acked.get(room_code) == acks:
+            return None
+
+        cls._acked[room_code] = acks
+        return acks
+
+    @classmethod
+    def rewind_goal(cls, room_code, game, scorer, tick):
+        """
+        Check a goal just scored at tick against the conceding player's view.
+        Returns True if it was turned into a paddle hit.
+        """
+        loser = 3 - scorer
+        rtt = cls._latencies.get(room_code, {}).get(loser)
+        history = cls._histories.get(room_code)
+        if not rtt or history is None:
+            return False
+
+        cls._stats['rewinds'] += 1
+
+        rewind_ticks = round(min(rtt, settings.GAME_MAX_REWIND_MS) / 1000 * SERVER_UPDATE_RATE)
+        paddle_y = game.player_1_paddle_y if loser == 1 else game.player_2_paddle_y
+        ball_radius = game.ball_size / 2
+
+        for _, values in history.since(tick - rewind_ticks):
+            if values[_IS_PAUSED]:
+                continue
+
+            ball_x = values[_BALL_X]
+            ball_y = values[_BALL_Y]
+            speed_x = values[_BALL_SPEED_X]
+
+            if loser == 1:
+                at_paddle = speed_x < 0 and ball_x - ball_radius <= game.paddle_width - speed_x
+            else:
+                at_paddle = speed_x > 0 and ball_x + ball_radius >= game.canvas_width - game.paddle_width - speed_x
+
+            if at_paddle and paddle_y <= ball_y <= paddle_y + game.paddle_height:
+                game.grant_paddle_hit(loser, history.latest(), ball_y)
+                cls._stats['granted_hits'] += 1
+                logger.info(f"Rewound {tick - rewind_ticks}..{tick} in room {room_code}: paddle hit granted to player {loser}")
+                return True
+
+        return False
+
+    @classmethod
+    def discard(cls, room_code):
+        """Forget a room's history, latencies and acks"""
+        cls._histories.pop(room_code, None)
+        cls._latencies.pop(room_code, None)
+        cls._received.pop(room_code, None)
+        cls._processed.pop(room_code, None)
+        cls._acked.pop(room_code, None)
+
+    @classmethod
+    def stats(cls):
+        """Counters of goals checked by rewinding and paddle hits granted"""
+        return dict(cls._stats)
@@ -0,0 +1,103 @@
+import json
+import struct
+from .state import NUMERIC_SNAPSHOT_FIELDS, STATUS_CODES
+
+# Binary game state frames, negotiated with ?proto=bin on ws/game/<room_code>/
+#
+#   header   <BBHI   frame kind, flags, changed-field mask, server tick
+#   body     <nf     one float32 per bit set in the mask, in NUMERIC_SNAPSHOT_FIELDS order
+#   acks     <II     with FLAG_INPUT_ACKS: last applied input sequence of player 1 and 2
+#
+# 'status' is sent as its STATUS_CODES value, 'is_paused' as 0/1 and a missing
+# 'last_loser' as 0. Player ids and usernames are never in binary frames; those
+# changes are always sent as JSON.
+
+FRAME_HEADER = struct.Struct('<BBHI')
+
+FRAME_DELTA = 1
+FRAME_KEYFRAME = 2
+
+FLAG_FULL_STATE = 1
+FLAG_INPUT_ACKS = 2
+
+ACKS = struct.Struct('<II')
+
+NUMERIC_MASK = (1 << len(NUMERIC_SNAPSHOT_FIELDS)) - 1
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+_VALUE_STRUCTS = tuple(struct.Struct(f'<{count}f') for count in range(len(NUMERIC_SNAPSHOT_FIELDS) + 1))
+_FIELD_INDEXES = tuple(range(len(NUMERIC_SNAPSHOT_FIELDS)))
+
+
+def encode_state_frame(snapshot, mask, tick=0, keyframe=False, acks=None):
+    """
+    Encode the numeric fields selected by mask from a StateSnapshot, and the
+    (player 1, player 2) input acks if given.
+    Returns None when there is neither a numeric field nor an ack to send.
+    """
+    if keyframe:
+        mask = NUMERIC_MASK
+    else:
+        mask &= NUMERIC_MASK
+        if not mask and acks is None:
+            return None
+
+    values = snapshot.values
+    fields = [values[index] for index in _FIELD_INDEXES if mask >> index & 1]
+
+    flags = FLAG_FULL_STATE if keyframe else 0
+    if acks is not None:
+        flags |= FLAG_INPUT_ACKS
+
+    header = FRAME_HEADER.pack(
+        FRAME_KEYFRAME if keyframe else FRAME_DELTA,
+        flags,
+        mask,
+        tick & 0xFFFFFFFF
+    )
+    frame = header + _VALUE_STRUCTS[len(fields)].pack(*fields)
+    if acks is not None:
+        frame += ACKS.pack(*acks)
+    return frame
+
+
+def decode_state_frame(frame):
+    """Decode a binary frame back into a game_state_delta dict"""
+    kind, flags, mask, tick = FRAME_HEADER.unpack_from(frame)
+    count = bin(mask).count('1')
+    values = iter(_VALUE_STRUCTS[count].unpack_from(frame, FRAME_HEADER.size))
+
+    message = {
+        'type': 'game_state_delta',
+        'is_full_state': bool(flags & FLAG_FULL_STATE),
+        'tick': tick,
+    }
+
+    for index, name in enumerate(NUMERIC_SNAPSHOT_FIELDS):
+        if mask >> index & 1:
+            message[name] = next(values)
+
+    if 'status' in message:
+        message['status'] = STATUS_NAMES.get(int(message['status']))
+    for name in ('player_1_score', 'player_2_score'):
+        if name in message:
+            message[name] = int(message[name])
+    if 'is_paused' in message:
+        message['is_paused'] = bool(message['is_paused'])
+    if 'last_loser' in message:
+        message['last_loser'] = int(message['last_loser']) or None
+
+    if flags & FLAG_INPUT_ACKS:
+        player_1_ack, player_2_ack = ACKS.unpack_from(frame, FRAME_HEADER.size + _VALUE_STRUCTS[count].size)
+        message['input_acks'] = {'1': player_1_ack, '2': player_2_ack}
+
+    return message
+
+
+def encode_state_text(state, is_full_state=False):
+    """Encode a state dict as the JSON game state message sent to clients"""
+    return json.dumps({
+        'type': 'game_state_delta',
+        **state,
+        'is_full_state': is_full_state
+    })
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+from django.conf import settings
+from .manager import GameManager, REDIS_AVAILABLE, async_redis_client
+from .scheduler import RoomScheduler
+from .state import StateSnapshot
+from .inputs import paddle_position_value, serve_speed_values
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+RECOVERY_KEY_TTL = 3600
+JOURNAL_MAXLEN = 100000
+
+# Latest-value inputs: a newer one of these replaces a pending one in the journal
+COALESCED_ACTIONS = ('paddle_position', 'key_event')
+
+
+class RecoveryManager:
+    """
+    Crash recovery for the rooms this worker simulates.
+
+    Every GAME_SNAPSHOT_INTERVAL seconds the numeric fields of all scheduled
+    rooms are packed into one hash, recovery:<worker>:snapshot, in a single
+    transaction that also empties the journal. Room commands run after that
+    are appended to the journal stream recovery:<worker>:journal every
+    GAME_PERSIST_INTERVAL_MS, with repeated inputs coalesced in between.
+
+    When a worker with the same PONG_WORKER_ID starts again, recover() rebuilds
+    the snapshotted rooms and their sessions, replays the journal on top, and
+    schedules the matches again paused with both players disconnected, so
+    clients rejoin them as after any other disconnect.
+    """
+
+    _journal = []
+    _coalesced = {}
+    _snapshots = {}
+    _task = None
+    _ready = None
+    _recovered = False
+
+    @classmethod
+    def ensure_started(cls):
+        """Recover this worker's rooms, then start taking snapshots"""
+        if cls._task is None or cls._task.done():
+            cls._ready = asyncio.Event()
+            cls._task = asyncio.get_running_loop().create_task(cls._run())
+
+    @classmethod
+    async def wait_ready(cls):
+        """Wait until recovered rooms are back in memory"""
+        cls.ensure_started()
+        await cls._ready.wait()
+
+    @classmethod
+    def record(cls, room_code, action, payload):
+        """Journal a room command that has just been run on this worker"""
+        if cls._task is None or cls._task.done():
+            return
+
+        entry = {'room': room_code, 'action': action, 'payload': json.dumps(payload)}
+
+        if action in COALESCED_ACTIONS:
+            key = (room_code, action, payload.get('player_number'), payload.get('key'))
+            index = cls._coalesced.get(key)
+            if index is not None:
+                cls._journal[index] = entry
+                return
+            cls._coalesced[key] = len(cls._journal)
+
+        cls._journal.append(entry)
+
+    @classmethod
+    async def _run(cls):
+        if not REDIS_AVAILABLE:
+            cls._ready.set()
+            return
+
+        if not cls._recovered:
+            cls._recovered = True
+            try:
+                await cls.recover()
+            except Exception:
+                logger.exception("Error recovering rooms")
+        cls._ready.set()
+
+        loop = asyncio.get_running_loop()
+        interval = settings.GAME_PERSIST_INTERVAL_MS / 1000
+        next_snapshot = loop.time() + settings.GAME_SNAPSHOT_INTERVAL
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if loop.time() >= next_snapshot:
+                    next_snapshot = loop.time() + settings.GAME_SNAPSHOT_INTERVAL
+                    await cls.write_snapshot()
+                elif cls._journal:
+                    await cls.flush_journal()
+            except Exception as e:
+                logger.error(f"Error writing recovery data: {str(e)}")
+
+    @classmethod
+    def _take_journal(cls):
+        entries = cls._journal
+        cls._journal = []
+        cls._coalesced = {}
+        return entries
+
+    @classmethod
+    async def flush_journal(cls):
+        """Append pending journal entries to the stream in one pipeline"""
+        entries = cls._take_journal()
+        if not entries:
+            return
+
+        key = storage.journal_key(settings.PONG_WORKER_ID)
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for entry in entries:
+                pipe.xadd(key, entry, maxlen=JOURNAL_MAXLEN, approximate=True)
+            pipe.expire(key, RECOVERY_KEY_TTL)
+            await pipe.execute()
+
+    @classmethod
+    async def write_snapshot(cls):
+        """
+        Replace this worker's snapshot with the current state of every
+        scheduled room and empty the journal, which it supersedes: commands
+        are only journaled once they have run, so all pending ones are
+        already reflected in the games.
+        """
+        rooms = {}
+        for room_code in RoomScheduler.rooms():
+            game = GameManager.get_game(room_code)
+            if not game:
+                continue
+
+            try:
+                snapshot = cls._snapshots.get(room_code)
+                if snapshot is None:
+                    snapshot = cls._snapshots[room_code] = StateSnapshot()
+                game.snapshot_into(snapshot)
+                rooms[room_code] = storage.pack_snapshot(snapshot)
+            except Exception:
+                logger.exception(f"Error snapshotting room {room_code}")
+
+        for room_code in [room_code for room_code in cls._snapshots if room_code not in rooms]:
+            del cls._snapshots[room_code]
+
+        cls._take_journal()
+
+        worker = settings.PONG_WORKER_ID
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(storage.snapshot_key(worker), storage.journal_key(worker))
+            if rooms:
+                pipe.hset(storage.snapshot_key(worker), mapping=rooms)
+                pipe.expire(storage.snapshot_key(worker), RECOVERY_KEY_TTL)
+            await pipe.execute()
+
+    @classmethod
+    async def recover(cls):
+        """Rebuild the rooms this worker was simulating before it stopped"""
+        worker = settings.PONG_WORKER_ID
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(storage.snapshot_key(worker))
+            pipe.xrange(storage.journal_key(worker))
+            snapshots, journal = await pipe.execute()
+
+        entries = [(fields['room'], fields['action'], json.loads(fields['payload'])) for _, fields in journal]
+        room_codes = list(snapshots)
+        room_codes += [room_code for room_code, _, _ in entries if room_code not in snapshots]
+        room_codes = list(dict.fromkeys(room_codes))
+        if not room_codes:
+            return
+
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for room_code in room_codes:
+                for key in storage.room_keys(room_code):
+                    pipe.hgetall(key)
+            hashes = await pipe.execute()
+
+        games = {}
+        for index, room_code in enumerate(room_codes):
+            meta, state, sessions = hashes[index * 3:index * 3 + 3]
+            # The state hash is flushed more often than the snapshot, so prefer it
+            if not state and room_code in snapshots:
+                state = storage.unpack_snapshot(snapshots[room_code])
+            game = GameManager.restore_game(room_code, meta, state, sessions)
+            if game:
+                games[room_code] = game
+
+        for room_code, action, payload in entries:
+            if action == 'delete' and room_code in games:
+                del games[room_code]
+                GameManager.delete_game(room_code)
+            elif room_code in games:
+                # A bad entry must not stop every later restart from recovering
+                try:
+                    cls._replay(games[room_code], action, payload)
+                except Exception:
+                    logger.exception(f"Skipping journaled {action} for room {room_code}")
+
+        for game in games.values():
+            if game.status == 'ONGOING':
+                cls._resume_paused(game)
+
+        logger.info(f"Recovered {RoomScheduler.room_count()} rooms for worker {worker}")
+        await cls.write_snapshot()
+
+    @classmethod
+    def _replay(cls, game, action, payload):
+        """Apply a journaled command to a recovered game without side effects"""
+        # Held keys, pauses and resumes are dropped: recovered games restart
+        # paused with every key released
+        if action == 'paddle_position' and settings.GAME_INPUT_MODE != 'keys':
+            position = paddle_position_value(payload['position'])
+            if position is not None:
+                game.set_paddle_position(payload['player_number'], position)
+        elif action == 'resume' and payload.get('ball_speed_x') is not None:
+            serve = serve_speed_values(payload['ball_speed_x'], payload.get('ball_speed_y'))
+            if serve is not None:
+                game.ball_speed_x, game.ball_speed_y = serve
+        elif action == 'sync_players':
+            for name, value in payload['fields'].items():
+                setattr(game, name, value)
+        elif action == 'start' and game.status != 'FINISHED' and game.player_1_id and game.player_2_id:
+            game.status = 'ONGOING'
+
+    @classmethod
+    def _resume_paused(cls, game):
+        """Schedule a recovered match again, paused until its players rejoin"""
+        game.is_paused = True
+        game.release_keys(1)
+        game.release_keys(2)
+        GameManager.save_game(game)
+
+        for player_id in (game.player_1_id, game.player_2_id):
+            if player_id:
+                GameManager.update_player_session(game.room_code, player_id, connected=False)
+
+        RoomScheduler.start_room(game.room_code)
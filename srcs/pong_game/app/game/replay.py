@@ -0,0 +1,299 @@
+import asyncio
+import bisect
+import collections
+import json
+import logging
+import os
+import re
+import struct
+import time
+from django.conf import settings
+from .protocol import FRAME_HEADER, encode_state_frame
+from ..constants import SERVER_UPDATE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Replay files, one per finished match, in GAME_REPLAY_DIR
+#
+#   magic    8s      b'PONGRPL1'
+#   header   <I + n  length-prefixed JSON: room, players, final score, tick rate, first tick
+#   frames   <H + n  length-prefixed binary state frames (see protocol.py); every
+#                    segment starts with a keyframe, followed by its deltas
+#   index    <II*    (tick, file offset) of every segment's keyframe
+#   trailer  <II     index offset, index entry count
+#
+# The index lets readers seek to the keyframe before any tick and stream from
+# there without reading the frames before it.
+
+REPLAY_MAGIC = b'PONGRPL1'
+RECORD_LENGTH = struct.Struct('<H')
+INDEX_ENTRY = struct.Struct('<II')
+TRAILER = struct.Struct('<II')
+HEADER_LENGTH = struct.Struct('<I')
+
+REPLAY_ID_PATTERN = re.compile(r'^\w+-\d+$')
+
+PRUNE_INTERVAL = 3600
+
+
+class ReplaySegment:
+    """A keyframe and the delta frames that follow it, stored back to back"""
+
+    __slots__ = ('tick', 'frames')
+
+    def __init__(self, tick, keyframe):
+        self.tick = tick
+        self.frames = bytearray(RECORD_LENGTH.pack(len(keyframe)) + keyframe)
+
+    def append(self, frame):
+        self.frames += RECORD_LENGTH.pack(len(frame))
+        self.frames += frame
+
+
+class ReplayRecording:
+    """
+    The in-memory replay of one running match: a ring of segments holding at
+    most GAME_REPLAY_MAX_DURATION seconds, whose oldest segments are dropped
+    whole so the replay always starts on a keyframe.
+    """
+
+    __slots__ = ('room_code', 'next_keyframe', 'keyframe_ticks', 'segments', 'started_at')
+
+    def __init__(self, room_code, tick):
+        self.keyframe_ticks = max(1, int(settings.GAME_REPLAY_KEYFRAME_INTERVAL * SERVER_UPDATE_RATE))
+        max_segments = max(1, int(settings.GAME_REPLAY_MAX_DURATION // settings.GAME_REPLAY_KEYFRAME_INTERVAL))
+
+        self.room_code = room_code
+        self.next_keyframe = tick
+        self.segments = collections.deque(maxlen=max_segments)
+        self.started_at = time.time()
+
+    def record(self, snapshot, frame, tick):
+        """Add a tick's delta frame, or a keyframe when a new segment is due"""
+        if tick >= self.next_keyframe or not self.segments:
+            self.segments.append(ReplaySegment(tick, encode_state_frame(snapshot, 0, tick, keyframe=True)))
+            self.next_keyframe = tick + self.keyframe_ticks
+        elif frame:
+            self.segments[-1].append(frame)
+
+
+class ReplayRecorder:
+    """
+    Records the binary state frames the scheduler broadcasts for each match
+    and writes them to GAME_REPLAY_DIR when the match is won. Recordings of
+    rooms that stop without a winner are dropped.
+    """
+
+    _recordings = {}
+    _pruned_at = 0
+
+    @classmethod
+    def record(cls, room_code, snapshot, frame, tick):
+        """Record a room's frame for this tick, starting its recording if needed"""
+        if not settings.GAME_REPLAY_ENABLED:
+            return
+
+        recording = cls._recordings.get(room_code)
+        if recording is None:
+            recording = cls._recordings[room_code] = ReplayRecording(room_code, tick)
+
+        recording.record(snapshot, frame, tick)
+
+    @classmethod
+    def discard(cls, room_code):
+        """Drop a room's recording without saving it"""
+        cls._recordings.pop(room_code, None)
+
+    @classmethod
+    def finish(cls, game, snapshot, tick):
+        """
+        Close a finished match's recording with a final keyframe and write it
+        in the background. Returns the replay id, or None if nothing was recorded.
+        """
+        recording = cls._recordings.pop(game.room_code, None)
+        if recording is None or snapshot is None:
+            return None
+
+        game.snapshot_into(snapshot)
+        recording.segments.append(ReplaySegment(tick, encode_state_frame(snapshot, 0, tick, keyframe=True)))
+
+        replay_id = f"{game.room_code}-{int(recording.started_at)}"
+        header = {
+            'replay_id': replay_id,
+            'room_code': game.room_code,
+            'player_1_id': game.player_1_id,
+            'player_2_id': game.player_2_id,
+            'player_1_username': game.player_1_username,
+            'player_2_username': game.player_2_username,
+            'player_1_score': game.player_1_score,
+            'player_2_score': game.player_2_score,
+            'winning_score': game.winning_score,
+            'tick_rate': SERVER_UPDATE_RATE,
+            'first_tick': recording.segments[0].tick,
+            'last_tick': tick,
+            'started_at': recording.started_at,
+            'ended_at': time.time(),
+        }
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(None, cls._write, replay_id, header, list(recording.segments))
+        task.add_done_callback(cls._log_write_error)
+        return replay_id
+
+    @classmethod
+    def _log_write_error(cls, task):
+        if task.exception():
+            logger.error(f"Error writing replay: {str(task.exception())}")
+
+    @classmethod
+    def _write(cls, replay_id, header, segments):
+        os.makedirs(settings.GAME_REPLAY_DIR, exist_ok=True)
+        path = replay_path(replay_id)
+        header_bytes = json.dumps(header).encode()
+
+        with open(path + '.tmp', 'wb') as replay_file:
+            replay_file.write(REPLAY_MAGIC)
+            replay_file.write(HEADER_LENGTH.pack(len(header_bytes)))
+            replay_file.write(header_bytes)
+
+            index = []
+            for segment in segments:
+                index.append(INDEX_ENTRY.pack(segment.tick & 0xFFFFFFFF, replay_file.tell()))
+                replay_file.write(segment.frames)
+
+            index_offset = replay_file.tell()
+            replay_file.write(b''.join(index))
+            replay_file.write(TRAILER.pack(index_offset, len(index)))
+
+        os.replace(path + '.tmp', path)
+        logger.info(f"Saved replay {replay_id} ({index_offset} bytes of frames)")
+
+        if time.time() - cls._pruned_at > PRUNE_INTERVAL:
+            cls._pruned_at = time.time()
+            prune_replays()
+
+
+def replay_path(replay_id):
+    return os.path.join(settings.GAME_REPLAY_DIR, f"{replay_id}.replay")
+
+
+def prune_replays():
+    """Delete replays older than GAME_REPLAY_RETENTION_DAYS"""
+    cutoff = time.time() - settings.GAME_REPLAY_RETENTION_DAYS * 86400
+    removed = 0
+
+    for entry in os.scandir(settings.GAME_REPLAY_DIR):
+        if entry.name.endswith('.replay') and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+
+    if removed:
+        logger.info(f"Pruned {removed} expired replays")
+
+
+class ReplayReader:
+    """
+    Reads a replay file lazily: only the header and keyframe index are
+    loaded up front, frames are read as they are streamed.
+
+    aopen() and aframes() are the event-loop versions of the constructor and
+    frames(): they do their file reads in the default executor.
+    """
+
+    @classmethod
+    async def aopen(cls, replay_id):
+        """Open a replay and read its header and index off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, cls, replay_id)
+
+    def __init__(self, replay_id):
+        if not REPLAY_ID_PATTERN.match(replay_id):
+            raise FileNotFoundError(f"No replay {replay_id}")
+
+        self.file = open(replay_path(replay_id), 'rb')
+
+        try:
+            if self.file.read(len(REPLAY_MAGIC)) != REPLAY_MAGIC:
+                raise ValueError(f"{replay_id} is not a replay file")
+
+            (header_length,) = HEADER_LENGTH.unpack(self.file.read(HEADER_LENGTH.size))
+            self.header = json.loads(self.file.read(header_length))
+
+            self.file.seek(-TRAILER.size, os.SEEK_END)
+            self.index_offset, count = TRAILER.unpack(self.file.read(TRAILER.size))
+            self.file.seek(self.index_offset)
+            index = self.file.read(count * INDEX_ENTRY.size)
+            entries = [INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size) for i in range(count)]
+        except Exception:
+            self.file.close()
+            raise
+
+        self.keyframe_ticks = [tick for tick, _ in entries]
+        self.keyframe_offsets = [offset for _, offset in entries]
+
+    def close(self):
+        self.file.close()
+
+    def _start_offset(self, from_tick):
+        """Offset of the last keyframe at or before from_tick"""
+        segment = 0
+        if from_tick is not None and self.keyframe_ticks:
+            segment = max(0, bisect.bisect_right(self.keyframe_ticks, from_tick) - 1)
+
+        return self.keyframe_offsets[segment] if self.keyframe_offsets else self.index_offset
+
+    def _seek(self, from_tick):
+        """Move to the last keyframe at or before from_tick and return its offset"""
+        offset = self._start_offset(from_tick)
+        self.file.seek(offset)
+        return offset
+
+    def frames(self, from_tick=None):
+        """Yield (tick, frame) from the last keyframe at or before from_tick"""
+        offset = self._seek(from_tick)
+
+        while offset < self.index_offset:
+            (length,) = RECORD_LENGTH.unpack(self.file.read(RECORD_LENGTH.size))
+            frame = self.file.read(length)
+            offset += RECORD_LENGTH.size + length
+            yield FRAME_HEADER.unpack_from(frame)[3], frame
+
+    def chunks(self, from_tick=None, size=65536):
+        """The raw frame records from the last keyframe at or before from_tick, in chunks"""
+        offset = self._seek(from_tick)
+
+        while offset < self.index_offset:
+            chunk = self.file.read(min(size, self.index_offset - offset))
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+
+    async def aframes(self, from_tick=None, size=65536):
+        """
+        frames() for the event loop. The file is read in chunks in the
+        executor, at explicit offsets so a playback that was cancelled
+        mid-read cannot move another one's position.
+        """
+        loop = asyncio.get_running_loop()
+        fileno = self.file.fileno()
+        offset = self._start_offset(from_tick)
+        buffer = b''
+
+        while offset < self.index_offset:
+            chunk = await loop.run_in_executor(None, os.pread, fileno, min(size, self.index_offset - offset), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            buffer += chunk
+
+            position = 0
+            while position + RECORD_LENGTH.size <= len(buffer):
+                (length,) = RECORD_LENGTH.unpack_from(buffer, position)
+                end = position + RECORD_LENGTH.size + length
+                if end > len(buffer):
+                    break
+                frame = buffer[position + RECORD_LENGTH.size:end]
+                position = end
+                yield FRAME_HEADER.unpack_from(frame)[3], frame
+
+            buffer = buffer[position:]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from django.conf import settings
+from .manager import REDIS_AVAILABLE, async_redis_client
+from .services import UserManagementClient
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+
+class ResultOutbox:
+    """
+    Durable queue of finished games waiting to be recorded by user_management.
+
+    Results are appended to this worker's results:outbox:<worker> list and a
+    background task posts them to /api/game/add-batch/ up to GAME_RESULT_BATCH
+    at a time, removing them only once the batch is acknowledged. Failed
+    deliveries are retried with exponential backoff up to GAME_RESULT_RETRY_MAX
+    seconds, and each result carries an idempotency key derived from its room,
+    so a batch resent after a lost response is not recorded twice. Results
+    left by a previous run of the worker are delivered when it starts again.
+    """
+
+    _pending = []
+    _task = None
+    _wake = None
+
+    @classmethod
+    def ensure_started(cls):
+        if cls._task is None or cls._task.done():
+            cls._wake = asyncio.Event()
+            cls._task = asyncio.get_running_loop().create_task(cls._run())
+
+    @classmethod
+    async def submit(cls, game):
+        """Queue a finished game's result for delivery"""
+        result = {
+            'idempotency_key': f"{game.room_code}-{int(game.created_at * 1000)}",
+            'player_1': int(game.player_1_id),
+            'player_2': int(game.player_2_id),
+            'score_1': game.player_1_score,
+            'score_2': game.player_2_score,
+            'finished_at': time.time(),
+        }
+
+        if REDIS_AVAILABLE:
+            await async_redis_client.rpush(storage.results_outbox_key(settings.PONG_WORKER_ID), json.dumps(result))
+        else:
+            cls._pending.append(json.dumps(result))
+
+        logger.info(f"Queued result of room {game.room_code} for recording")
+        cls.ensure_started()
+        cls._wake.set()
+
+    @classmethod
+    async def _run(cls):
+        failures = 0
+
+        while True:
+            cls._wake.clear()
+            try:
+                delivered = await cls._deliver()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(settings.GAME_RESULT_RETRY_BASE * 2 ** (failures - 1), settings.GAME_RESULT_RETRY_MAX)
+                delay *= random.uniform(0.5, 1)
+                logger.warning(f"Could not deliver game results (attempt {failures}), retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+
+            if delivered:
+                continue
+
+            try:
+                await asyncio.wait_for(cls._wake.wait(), settings.GAME_RESULT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    async def _deliver(cls):
+        """Post the oldest batch of results. Returns how many were taken off the outbox"""
+        key = storage.results_outbox_key(settings.PONG_WORKER_ID)
+        batch = settings.GAME_RESULT_BATCH
+
+        if REDIS_AVAILABLE:
+            entries = await async_redis_client.lrange(key, 0, batch - 1)
+        else:
+            entries = cls._pending[:batch]
+        if not entries:
+            return 0
+
+        results = [json.loads(entry) for entry in entries]
+
+        async with UserManagementClient.session().post('/api/game/add-batch/', json={'results': results}) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {(await response.text())[:200]}")
+            outcomes = (await response.json())['results']
+
+        for outcome in outcomes:
+            if outcome['status'] == 'rejected':
+                logger.error(f"Game result {outcome['idempotency_key']} rejected: {outcome['error']}")
+
+        # Only this worker consumes its outbox, so the batch is still at its head
+        if REDIS_AVAILABLE:
+            await async_redis_client.ltrim(key, len(entries), -1)
+        else:
+            del cls._pending[:len(entries)]
+
+        logger.info(f"Recorded {len(entries)} game results")
+        return len(entries)
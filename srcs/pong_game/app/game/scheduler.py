@@ -0,0 +1,474 @@
+import asyncio
+import logging
+import math
+import time
+from django.conf import settings
+from .manager import GameManager
+from .fanout import RoomBroadcaster
+from .batch import BatchPhysicsEngine, NUMPY_AVAILABLE
+from .inputs import InputQueue
+from .replay import ReplayRecorder
+from .netcode import Netcode
+from .state import StateSnapshot
+from .protocol import encode_state_frame, encode_state_text, NUMERIC_MASK
+from ..constants import SERVER_UPDATE_RATE, PADDLE_SPEED_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class RoomScheduler:
+    """
+    Process-wide simulation scheduler.
+
+    Every active room is ticked from a single timer driven by the event loop's
+    monotonic clock. Rooms are kept in a timer wheel keyed by the tick they are
+    next due on, so all rooms due in the same frame are stepped in one batch and
+    their broadcasts are sent together through the RoomBroadcaster. Rooms are
+    owned by the scheduler, not by a consumer, so socket churn never stops a
+    simulation.
+
+    With GAME_ADAPTIVE_TICK_RATE, each room is rescheduled at its own period:
+    paused rooms run at GAME_IDLE_TICK_RATE until a command wakes them, and
+    in 'fixed' physics mode running rooms ramp from GAME_MIN_TICK_RATE up to
+    SERVER_UPDATE_RATE with ball speed, falling back to GAME_MIN_TICK_RATE
+    while the loop is over its GAME_TICK_BUDGET.
+    """
+
+    _wheel = {}
+    _room_due = {}
+    _snapshots = {}
+    _last_step = {}
+    _rates = {}
+    _tick = 0
+    _task = None
+    _frame_duration = 1 / SERVER_UPDATE_RATE
+    _batch_engine = None
+    _load = 0.0
+    _reported_at = 0
+    _result_tasks = set()
+
+    @classmethod
+    def start_room(cls, room_code):
+        """Start ticking a room on the next frame"""
+        if room_code in cls._room_due:
+            return
+
+        logger.info(f"Scheduling simulation for room {room_code}")
+        cls._schedule(room_code, cls._tick + 1)
+        cls._last_step[room_code] = cls._tick
+        cls._ensure_running()
+
+    @classmethod
+    def wake(cls, room_code):
+        """Step a room on the next frame, ahead of its adaptive schedule"""
+        due = cls._room_due.get(room_code)
+        if due is None or due <= cls._tick + 1:
+            return
+
+        slot = cls._wheel.get(due)
+        if slot:
+            slot.discard(room_code)
+            if not slot:
+                del cls._wheel[due]
+        cls._schedule(room_code, cls._tick + 1)
+
+    @classmethod
+    def stop_room(cls, room_code):
+        """Stop ticking a room and forget its last broadcast snapshot"""
+        due = cls._room_due.pop(room_code, None)
+        if due is not None:
+            slot = cls._wheel.get(due)
+            if slot:
+                slot.discard(room_code)
+                if not slot:
+                    del cls._wheel[due]
+
+        cls._forget(room_code)
+
+    @classmethod
+    def _forget(cls, room_code):
+        cls._snapshots.pop(room_code, None)
+        cls._last_step.pop(room_code, None)
+        cls._rates.pop(room_code, None)
+        InputQueue.discard(room_code)
+        ReplayRecorder.discard(room_code)
+        Netcode.discard(room_code)
+        RoomBroadcaster.forget_room(room_code)
+
+    @classmethod
+    def is_scheduled(cls, room_code):
+        """Check whether a room is currently being simulated"""
+        return room_code in cls._room_due
+
+    @classmethod
+    def room_count(cls):
+        """Number of rooms currently being simulated"""
+        return len(cls._room_due)
+
+    @classmethod
+    def rooms(cls):
+        """Codes of the rooms currently being simulated"""
+        return list(cls._room_due)
+
+    @classmethod
+    def stats(cls):
+        """Loop load (share of the frame spent working) and each room's achieved tick rate"""
+        return {
+            'rooms': len(cls._room_due),
+            'load': round(cls._load, 3),
+            'rates': {room_code: round(rate, 1) for room_code, rate in cls._rates.items()},
+        }
+
+    @classmethod
+    def _schedule(cls, room_code, tick):
+        cls._room_due[room_code] = tick
+        cls._wheel.setdefault(tick, set()).add(room_code)
+
+    @classmethod
+    def _ensure_running(cls):
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.get_running_loop().create_task(cls._run())
+
+    @classmethod
+    async def _run(cls):
+        """Timer loop: wake once per frame and step every room due on it"""
+        loop = asyncio.get_running_loop()
+        frame_duration = cls._frame_duration
+        spectator_interval = max(1, round(SERVER_UPDATE_RATE / settings.GAME_SPECTATOR_RATE))
+        next_deadline = loop.time()
+
+        logger.info("Room scheduler started")
+
+        try:
+            while cls._room_due:
+                cls._tick += 1
+                due_rooms = cls._wheel.pop(cls._tick, ())
+                started = loop.time()
+
+                cls._apply_inputs(due_rooms)
+
+                scorers = None
+                if cls._use_batch_physics():
+                    try:
+                        scorers = cls._batch_step(due_rooms)
+                    except Exception:
+                        logger.exception("Error in batch physics step")
+
+                broadcasts = []
+                for room_code in due_rooms:
+                    cls._room_due.pop(room_code, None)
+                    events = []
+                    try:
+                        keep = cls._step_room(room_code, events, scorers)
+                    except Exception:
+                        logger.exception(f"Error stepping room {room_code}")
+                        keep = True
+
+                    if events:
+                        broadcasts.append(cls._broadcast(room_code, events))
+
+                    if keep:
+                        cls._record_step(room_code)
+                        cls._schedule(room_code, cls._tick + cls._period(room_code))
+                    else:
+                        cls._forget(room_code)
+
+                if cls._tick % spectator_interval == 0:
+                    broadcasts.extend(cls._spectator_broadcasts())
+
+                if broadcasts:
+                    results = await asyncio.gather(*broadcasts, return_exceptions=True)
+                    for result in results:
+                        if isinstance(result, Exception):
+                            logger.error(f"Error broadcasting room update: {str(result)}")
+
+                next_deadline += frame_duration
+                now = loop.time()
+
+                cls._load += ((now - started) / frame_duration - cls._load) * 0.05
+                if now - cls._reported_at > settings.GAME_TICK_REPORT_INTERVAL:
+                    cls._reported_at = now
+                    cls._report()
+                if next_deadline < now - frame_duration:
+                    logger.warning(f"Room scheduler fell behind by {now - next_deadline:.3f}s, resyncing")
+                    next_deadline = now
+
+                await asyncio.sleep(max(0, next_deadline - now))
+
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error in room scheduler")
+        finally:
+            logger.info("Room scheduler stopped")
+
+    @classmethod
+    def _elapsed(cls, room_code):
+        """Seconds of simulation time a room is due since its last step"""
+        return (cls._tick - cls._last_step.get(room_code, cls._tick - 1)) * cls._frame_duration
+
+    @classmethod
+    def _record_step(cls, room_code):
+        """Remember when a room was stepped and update its achieved rate"""
+        elapsed = cls._elapsed(room_code)
+        previous = cls._rates.get(room_code)
+        # Exponential average over roughly the last second
+        weight = min(1.0, elapsed)
+        cls._rates[room_code] = 1 / elapsed if previous is None else previous + (1 / elapsed - previous) * weight
+        cls._last_step[room_code] = cls._tick
+
+    @classmethod
+    def _period(cls, room_code):
+        """Ticks until a room's next step"""
+        if not settings.GAME_ADAPTIVE_TICK_RATE:
+            return 1
+
+        game = GameManager.get_game(room_code)
+        if not game:
+            return 1
+
+        if game.is_paused:
+            if game.player_1_moving_up or game.player_1_moving_down or game.player_2_moving_up or game.player_2_moving_down:
+                return 1
+            return max(1, round(SERVER_UPDATE_RATE / settings.GAME_IDLE_TICK_RATE))
+
+        # Legacy physics moves the ball a fixed distance per tick, so only
+        # time-based ('fixed') physics can run at a lower rate
+        if settings.GAME_PHYSICS_MODE != 'fixed':
+            return 1
+
+        speed = math.hypot(game.ball_speed_x, game.ball_speed_y)
+        ramp = min(1.0, speed / settings.GAME_FAST_BALL_SPEED)
+        rate = settings.GAME_MIN_TICK_RATE + (SERVER_UPDATE_RATE - settings.GAME_MIN_TICK_RATE) * ramp
+
+        if cls._load > settings.GAME_TICK_BUDGET and ramp < 1:
+            rate = settings.GAME_MIN_TICK_RATE
+
+        return max(1, round(SERVER_UPDATE_RATE / rate))
+
+    @classmethod
+    def _report(cls):
+        if not cls._rates:
+            return
+
+        rates = sorted(cls._rates.values())
+        logger.info(
+            f"Room scheduler: {len(rates)} rooms, load {cls._load:.0%}, "
+            f"tick rate min {rates[0]:.1f} / median {rates[len(rates) // 2]:.1f} / max {rates[-1]:.1f} Hz"
+        )
+
+    @classmethod
+    async def _broadcast(cls, room_code, events):
+        """Send one room's events in order"""
+        for event in events:
+            await RoomBroadcaster.broadcast(room_code, event)
+
+    @classmethod
+    def _spectator_broadcasts(cls):
+        """
+        Encode one keyframe per spectated room for the spectator tier, shared
+        by all of the room's spectators. Runs every few ticks, on rooms this
+        worker simulates, and costs nothing for rooms without spectators.
+        """
+        broadcasts = []
+
+        for room_code in list(RoomBroadcaster.spectated_rooms()):
+            snapshot = cls._snapshots.get(room_code)
+            game = GameManager.get_game(room_code) if snapshot is not None else None
+            if not game:
+                continue
+
+            broadcasts.append(RoomBroadcaster.broadcast_spectators(room_code, {
+                'type': 'spectator_state',
+                'text': encode_state_text({**game.to_dict(), 'tick': cls._tick}, is_full_state=True),
+                'bytes': encode_state_frame(snapshot, 0, cls._tick, keyframe=True)
+            }))
+
+        return broadcasts
+
+    @classmethod
+    def _apply_inputs(cls, due_rooms):
+        """
+        Apply the inputs queued since the last frame and, in 'keys' input mode,
+        integrate held-key paddle motion, before physics runs.
+        """
+        keys_mode = settings.GAME_INPUT_MODE == 'keys'
+
+        for room_code in due_rooms:
+            game = GameManager.get_game(room_code)
+            if not game or game.status == 'FINISHED':
+                continue
+
+            try:
+                changed = InputQueue.drain_into(room_code, game)
+                Netcode.process_inputs(room_code)
+                if keys_mode:
+                    # Capped so a key pressed in a room that was idling does not jump the paddle
+                    elapsed = min(cls._elapsed(room_code), 1 / settings.GAME_MIN_TICK_RATE)
+                    changed = game.move_paddles(game.paddle_speed * PADDLE_SPEED_RATE * elapsed) or changed
+
+                if changed:
+                    GameManager.save_game(game)
+            except Exception:
+                logger.exception(f"Error applying inputs to room {room_code}")
+
+    @classmethod
+    def _use_batch_physics(cls):
+        if not settings.GAME_BATCH_PHYSICS or settings.GAME_PHYSICS_MODE != 'legacy':
+            return False
+        if not NUMPY_AVAILABLE:
+            logger.warning("GAME_BATCH_PHYSICS is enabled but numpy is not installed")
+            settings.GAME_BATCH_PHYSICS = False
+            return False
+        return True
+
+    @classmethod
+    def _batch_step(cls, due_rooms):
+        """
+        Step the physics of every running room due this frame in one vectorized pass.
+        Returns {room_code: scorer} for the rooms that were stepped.
+        """
+        room_codes = []
+        games = []
+        for room_code in due_rooms:
+            game = GameManager.get_game(room_code)
+            if game and not game.is_paused and game.status != 'FINISHED':
+                room_codes.append(room_code)
+                games.append(game)
+
+        if not games:
+            return {}
+
+        if cls._batch_engine is None:
+            cls._batch_engine = BatchPhysicsEngine()
+
+        engine = cls._batch_engine
+        engine.load(games)
+        engine.step()
+        engine.store(games)
+
+        return dict(zip(room_codes, engine.scorer.tolist()))
+
+    @classmethod
+    def _step_room(cls, room_code, events, scorers=None):
+        """
+        Advance one room by a frame and queue its broadcasts.
+        scorers holds the outcome for rooms already stepped by the batch engine.
+        Returns False once the room no longer needs ticking.
+        """
+        game = GameManager.get_game(room_code)
+        if not game or game.status == 'FINISHED':
+            return False
+
+        batch_stepped = scorers is not None and room_code in scorers
+
+        if batch_stepped or not game.is_paused:
+            if batch_stepped:
+                scorer = scorers[room_code]
+            elif settings.GAME_PHYSICS_MODE == 'fixed':
+                scorer = game.advance(cls._elapsed(room_code))
+            else:
+                scorer = game.update()
+
+            if scorer > 0 and Netcode.rewind_goal(room_code, game, scorer, cls._tick):
+                scorer = 0
+
+            if scorer > 0:
+                events.append(cls._goal_scored_event(game, scorer))
+
+            winner = game.check_for_winner()
+            if winner > 0:
+                event = cls._game_over_event(game, winner)
+                replay_id = ReplayRecorder.finish(game, cls._snapshots.get(room_code), cls._tick)
+                if replay_id:
+                    event['replay_id'] = replay_id
+                events.append(event)
+                GameManager.save_game(game)
+                GameManager.schedule_expiry(room_code, settings.FINISHED_GAME_TTL)
+                task = asyncio.get_running_loop().create_task(cls._record_result(game))
+                cls._result_tasks.add(task)
+                task.add_done_callback(cls._result_tasks.discard)
+                return False
+
+            GameManager.save_game(game)
+
+        snapshot = cls._snapshots.get(room_code)
+
+        if snapshot is not None:
+            changed = game.snapshot_into(snapshot)
+            acks = Netcode.take_acks(room_code)
+            frame = encode_state_frame(snapshot, changed, cls._tick) if changed else None
+
+            if changed or acks:
+                delta = game.delta_from_mask(changed)
+                if acks:
+                    delta['input_acks'] = {'1': acks[0], '2': acks[1]}
+                event = {
+                    'type': 'game_state_update',
+                    'text': encode_state_text(delta)
+                }
+                # Binary frames only carry numeric fields, so a delta that also
+                # changes player ids or usernames goes out as JSON to everyone
+                if not changed & ~NUMERIC_MASK:
+                    event['bytes'] = encode_state_frame(snapshot, changed, cls._tick, acks=acks) if acks else frame
+                events.append(event)
+
+            ReplayRecorder.record(room_code, snapshot, frame, cls._tick)
+        else:
+            snapshot = StateSnapshot()
+            game.snapshot_into(snapshot)
+            cls._snapshots[room_code] = snapshot
+            ReplayRecorder.record(room_code, snapshot, None, cls._tick)
+
+            events.append({
+                'type': 'game_state_update',
+                'text': encode_state_text(game.to_dict(), is_full_state=True)
+            })
+
+        Netcode.record_state(room_code, cls._tick, snapshot)
+        return True
+
+    @classmethod
+    def _goal_scored_event(cls, game, scorer):
+        player_1_username = game.player_1_username or "Player 1"
+        player_2_username = game.player_2_username or "Player 2"
+
+        logger.info(f"Goal scored by player {scorer} ({player_1_username if scorer == 1 else player_2_username})")
+
+        return {
+            'type': 'goal_scored',
+            'scorer': scorer,
+            'player_1_score': game.player_1_score,
+            'player_2_score': game.player_2_score,
+            'player_1_username': player_1_username,
+            'player_2_username': player_2_username,
+            'timestamp': time.time() * 1000
+        }
+
+    @classmethod
+    def _game_over_event(cls, game, winner):
+        game.status = 'FINISHED'
+
+        player_1_username = game.player_1_username or "Player 1"
+        player_2_username = game.player_2_username or "Player 2"
+
+        winner_username = player_1_username if winner == 1 else player_2_username
+        logger.info(f"Game over - Winner: Player {winner} ({winner_username})")
+
+        return {
+            'type': 'game_over',
+            'winner': winner,
+            'player_1_score': game.player_1_score,
+            'player_2_score': game.player_2_score,
+            'player_1_username': player_1_username,
+            'player_2_username': player_2_username,
+            'timestamp': time.time() * 1000
+        }
+
+    @classmethod
+    async def _record_result(cls, game):
+        try:
+            logger.info(f"Recording game result for room {game.room_code}")
+            await GameManager.record_game_result(game)
+        except Exception as e:
+            logger.error(f"Failed to record game result: {str(e)}")
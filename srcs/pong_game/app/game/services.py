@@ -0,0 +1,24 @@
+import os
+import aiohttp
+from django.conf import settings
+
+
+class UserManagementClient:
+    """
+    One long-lived HTTP session to user_management per worker, so requests
+    reuse pooled keep-alive connections instead of opening a session each.
+    """
+
+    _session = None
+
+    @classmethod
+    def session(cls):
+        """The shared session; paths are relative to USER_MANAGEMENT_URL"""
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                base_url=settings.USER_MANAGEMENT_URL,
+                connector=aiohttp.TCPConnector(limit=settings.USER_MANAGEMENT_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=settings.USER_MANAGEMENT_TIMEOUT),
+                headers={'X-API-Key': os.getenv('INTERNAL_API_TOKEN') or ''}
+            )
+        return cls._session
@@ -0,0 +1,233 @@
+import asyncio
+import bisect
+import logging
+import re
+import zlib
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .manager import GameManager, REDIS_AVAILABLE, redis_client, async_redis_client
+from .actions import RoomActions, player_fields
+from .codes import RoomCodeAllocator
+
+logger = logging.getLogger(__name__)
+
+ROOM_OWNER_TTL = 3600
+INBOX_REFRESH_INTERVAL = 3600
+
+
+class HashRing:
+    """
+    Consistent hash ring over worker ids.
+
+    The ring is laid out exactly like nginx's `hash $key consistent` (ketama,
+    160 CRC32 points per server named "host:port"), so when the worker ids
+    match the upstream's server entries nginx sends a room's sockets straight
+    to the worker that owns it.
+    """
+
+    POINTS_PER_WORKER = 160
+
+    def __init__(self, workers):
+        points = {}
+
+        for worker in workers:
+            host, _, port = worker.rpartition(':')
+            if not port.isdigit():
+                host, port = worker, ''
+
+            base = zlib.crc32(host.encode() + b'\0' + port.encode())
+            previous = 0
+            for _ in range(self.POINTS_PER_WORKER):
+                point = zlib.crc32(previous.to_bytes(4, 'little'), base)
+                points.setdefault(point, worker)
+                previous = point
+
+        self._hashes = sorted(points)
+        self._workers = [points[point] for point in self._hashes]
+
+    def get(self, key):
+        """Worker owning key"""
+        if not self._hashes:
+            return None
+
+        index = bisect.bisect_left(self._hashes, zlib.crc32(key.encode()))
+        return self._workers[index % len(self._workers)]
+
+
+class ShardRouter:
+    """
+    Routes every room to a single owner worker.
+
+    The owner runs the room's simulation and is the only worker that mutates
+    its GameState. Ownership comes from the hash ring over PONG_WORKERS and is
+    published in Redis as room_owner:<room_code>, where it stays sticky while
+    the room lives even if the worker set changes. Other workers forward room
+    commands to the owner's channel-layer group pong_worker.<worker_id>, which
+    the owner drains in a single worker-level receive loop.
+    """
+
+    _ring = None
+    _owners = {}
+    _inbox_task = None
+
+    @classmethod
+    def ring(cls):
+        if cls._ring is None:
+            cls._ring = HashRing(settings.PONG_WORKERS)
+        return cls._ring
+
+    @classmethod
+    def owner_for(cls, room_code):
+        """Worker that owns a room"""
+        owner = cls._owners.get(room_code)
+        if owner:
+            return owner
+        return cls.ring().get(room_code) or settings.PONG_WORKER_ID
+
+    @classmethod
+    def is_local(cls, room_code):
+        """Check whether this worker owns a room"""
+        return cls.owner_for(room_code) == settings.PONG_WORKER_ID
+
+    @classmethod
+    def generate_local_room_code(cls):
+        """Reserve a room code owned by this worker, so its creator lands here"""
+        return RoomCodeAllocator.allocate(cls.ring())
+
+    @classmethod
+    async def agenerate_local_room_code(cls):
+        """Async variant of generate_local_room_code"""
+        return await RoomCodeAllocator.aallocate(cls.ring())
+
+    @classmethod
+    def claim(cls, room_code):
+        """Publish this room's owner in Redis (sync, for HTTP views)"""
+        owner = cls.ring().get(room_code) or settings.PONG_WORKER_ID
+        if not REDIS_AVAILABLE:
+            return owner
+
+        try:
+            key = f"room_owner:{room_code}"
+            redis_client.set(key, owner, ex=ROOM_OWNER_TTL, nx=True)
+            return cls._adopt(room_code, redis_client.get(key), owner)
+        except Exception as e:
+            logger.error(f"Error claiming room {room_code}: {str(e)}")
+            return owner
+
+    @classmethod
+    async def aclaim(cls, room_code):
+        """Publish this room's owner in Redis, keeping any live previous owner"""
+        owner = cls.ring().get(room_code) or settings.PONG_WORKER_ID
+        if not REDIS_AVAILABLE:
+            return owner
+
+        try:
+            key = f"room_owner:{room_code}"
+            async with async_redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(key, owner, ex=ROOM_OWNER_TTL, nx=True)
+                pipe.get(key)
+                pipe.expire(key, ROOM_OWNER_TTL)
+                _, published, _ = await pipe.execute()
+
+            owner = cls._adopt(room_code, published, owner)
+            if owner != published:
+                await async_redis_client.set(key, owner, ex=ROOM_OWNER_TTL)
+            return owner
+        except Exception as e:
+            logger.error(f"Error claiming room {room_code}: {str(e)}")
+            return owner
+
+    @classmethod
+    def _adopt(cls, room_code, published, owner):
+        # Only owners that differ from the ring are remembered, so this stays small
+        if published and published in settings.PONG_WORKERS and published != owner:
+            cls._owners[room_code] = published
+            return published
+        cls._owners.pop(room_code, None)
+        return owner
+
+    @classmethod
+    def release(cls, room_code):
+        """Forget a finished or deleted room's owner"""
+        cls._owners.pop(room_code, None)
+
+    @classmethod
+    async def dispatch(cls, room_code, action, **payload):
+        """Run a RoomActions command on the room's owner"""
+        if cls.is_local(room_code):
+            await RoomActions.run(room_code, action, payload)
+            return
+
+        await cls.forward(room_code, action, payload)
+
+    @classmethod
+    def dispatch_sync(cls, room_code, action, **payload):
+        """Forward a command from a sync HTTP view if another worker owns the room"""
+        if not cls.is_local(room_code):
+            async_to_sync(cls.forward)(room_code, action, payload)
+
+    @classmethod
+    def sync_players(cls, game):
+        """Push player assignments made by a view to the room's owner"""
+        cls.dispatch_sync(game.room_code, 'sync_players', fields=player_fields(game))
+
+    @classmethod
+    async def forward(cls, room_code, action, payload):
+        owner = cls.owner_for(room_code)
+        logger.debug(f"Forwarding {action} for room {room_code} to worker {owner}")
+
+        await get_channel_layer().group_send(
+            cls.worker_group(owner),
+            {
+                'type': 'room.action',
+                'room_code': room_code,
+                'action': action,
+                'payload': payload,
+            }
+        )
+
+    @classmethod
+    def worker_group(cls, worker_id):
+        return 'pong_worker.' + re.sub(r'[^\w.-]', '_', worker_id)
+
+    @classmethod
+    def ensure_inbox(cls):
+        """Start the worker-level receive loop for forwarded commands"""
+        if cls._inbox_task is None or cls._inbox_task.done():
+            cls._inbox_task = asyncio.get_running_loop().create_task(cls._inbox())
+
+    @classmethod
+    async def _inbox(cls):
+        channel_layer = get_channel_layer()
+        group = cls.worker_group(settings.PONG_WORKER_ID)
+        channel = await channel_layer.new_channel('pong_worker.')
+        subscription = asyncio.get_running_loop().create_task(cls._keep_subscribed(group, channel))
+
+        logger.info(f"Worker {settings.PONG_WORKER_ID} listening for forwarded room commands")
+
+        try:
+            while True:
+                try:
+                    message = await channel_layer.receive(channel)
+                    room_code = message['room_code']
+                    if not cls.is_local(room_code):
+                        cls._owners[room_code] = settings.PONG_WORKER_ID
+                    await RoomActions.run(room_code, message['action'], message['payload'])
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Error handling forwarded room command")
+        finally:
+            subscription.cancel()
+
+    @classmethod
+    async def _keep_subscribed(cls, group, channel):
+        """Re-join the worker group before the channel layer expires it"""
+        channel_layer = get_channel_layer()
+        while True:
+            try:
+                await channel_layer.group_add(group, channel)
+            except Exception as e:
+                logger.error(f"Error joining worker group {group}: {str(e)}")
+            await asyncio.sleep(INBOX_REFRESH_INTERVAL)
@@ -1,19 +1,95 @@
+import math
 import time
 import random
 import logging
+from array import array
 from ..constants import (
     CANVAS_WIDTH, CANVAS_HEIGHT,
     PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_SPEED,
     BALL_SIZE, BALL_INITIAL_SPEED_X, BALL_INITIAL_SPEED_Y,
     SPEED_INCREASE_FACTOR, RUBBER_BAND_FACTOR, ANGLE_LIMIT,
+    PHYSICS_RATE, MAX_SUBSTEP_DISTANCE, MAX_SUBSTEPS, MAX_PHYSICS_CATCHUP,
     WINNING_SCORE
 )
 
 logger = logging.getLogger(__name__)
 
+STATUS_CODES = {'WAITING': 0, 'ONGOING': 1, 'FINISHED': 2}
+
+# Fields that can change during a match, in changed-field bitmask order.
+# Numeric fields are mirrored in the snapshot buffer, the rest are compared by value.
+NUMERIC_SNAPSHOT_FIELDS = (
+    'status',
+    'player_1_score',
+    'player_2_score',
+    'player_1_paddle_y',
+    'player_2_paddle_y',
+    'ball_x',
+    'ball_y',
+    'ball_speed_x',
+    'ball_speed_y',
+    'is_paused',
+    'last_loser',
+)
+META_SNAPSHOT_FIELDS = (
+    'player_1_id',
+    'player_2_id',
+    'player_1_username',
+    'player_2_username',
+)
+SNAPSHOT_FIELDS = NUMERIC_SNAPSHOT_FIELDS + META_SNAPSHOT_FIELDS
+
+UP_KEYS = ('up', 'w', 'arrowup')
+DOWN_KEYS = ('down', 's', 'arrowdown')
+
+_STATUS_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('status')
+_LAST_LOSER_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('last_loser')
+_PLAYER_1_SCORE_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('player_1_score')
+_PLAYER_2_SCORE_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('player_2_score')
+_BALL_SPEED_X_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('ball_speed_x')
+_BALL_SPEED_Y_INDEX = NUMERIC_SNAPSHOT_FIELDS.index('ball_speed_y')
+_PLAIN_NUMERIC_FIELDS = tuple(
+    (index, 1 << index, name)
+    for index, name in enumerate(NUMERIC_SNAPSHOT_FIELDS)
+    if name not in ('status', 'last_loser')
+)
+_META_FIELDS = tuple(
+    (index, 1 << (len(NUMERIC_SNAPSHOT_FIELDS) + index), name)
+    for index, name in enumerate(META_SNAPSHOT_FIELDS)
+)
+_FIELD_BITS = tuple((1 << index, name) for index, name in enumerate(SNAPSHOT_FIELDS))
+
+
+class StateSnapshot:
+    """
+    Reusable buffer holding the last observed values of a GameState's dynamic fields.
+    Numeric fields live in a fixed array('d'); player ids and usernames in a small list.
+    """
+
+    __slots__ = ('values', 'meta')
+
+    def __init__(self):
+        self.values = array('d', [float('nan')] * len(NUMERIC_SNAPSHOT_FIELDS))
+        self.meta = [object()] * len(META_SNAPSHOT_FIELDS)
+
+
 class GameState:
     """In-memory game state that replaces the database model"""
-    
+
+    __slots__ = (
+        'room_code', 'status', 'created_at', 'is_paused',
+        'player_1_id', 'player_2_id',
+        'player_1_username', 'player_2_username',
+        'player_1_score', 'player_2_score',
+        'canvas_width', 'canvas_height',
+        'player_1_paddle_y', 'player_2_paddle_y',
+        'paddle_height', 'paddle_width', 'paddle_speed',
+        'player_1_moving_up', 'player_1_moving_down',
+        'player_2_moving_up', 'player_2_moving_down',
+        'ball_x', 'ball_y', 'ball_size', 'ball_speed_x', 'ball_speed_y',
+        'last_loser', 'winning_score', 'last_update', 'physics_accumulator',
+    )
+
     def __init__(self, room_code):
         self.room_code = room_code
         self.status = 'WAITING'
@@ -53,6 +129,7 @@ class GameState:
         self.winning_score = WINNING_SCORE
         
         self.last_update = time.time() * 1000
+        self.physics_accumulator = 0.0
     
     def reset_ball(self):
         """Reset ball to center"""
@@ -74,6 +151,60 @@ class GameState:
         logger.info(f"Ball resumed with speeds: ({self.ball_speed_x}, {self.ball_speed_y})")
         return self.ball_speed_x, self.ball_speed_y
     
+    def move_paddles(self, distance):
+        """
+        Move each paddle by distance in the direction its player's keys are held.
+        Returns True if either paddle moved.
+        """
+        max_y = self.canvas_height - self.paddle_height
+        moved = False
+
+        direction = self.player_1_moving_down - self.player_1_moving_up
+        if direction:
+            self.player_1_paddle_y = min(max(self.player_1_paddle_y + direction * distance, 0), max_y)
+            moved = True
+
+        direction = self.player_2_moving_down - self.player_2_moving_up
+        if direction:
+            self.player_2_paddle_y = min(max(self.player_2_paddle_y + direction * distance, 0), max_y)
+            moved = True
+
+        return moved
+
+    def set_key(self, player_number, key, is_down):
+        """Record a paddle key press or release"""
+        if player_number == 1:
+            if key in UP_KEYS:
+                self.player_1_moving_up = is_down
+            elif key in DOWN_KEYS:
+                self.player_1_moving_down = is_down
+        elif player_number == 2:
+            if key in UP_KEYS:
+                self.player_2_moving_up = is_down
+            elif key in DOWN_KEYS:
+                self.player_2_moving_down = is_down
+
+    def set_paddle_position(self, player_number, position):
+        """Move a paddle to a client-reported position, kept within the court"""
+        if position < 0:
+            position = 0
+        elif position > self.canvas_height - self.paddle_height:
+            position = self.canvas_height - self.paddle_height
+
+        if player_number == 1:
+            self.player_1_paddle_y = position
+        elif player_number == 2:
+            self.player_2_paddle_y = position
+
+    def release_keys(self, player_number):
+        """Forget a player's held keys, e.g. when they disconnect"""
+        if player_number == 1:
+            self.player_1_moving_up = False
+            self.player_1_moving_down = False
+        elif player_number == 2:
+            self.player_2_moving_up = False
+            self.player_2_moving_down = False
+
     def update(self):
         """Update game state for one frame"""
         if self.is_paused:
@@ -94,43 +225,162 @@ class GameState:
         if (self.ball_x - ball_radius <= self.paddle_width and 
             self.ball_y >= self.player_1_paddle_y and 
             self.ball_y <= self.player_1_paddle_y + self.paddle_height):
-            
-            paddle_center = self.player_1_paddle_y + self.paddle_height / 2
-            relative_intersect_y = self.ball_y - paddle_center
-            normalized_intersect = relative_intersect_y / (self.paddle_height / 2)
-            angle = normalized_intersect * ANGLE_LIMIT
-            
-            self.ball_x = self.paddle_width + ball_radius
-            self.ball_speed_x = abs(self.ball_speed_x)
-            self.ball_speed_y = angle * 6
-            
-            self.ball_speed_x *= SPEED_INCREASE_FACTOR
-            self.ball_speed_y *= SPEED_INCREASE_FACTOR
-            
-            if self.player_1_score > self.player_2_score + 3:
-                self.ball_speed_x *= RUBBER_BAND_FACTOR
-                self.ball_speed_y *= RUBBER_BAND_FACTOR
+            self._paddle_bounce(1)
         
         elif (self.ball_x + ball_radius >= self.canvas_width - self.paddle_width and 
               self.ball_y >= self.player_2_paddle_y and 
               self.ball_y <= self.player_2_paddle_y + self.paddle_height):
-            
-            paddle_center = self.player_2_paddle_y + self.paddle_height / 2
-            relative_intersect_y = self.ball_y - paddle_center
-            normalized_intersect = relative_intersect_y / (self.paddle_height / 2)
-            angle = normalized_intersect * ANGLE_LIMIT
-            
+            self._paddle_bounce(2)
+        
+        scorer = self._check_goal()
+        if scorer:
+            return scorer
+        
+        self.last_update = time.time() * 1000
+        
+        return 0
+
+    def advance(self, elapsed):
+        """
+        Fixed-timestep update: run as many 1/PHYSICS_RATE steps as fit in the
+        elapsed seconds plus what was left over from the previous call.
+        Returns the scorer if a goal ended the advance early, else 0.
+        """
+        if self.is_paused:
+            self.physics_accumulator = 0.0
+            return 0
+
+        timestep = 1 / PHYSICS_RATE
+        self.physics_accumulator = min(self.physics_accumulator + elapsed, MAX_PHYSICS_CATCHUP)
+
+        while self.physics_accumulator >= timestep:
+            self.physics_accumulator -= timestep
+
+            scorer = self.step()
+            if scorer:
+                self.physics_accumulator = 0.0
+                return scorer
+
+        self.last_update = time.time() * 1000
+
+        return 0
+
+    def step(self):
+        """
+        One fixed physics step with continuous collision.
+        The step is split into sub-steps (up to MAX_SUBSTEPS) only when the
+        ball would travel further than MAX_SUBSTEP_DISTANCE in it; contacts
+        are swept, so sub-steps only refine multi-bounce paths.
+        """
+        distance = max(abs(self.ball_speed_x), abs(self.ball_speed_y))
+        substeps = min(MAX_SUBSTEPS, max(1, math.ceil(distance / MAX_SUBSTEP_DISTANCE)))
+
+        for _ in range(substeps):
+            scorer = self._sweep(1 / substeps)
+            if scorer:
+                return scorer
+
+        return 0
+
+    def _sweep(self, fraction):
+        """Move the ball by a fraction of its velocity, resolving paddle and wall contacts on its path"""
+        ball_radius = self.ball_size / 2
+        left_face = self.paddle_width + ball_radius
+        right_face = self.canvas_width - self.paddle_width - ball_radius
+
+        while fraction > 0:
+            start_x = self.ball_x
+            start_y = self.ball_y
+            end_x = start_x + self.ball_speed_x * fraction
+            end_y = start_y + self.ball_speed_y * fraction
+
+            player = 0
+            if self.ball_speed_x < 0 and start_x >= left_face > end_x:
+                player = 1
+                contact = (start_x - left_face) / (start_x - end_x)
+            elif self.ball_speed_x > 0 and start_x <= right_face < end_x:
+                player = 2
+                contact = (right_face - start_x) / (end_x - start_x)
+
+            if player:
+                contact_y = self._reflect_y(start_y + (end_y - start_y) * contact, ball_radius)
+                paddle_y = self.player_1_paddle_y if player == 1 else self.player_2_paddle_y
+
+                if paddle_y <= contact_y <= paddle_y + self.paddle_height:
+                    self.ball_y = contact_y
+                    self._paddle_bounce(player)
+                    fraction *= 1 - contact
+                    continue
+
+            self.ball_x = end_x
+            self.ball_y = self._reflect_y(end_y, ball_radius)
+            break
+
+        return self._check_goal()
+
+    def _reflect_y(self, y, ball_radius):
+        """Fold a ball position that crossed the top or bottom wall back into the court"""
+        top = ball_radius
+        bottom = self.canvas_height - ball_radius
+
+        if y < top:
+            self.ball_speed_y = abs(self.ball_speed_y)
+            return min(2 * top - y, bottom)
+        if y > bottom:
+            self.ball_speed_y = -abs(self.ball_speed_y)
+            return max(2 * bottom - y, top)
+        return y
+
+    def _paddle_bounce(self, player):
+        """Send the ball back from a paddle, deflected by where it hit"""
+        ball_radius = self.ball_size / 2
+        paddle_y = self.player_1_paddle_y if player == 1 else self.player_2_paddle_y
+
+        paddle_center = paddle_y + self.paddle_height / 2
+        relative_intersect_y = self.ball_y - paddle_center
+        normalized_intersect = relative_intersect_y / (self.paddle_height / 2)
+        angle = normalized_intersect * ANGLE_LIMIT
+
+        if player == 1:
+            self.ball_x = self.paddle_width + ball_radius
+            self.ball_speed_x = abs(self.ball_speed_x)
+        else:
             self.ball_x = self.canvas_width - self.paddle_width - ball_radius
             self.ball_speed_x = -abs(self.ball_speed_x)
-            self.ball_speed_y = angle * 6
-            
-            self.ball_speed_x *= SPEED_INCREASE_FACTOR
-            self.ball_speed_y *= SPEED_INCREASE_FACTOR
-            
-            if self.player_2_score > self.player_1_score + 3:
-                self.ball_speed_x *= RUBBER_BAND_FACTOR
-                self.ball_speed_y *= RUBBER_BAND_FACTOR
-        
+        self.ball_speed_y = angle * 6
+
+        self.ball_speed_x *= SPEED_INCREASE_FACTOR
+        self.ball_speed_y *= SPEED_INCREASE_FACTOR
+
+        if player == 1:
+            leading = self.player_1_score > self.player_2_score + 3
+        else:
+            leading = self.player_2_score > self.player_1_score + 3
+
+        if leading:
+            self.ball_speed_x *= RUBBER_BAND_FACTOR
+            self.ball_speed_y *= RUBBER_BAND_FACTOR
+
+    def grant_paddle_hit(self, player, values, ball_y):
+        """
+        Undo a goal conceded by player: restore the score and ball from the
+        numeric state in values (a snapshot from before the goal), then bounce
+        the ball off the player's paddle at ball_y.
+        """
+        self.player_1_score = int(values[_PLAYER_1_SCORE_INDEX])
+        self.player_2_score = int(values[_PLAYER_2_SCORE_INDEX])
+        self.last_loser = int(values[_LAST_LOSER_INDEX]) or None
+        self.ball_speed_x = values[_BALL_SPEED_X_INDEX]
+        self.ball_speed_y = values[_BALL_SPEED_Y_INDEX]
+        self.ball_y = ball_y
+        self.is_paused = False
+
+        self._paddle_bounce(player)
+
+    def _check_goal(self):
+        """Award a point if the ball left the court. Returns the scorer or 0."""
+        ball_radius = self.ball_size / 2
+
         if self.ball_x - ball_radius <= 0:
             self.player_2_score += 1
             self.last_loser = 1
@@ -142,9 +392,7 @@ class GameState:
             self.last_loser = 2
             self.reset_ball()
             return 1
-        
-        self.last_update = time.time() * 1000
-        
+
         return 0
     
     def check_for_winner(self):
@@ -182,3 +430,47 @@ class GameState:
             'winning_score': self.winning_score,
             'timestamp': time.time() * 1000,
         }
+
+    def snapshot_into(self, snapshot):
+        """
+        Copy the dynamic fields into a reusable StateSnapshot without allocating.
+        Returns a bitmask (in SNAPSHOT_FIELDS order) of the fields that changed
+        since the snapshot was last written.
+        """
+        values = snapshot.values
+        mask = 0
+
+        status = STATUS_CODES.get(self.status, -1)
+        if values[_STATUS_INDEX] != status:
+            values[_STATUS_INDEX] = status
+            mask |= 1 << _STATUS_INDEX
+
+        last_loser = self.last_loser or 0
+        if values[_LAST_LOSER_INDEX] != last_loser:
+            values[_LAST_LOSER_INDEX] = last_loser
+            mask |= 1 << _LAST_LOSER_INDEX
+
+        for index, bit, name in _PLAIN_NUMERIC_FIELDS:
+            value = getattr(self, name)
+            if values[index] != value:
+                values[index] = value
+                mask |= bit
+
+        meta = snapshot.meta
+        for index, bit, name in _META_FIELDS:
+            value = getattr(self, name)
+            if meta[index] != value:
+                meta[index] = value
+                mask |= bit
+
+        return mask
+
+    def delta_from_mask(self, mask):
+        """Build a game_state_delta message holding only the fields set in mask"""
+        delta = {'type': 'game_state_delta', 'timestamp': time.time() * 1000}
+
+        for bit, name in _FIELD_BITS:
+            if mask & bit:
+                delta[name] = getattr(self, name)
+
+        return delta
@@ -0,0 +1,164 @@
+import base64
+import json
+from array import array
+from .player import PlayerSession
+from .state import NUMERIC_SNAPSHOT_FIELDS, META_SNAPSHOT_FIELDS, STATUS_CODES
+
+# Redis layout of a room
+#
+#   room:<code>:meta       hash  player ids and usernames, created_at; written on joins
+#   room:<code>:state      hash  hot simulation fields; only changed fields are HSET
+#   room:<code>:sessions   hash  player_id -> JSON player session
+#   player_room            hash  player_id -> room_code, shared by all rooms
+#
+# and of a worker's crash-recovery data (see RecoveryManager)
+#
+#   recovery:<worker>:snapshot  hash    room_code -> packed numeric fields of a simulated room
+#   recovery:<worker>:journal   stream  room commands run since that snapshot
+#
+# and of room code allocation (see RoomCodeAllocator)
+#
+#   room_codes:next             counter  next index of the permuted code space
+#   room_codes:free:<worker>    list     unused codes owned by a worker
+#   room_codes:quarantine       zset     deleted rooms' codes -> time they may be reused
+#
+# and of finished games waiting to be recorded (see ResultOutbox)
+#
+#   results:outbox:<worker>     list     JSON game results, oldest first
+#
+# Values are stored as strings: booleans as 0/1 and None as ''.
+
+ROOM_KEY_TTL = 300
+PLAYER_ROOM_KEY = "player_room"
+NEXT_CODE_KEY = "room_codes:next"
+QUARANTINE_CODES_KEY = "room_codes:quarantine"
+
+STATE_FIELDS = NUMERIC_SNAPSHOT_FIELDS
+META_FIELDS = META_SNAPSHOT_FIELDS + ('created_at',)
+
+STATE_MASK = (1 << len(STATE_FIELDS)) - 1
+
+_STATE_BITS = tuple((1 << index, name) for index, name in enumerate(STATE_FIELDS))
+_META_BITS = tuple(
+    (1 << (len(STATE_FIELDS) + index), name) for index, name in enumerate(META_SNAPSHOT_FIELDS)
+)
+
+_STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+_DECODERS = {
+    'status': str,
+    'player_1_score': int,
+    'player_2_score': int,
+    'is_paused': lambda value: value == '1',
+    'last_loser': lambda value: int(value) if value else None,
+    'player_1_id': lambda value: value or None,
+    'player_2_id': lambda value: value or None,
+    'player_1_username': lambda value: value or None,
+    'player_2_username': lambda value: value or None,
+}
+
+
+def meta_key(room_code):
+    return f"room:{room_code}:meta"
+
+
+def state_key(room_code):
+    return f"room:{room_code}:state"
+
+
+def sessions_key(room_code):
+    return f"room:{room_code}:sessions"
+
+
+def room_keys(room_code):
+    return (meta_key(room_code), state_key(room_code), sessions_key(room_code))
+
+
+def snapshot_key(worker_id):
+    return f"recovery:{worker_id}:snapshot"
+
+
+def journal_key(worker_id):
+    return f"recovery:{worker_id}:journal"
+
+
+def free_codes_key(worker_id):
+    return f"room_codes:free:{worker_id}"
+
+
+def results_outbox_key(worker_id):
+    return f"results:outbox:{worker_id}"
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def state_mapping(game, mask=STATE_MASK):
+    """Hot fields selected by a snapshot mask, ready for HSET"""
+    return {name: _encode(getattr(game, name)) for bit, name in _STATE_BITS if mask & bit}
+
+
+def meta_mapping(game, mask=None):
+    """Metadata fields selected by a snapshot mask (all of them, with created_at, if mask is None)"""
+    if mask is None:
+        return {name: _encode(getattr(game, name)) for name in META_FIELDS}
+    return {name: _encode(getattr(game, name)) for bit, name in _META_BITS if mask & bit}
+
+
+def pack_snapshot(snapshot):
+    """A StateSnapshot's numeric fields as base64 float64s (~120 bytes)"""
+    return base64.b64encode(snapshot.values.tobytes()).decode()
+
+
+def unpack_snapshot(packed):
+    """Turn a packed snapshot back into state hash fields, for apply_fields"""
+    values = array('d')
+    values.frombytes(base64.b64decode(packed))
+    fields = dict(zip(STATE_FIELDS, values))
+
+    fields['status'] = _STATUS_NAMES.get(int(fields['status']), 'ONGOING')
+    fields['last_loser'] = int(fields['last_loser']) or None
+    for name in ('player_1_score', 'player_2_score', 'is_paused'):
+        fields[name] = int(fields[name])
+
+    return {name: str(_encode(value)) for name, value in fields.items()}
+
+
+def apply_fields(game, fields):
+    """Set decoded hash fields on a GameState"""
+    for name, value in fields.items():
+        if name in _DECODERS:
+            setattr(game, name, _DECODERS[name](value))
+        elif name in STATE_FIELDS or name in META_FIELDS:
+            setattr(game, name, float(value))
+
+
+def encode_session(session):
+    return json.dumps({
+        'player_number': session.player_number,
+        'username': session.username,
+        'connected': session.connected,
+        'last_active': session.last_active,
+        'created_at': session.created_at,
+        'disconnect_time': session.disconnect_time,
+    })
+
+
+def decode_session(room_code, player_id, raw):
+    data = json.loads(raw)
+    session = PlayerSession(
+        room_code=room_code,
+        player_id=player_id,
+        player_number=data['player_number'],
+        username=data.get('username'),
+        connected=data.get('connected', False)
+    )
+    session.last_active = data.get('last_active', session.last_active)
+    session.created_at = data.get('created_at', session.created_at)
+    session.disconnect_time = data.get('disconnect_time')
+    return session
@@ -1,12 +1,18 @@
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.urls import re_path
-from .consumers import GameConsumer
+from .consumers import GameConsumer, ReplayConsumer, MatchmakingConsumer, LobbyConsumer
 
 # Routes WebSocket pour le jeu
 websocket_urlpatterns = [
     # Route pour les parties de jeu
     re_path(r'ws/game/(?P<room_code>\w+)/$', GameConsumer.as_asgi()),
+    # Route pour les replays de parties terminées
+    re_path(r'ws/replay/(?P<replay_id>\w+-\d+)/$', ReplayConsumer.as_asgi()),
+    # Route pour la file de matchmaking
+    re_path(r'ws/matchmaking/$', MatchmakingConsumer.as_asgi()),
+    # Route pour le statut d'une salle d'attente
+    re_path(r'ws/lobby/(?P<room_code>\w+)/$', LobbyConsumer.as_asgi()),
 ]
 
 # Configuration du routeur de protocole pour Channels
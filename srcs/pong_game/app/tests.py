@@ -1,2 +1,90 @@
-from django.test import TestCase
+import random
+from unittest import skipUnless
+from django.test import SimpleTestCase
+from .game.state import GameState
+from .game.batch import BatchPhysicsEngine, NUMPY_AVAILABLE
 
+PHYSICS_FIELDS = (
+    'ball_x', 'ball_y', 'ball_speed_x', 'ball_speed_y',
+    'player_1_score', 'player_2_score', 'last_loser', 'is_paused',
+)
+
+
+def make_random_game(rng, index):
+    game = GameState(f'ROOM{index}')
+    game.status = 'ONGOING'
+    game.is_paused = rng.random() < 0.1
+    game.ball_x = rng.uniform(0, game.canvas_width)
+    game.ball_y = rng.uniform(0, game.canvas_height)
+    game.ball_speed_x = rng.choice((-1, 1)) * rng.uniform(3, 40)
+    game.ball_speed_y = rng.uniform(-20, 20)
+    game.player_1_score = rng.randint(0, 9)
+    game.player_2_score = rng.randint(0, 9)
+    return game
+
+
+@skipUnless(NUMPY_AVAILABLE, "numpy is not installed")
+class BatchPhysicsEngineTests(SimpleTestCase):
+    """BatchPhysicsEngine must reproduce GameState.update exactly"""
+
+    def assert_same_state(self, expected, actual):
+        for name in PHYSICS_FIELDS:
+            self.assertEqual(getattr(expected, name), getattr(actual, name), f"{expected.room_code}.{name}")
+
+    def test_matches_scalar_update(self):
+        scalar_rng = random.Random(42)
+        batch_rng = random.Random(42)
+        scalar_games = [make_random_game(scalar_rng, index) for index in range(500)]
+        batch_games = [make_random_game(batch_rng, index) for index in range(500)]
+
+        rng = random.Random(7)
+        engine = BatchPhysicsEngine()
+
+        for _ in range(300):
+            paddles = [(rng.uniform(0, 480), rng.uniform(0, 480)) for _ in scalar_games]
+            for games in (scalar_games, batch_games):
+                for game, (paddle_1, paddle_2) in zip(games, paddles):
+                    game.player_1_paddle_y = paddle_1
+                    game.player_2_paddle_y = paddle_2
+
+            expected_scorers = [game.update() for game in scalar_games]
+            expected_finished = [
+                row for row, (game, scorer) in enumerate(zip(scalar_games, expected_scorers))
+                if scorer and max(game.player_1_score, game.player_2_score) >= game.winning_score
+            ]
+
+            engine.load(batch_games)
+            scored, finished = engine.step()
+            engine.store(batch_games)
+
+            self.assertEqual(expected_scorers, engine.scorer.tolist())
+            self.assertEqual([row for row, scorer in enumerate(expected_scorers) if scorer], scored.tolist())
+            self.assertEqual(expected_finished, finished.tolist())
+
+            for expected, actual in zip(scalar_games, batch_games):
+                self.assert_same_state(expected, actual)
+
+            for pair in zip(scalar_games, batch_games):
+                resume = pair[0].is_paused and rng.random() < 0.5
+                for game in pair:
+                    if resume:
+                        game.is_paused = False
+                        game.ball_speed_x = 7
+                        game.ball_speed_y = -7
+                    if max(game.player_1_score, game.player_2_score) >= game.winning_score:
+                        game.player_1_score = game.player_2_score = 0
+
+    def test_paused_rooms_are_untouched(self):
+        game = GameState('PAUSED')
+        game.ball_speed_x = 5
+        game.ball_speed_y = 5
+        before = {name: getattr(game, name) for name in PHYSICS_FIELDS}
+
+        engine = BatchPhysicsEngine()
+        engine.load([game])
+        scored, finished = engine.step()
+        engine.store([game])
+
+        self.assertEqual(len(scored), 0)
+        self.assertEqual(len(finished), 0)
+        self.assertEqual(before, {name: getattr(game, name) for name in PHYSICS_FIELDS})
@@ -7,4 +7,12 @@ urlpatterns = [
     path('api/room/join/', views.join_room, name='join_room'),
     path('api/room/check/<str:room_code>/', views.check_room, name='check_room'),
     path('api/room/cancel/', views.cancel_room, name='cancel_room'),
+    path('api/room/owner/<str:room_code>/', views.room_owner, name='room_owner'),
+
+    # Matchmaking queue status (players queue through ws/matchmaking/)
+    path('api/matchmaking/', views.matchmaking_status, name='matchmaking_status'),
+
+    # Replays of finished matches
+    path('api/replay/<str:replay_id>/', views.replay_info, name='replay_info'),
+    path('api/replay/<str:replay_id>/frames/', views.replay_frames, name='replay_frames'),
 ]
\ No newline at end of file
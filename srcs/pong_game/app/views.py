@@ -1,8 +1,13 @@
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-from .game.manager import GameManager
+import struct
+from .game.manager import GameManager, REDIS_AVAILABLE, redis_client
+from .game.sharding import ShardRouter
+from .game.replay import ReplayReader
+from .game.lobby import RoomLobby
+from .game.matchmaking import QUEUE_KEY, match_key
 import logging
 import jwt
 from django.conf import settings
@@ -45,7 +50,15 @@ def create_room(request):
             username = requested_username
             logger.info(f"Using username from request body: {username}")
 
-        room_code = GameManager.generate_room_code()
+        room_code = ShardRouter.generate_local_room_code()
+        if GameManager.get_game(room_code) is not None:
+            logger.error(f"Generated room code {room_code} is already in use")
+            return JsonResponse({
+                'success': False,
+                'error': 'Room code already in use, please try again'
+            }, status=409)
+
+        ShardRouter.claim(room_code)
         logger.info(f"Generated room code: {room_code}")
 
         game = GameManager.create_game(room_code)
@@ -112,7 +125,7 @@ def join_room(request):
         if requested_username:
             username = requested_username
 
-        game = GameManager.get_game(room_code)
+        game = GameManager.get_game(room_code, refresh=not ShardRouter.is_local(room_code))
         
         if user_id == game.player_1_id:
             return JsonResponse({
@@ -142,6 +155,7 @@ def join_room(request):
                     game.player_2_username = username
                 
                 GameManager.save_game(game)
+                ShardRouter.sync_players(game)
 
                 session = GameManager.get_player_session(room_code, user_id)
                 if session:
@@ -176,8 +190,10 @@ def join_room(request):
                 game.status = 'ONGOING'
 
         GameManager.save_game(game)
+        ShardRouter.sync_players(game)
 
         GameManager.add_player_session(room_code, user_id, player_number, username)
+        RoomLobby.notify(room_code, game)
 
         logger.info(f"Player {player_number} joined room {room_code}: {user_id}, username: {username}")
 
@@ -201,11 +217,10 @@ def join_room(request):
 def check_room(request, room_code):
     """
     Checks if a room exists and returns its status.
+    Supports If-None-Match; waiting clients should prefer the ws/lobby/ socket.
     """
-    logger.info(f"Checking room {room_code}")
-
     try:
-        game = GameManager.get_game(room_code)
+        game = GameManager.get_game(room_code, refresh=not ShardRouter.is_local(room_code))
         if not game:
             logger.warning(f"Room {room_code} not found")
             return JsonResponse({
@@ -213,36 +228,18 @@ def check_room(request, room_code):
                 'error': 'Room not found'
             }, status=404)
 
-        player_count = (
-            (1 if game.player_1_id else 0) +
-            (1 if game.player_2_id else 0)
-        )
-
-        active_sessions = 0
-        if game.player_1_id:
-            session = GameManager.get_player_session(room_code, game.player_1_id)
-            if session and session.connected:
-                active_sessions += 1
-                
-        if game.player_2_id:
-            session = GameManager.get_player_session(room_code, game.player_2_id)
-            if session and session.connected:
-                active_sessions += 1
+        status = RoomLobby.status(game)
+        etag = RoomLobby.etag(status)
 
-        logger.info(f"Room {room_code} status: {game.status}, player_count: {player_count}, active_sessions: {active_sessions}")
-        logger.info(f"Player 1 ID: {game.player_1_id}, Player 2 ID: {game.player_2_id}")
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            logger.debug(f"Room {room_code} status: {status}")
+            response = JsonResponse({'success': True, **status})
 
-        return JsonResponse({
-            'success': True,
-            'room_code': room_code,
-            'status': game.status,
-            'player_count': player_count,
-            'active_sessions': active_sessions,
-            'player_1_id': game.player_1_id,
-            'player_2_id': game.player_2_id,
-            'is_paused': game.is_paused,
-            'created_at': game.created_at
-        })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.exception(f"Error checking room {room_code}: {str(e)}")
         return JsonResponse({
@@ -280,7 +277,7 @@ def cancel_room(request):
             except Exception as e:
                 logger.error(f"Error decoding token: {str(e)}")
 
-        game = GameManager.get_game(room_code)
+        game = GameManager.get_game(room_code, refresh=not ShardRouter.is_local(room_code))
         if not game:
             logger.warning(f"Room {room_code} not found for cancellation")
             return JsonResponse({
@@ -304,6 +301,8 @@ def cancel_room(request):
 
         logger.info(f"Canceling room {room_code}")
         GameManager.delete_game(room_code)
+        ShardRouter.dispatch_sync(room_code, 'delete')
+        ShardRouter.release(room_code)
 
         return JsonResponse({
             'success': True,
@@ -314,4 +313,133 @@ def cancel_room(request):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def room_owner(request, room_code):
+    """
+    Returns the worker that owns a room, for routing and debugging.
+    """
+    try:
+        owner = ShardRouter.claim(room_code)
+
+        return JsonResponse({
+            'success': True,
+            'room_code': room_code,
+            'owner': owner,
+            'worker': settings.PONG_WORKER_ID,
+            'workers': settings.PONG_WORKERS
+        })
+    except Exception as e:
+        logger.exception(f"Error looking up owner of room {room_code}: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def replay_info(request, replay_id):
+    """
+    Returns a replay's header: players, final score, tick rate and keyframe ticks.
+    """
+    try:
+        reader = ReplayReader(replay_id)
+    except (OSError, ValueError, struct.error):
+        return JsonResponse({
+            'success': False,
+            'error': 'Replay not found'
+        }, status=404)
+
+    try:
+        return JsonResponse({
+            'success': True,
+            **reader.header,
+            'keyframe_ticks': reader.keyframe_ticks
+        })
+    finally:
+        reader.close()
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def replay_frames(request, replay_id):
+    """
+    Streams a replay's length-prefixed binary frames from the keyframe before
+    ?tick= (default: the start), without loading the file into memory.
+    """
+    try:
+        from_tick = int(request.GET['tick']) if 'tick' in request.GET else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid tick'
+        }, status=400)
+
+    try:
+        reader = ReplayReader(replay_id)
+    except (OSError, ValueError, struct.error):
+        return JsonResponse({
+            'success': False,
+            'error': 'Replay not found'
+        }, status=404)
+
+    def stream():
+        try:
+            yield from reader.chunks(from_tick)
+        finally:
+            reader.close()
+
+    return StreamingHttpResponse(stream(), content_type='application/octet-stream')
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def matchmaking_status(request):
+    """
+    Returns the matchmaking queue size and, for a signed-in player, whether
+    they are queued or the room of their last match.
+    """
+    if not REDIS_AVAILABLE:
+        return JsonResponse({
+            'success': False,
+            'error': 'Matchmaking is unavailable'
+        }, status=503)
+
+    try:
+        user_id = None
+        auth_header = request.headers.get('Authorization')
+
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+            try:
+                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+                user_id = str(payload.get('user_id'))
+            except Exception as e:
+                logger.error(f"Matchmaking status - error decoding token: {str(e)}")
+
+        with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zcard(QUEUE_KEY)
+            if user_id:
+                pipe.zscore(QUEUE_KEY, user_id)
+                pipe.get(match_key(user_id))
+            results = pipe.execute()
+
+        response_data = {
+            'success': True,
+            'queue_size': results[0],
+            'status': 'idle',
+        }
+        if user_id and results[2]:
+            response_data['status'] = 'matched'
+            response_data['room_code'] = results[2]
+        elif user_id and results[1] is not None:
+            response_data['status'] = 'queued'
+            response_data['rating'] = results[1]
+
+        return JsonResponse(response_data)
+    except Exception as e:
+        logger.exception(f"Error reading matchmaking status: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -11,4 +11,28 @@ python manage.py makemigrations app
 echo "Applying migrations..."
 python manage.py migrate
 
+# One daphne process per worker, each owning a share of the rooms
+# (see app/game/sharding.py); the CMD process is worker 0
+PONG_WORKER_COUNT=${PONG_WORKER_COUNT:-1}
+PONG_WORKER_HOST=${PONG_WORKER_HOST:-pong-game}
+PONG_BASE_PORT=${PONG_BASE_PORT:-8000}
+
+PONG_WORKERS=""
+i=0
+while [ "$i" -lt "$PONG_WORKER_COUNT" ]; do
+    PONG_WORKERS="${PONG_WORKERS:+$PONG_WORKERS,}$PONG_WORKER_HOST:$((PONG_BASE_PORT + i))"
+    i=$((i + 1))
+done
+export PONG_WORKERS
+
+i=1
+while [ "$i" -lt "$PONG_WORKER_COUNT" ]; do
+    port=$((PONG_BASE_PORT + i))
+    echo "Starting pong worker on port $port..."
+    PONG_WORKER_ID="$PONG_WORKER_HOST:$port" daphne project.asgi:application --port "$port" --bind 0.0.0.0 &
+    i=$((i + 1))
+done
+
+export PONG_WORKER_ID="$PONG_WORKER_HOST:$PONG_BASE_PORT"
+
 exec "$@"
\ No newline at end of file
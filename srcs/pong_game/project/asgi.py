@@ -1,4 +1,5 @@
 import os
+import sys
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
@@ -8,10 +9,33 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from app.routing import websocket_urlpatterns
+from app.game.manager import GameManager
+from app.game.sharding import ShardRouter
+from app.game.recovery import RecoveryManager
 
-application = ProtocolTypeRouter({
+router = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
-})
\ No newline at end of file
+})
+
+
+def start_background_jobs():
+    # Listen for room commands forwarded by other workers, expire idle rooms
+    # and recover/snapshot simulated ones
+    ShardRouter.ensure_inbox()
+    GameManager.ensure_cleanup()
+    RecoveryManager.ensure_started()
+
+
+# Daphne sends no lifespan events, so start the jobs once its reactor runs:
+# rooms recovered after a restart are rescheduled even if no socket reconnects
+if 'daphne.server' in sys.modules:
+    from twisted.internet import reactor
+    reactor.callLater(0, start_background_jobs)
+
+
+async def application(scope, receive, send):
+    start_background_jobs()
+    return await router(scope, receive, send)
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import socket
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -118,9 +119,107 @@ CACHES = {
     }
 }
 
+# Identifies this daphne process to the other pong_game workers
+PONG_WORKER_ID = os.getenv('PONG_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+# Every worker sharing the room space, as "host:port" matching the nginx
+# pong_game upstream entries; rooms are assigned to them by consistent hashing
+PONG_WORKERS = [
+    worker.strip() for worker in os.getenv('PONG_WORKERS', PONG_WORKER_ID).split(',') if worker.strip()
+]
+
 USER_MANAGEMENT_URL = 'http://user-management:8000'
 
+# Pooled connections kept open to user_management, and the timeout of each request
+USER_MANAGEMENT_POOL_SIZE = 20
+USER_MANAGEMENT_TIMEOUT = 5
+
+# Finished games are recorded in batches of up to GAME_RESULT_BATCH; the outbox
+# is checked every GAME_RESULT_FLUSH_INTERVAL seconds, and failed deliveries
+# are retried after GAME_RESULT_RETRY_BASE seconds, doubling up to GAME_RESULT_RETRY_MAX.
+GAME_RESULT_BATCH = 100
+GAME_RESULT_FLUSH_INTERVAL = 5
+GAME_RESULT_RETRY_BASE = 1
+GAME_RESULT_RETRY_MAX = 60
+
 FINISHED_GAME_TTL = 300
 INACTIVE_GAME_TTL = 600
 DISCONNECTED_PLAYER_TTL = 120
-CLEANUP_INTERVAL = 60
\ No newline at end of file
+CLEANUP_INTERVAL = 60
+
+# Room codes are reserved from a shared counter this many at a time, and a
+# deleted room's code is only reused after GAME_ROOM_CODE_QUARANTINE seconds
+GAME_ROOM_CODE_BLOCK = 64
+GAME_ROOM_CODE_QUARANTINE = 3600
+
+# 'legacy' moves the ball once per scheduler tick; 'fixed' runs PHYSICS_RATE
+# swept-collision steps per second independently of SERVER_UPDATE_RATE
+GAME_PHYSICS_MODE = os.getenv('GAME_PHYSICS_MODE', 'legacy')
+
+# 'position' trusts the paddle_position messages clients send every frame;
+# 'keys' integrates paddle motion on the server from edge-triggered key_event
+# messages and ignores paddle_position
+GAME_INPUT_MODE = os.getenv('GAME_INPUT_MODE', 'position')
+
+# Per-socket token bucket on inbound WebSocket frames: sustained frames per
+# second and burst size. Frames beyond it are dropped before being parsed.
+GAME_INPUT_RATE = 60
+GAME_INPUT_BURST = 30
+
+# Spectators (?role=spectator) get full keyframes this many times per second
+# instead of every delta, plus match events
+GAME_SPECTATOR_RATE = 10
+
+# Matchmaking pairs queued players whose rating gap is within a window that
+# starts at GAME_MATCHMAKING_WINDOW and widens by GAME_MATCHMAKING_WINDOW_GROWTH
+# per second waited, up to GAME_MATCHMAKING_MAX_WINDOW. The queue is walked
+# GAME_MATCHMAKING_BATCH players at a time every GAME_MATCHMAKING_INTERVAL seconds.
+GAME_MATCHMAKING_INTERVAL = 0.5
+GAME_MATCHMAKING_BATCH = 500
+GAME_MATCHMAKING_WINDOW = 50
+GAME_MATCHMAKING_WINDOW_GROWTH = 25
+GAME_MATCHMAKING_MAX_WINDOW = 400
+GAME_MATCHMAKING_DEFAULT_RATING = 1000
+
+# Step all due rooms' legacy physics together with numpy (BatchPhysicsEngine)
+GAME_BATCH_PHYSICS = os.getenv('GAME_BATCH_PHYSICS', 'false').lower() == 'true'
+
+# Adaptive per-room tick rates (see RoomScheduler): paused rooms tick at
+# GAME_IDLE_TICK_RATE; in 'fixed' physics mode running rooms ramp from
+# GAME_MIN_TICK_RATE to SERVER_UPDATE_RATE as the ball reaches
+# GAME_FAST_BALL_SPEED (pixels per physics step), and drop back to
+# GAME_MIN_TICK_RATE while the loop spends more than GAME_TICK_BUDGET of
+# each frame working. Achieved rates are logged every GAME_TICK_REPORT_INTERVAL seconds.
+GAME_ADAPTIVE_TICK_RATE = os.getenv('GAME_ADAPTIVE_TICK_RATE', 'true').lower() == 'true'
+GAME_IDLE_TICK_RATE = 1
+GAME_MIN_TICK_RATE = 15
+GAME_FAST_BALL_SPEED = 14
+GAME_TICK_BUDGET = 0.7
+GAME_TICK_REPORT_INTERVAL = 60
+
+# Lag compensation: rooms keep their last GAME_REWIND_HISTORY simulated states,
+# and a goal is checked against the conceding player's paddle in the states up
+# to their round trip (at most GAME_MAX_REWIND_MS) back. Round trips are
+# measured by pinging each player every GAME_PING_INTERVAL seconds.
+GAME_REWIND_HISTORY = 32
+GAME_MAX_REWIND_MS = 200
+GAME_PING_INTERVAL = 2
+
+# Dirty rooms are coalesced and written to Redis in one pipeline this often
+GAME_PERSIST_INTERVAL_MS = 100
+
+# Simulated rooms are snapshotted for crash recovery this often (seconds);
+# commands run in between are journaled. A restarted worker only finds its
+# rooms again if PONG_WORKER_ID is stable, as set by entrypoint.sh.
+GAME_SNAPSHOT_INTERVAL = 2
+
+# Finished matches are saved as replays in GAME_REPLAY_DIR. Recordings start
+# a new keyframe segment every GAME_REPLAY_KEYFRAME_INTERVAL seconds and keep
+# at most GAME_REPLAY_MAX_DURATION seconds, so a replay file is bounded in size;
+# files older than GAME_REPLAY_RETENTION_DAYS are pruned.
+GAME_REPLAY_ENABLED = os.getenv('GAME_REPLAY_ENABLED', 'true').lower() == 'true'
+GAME_REPLAY_DIR = os.getenv('GAME_REPLAY_DIR', str(BASE_DIR / 'replays'))
+GAME_REPLAY_KEYFRAME_INTERVAL = 2
+GAME_REPLAY_MAX_DURATION = 900
+GAME_REPLAY_RETENTION_DAYS = 14
+GAME_REPLAY_MAX_SPEED = 16
@@ -33,13 +33,14 @@ class PresenceConsumer(AsyncWebsocketConsumer):
         self.alive = True
 
         # set_user_status(self.user_id, PresenceStatus.ONLINE.value)
-        self.connection_id = presenceService.register_connection(self.user_id)
+        self.connection_id = await presenceService.register_connection(self.user_id)
         self.ping_task = asyncio.create_task(self.ping_loop())
 
 
     async def disconnect(self, close_code):
         self.alive = False
-        presenceService.remove_connection(self.user_id, self.connection_id)
+        if hasattr(self, 'connection_id'):
+            await presenceService.remove_connection(self.user_id, self.connection_id)
 
     async def receive(self, text_data):
         data = json.loads(text_data)
@@ -47,9 +48,9 @@ class PresenceConsumer(AsyncWebsocketConsumer):
         payload = data.get("eventData", {})
 
         if event == ReceiveEventType.PONG.value:
-            presenceService.ping_connection(self.user_id, self.connection_id)
+            await presenceService.ping_connection(self.user_id, self.connection_id)
 
     async def ping_loop(self):
-        while self.alive and presenceService.is_connection_valid(self.user_id, self.connection_id):
+        while self.alive and await presenceService.is_connection_valid(self.user_id, self.connection_id):
             await self.send(json.dumps(SendEventFactory.ping()))
             await asyncio.sleep(PING_INTERVAL)
@@ -0,0 +1,132 @@
+import logging
+from .models import Profile
+from .redis_client import redis_client, REDIS_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = 'leaderboard:rating'
+REBUILD_BATCH = 5000
+
+
+class Leaderboard:
+    """
+    Player ranking by Elo rating.
+
+    Profile.rating is the source of truth; every rating change is mirrored
+    into the leaderboard:rating sorted set (member user id, score rating) so
+    ranks, top pages and windows around a player are O(log n) lookups. Only
+    players with at least one game are ranked. The set is reloaded from the
+    database if Redis comes up empty; without Redis the same queries run
+    against the rating index.
+    """
+
+    _loaded = False
+
+    @classmethod
+    def update(cls, ratings):
+        """Mirror {user_id: rating} into the sorted set"""
+        if not REDIS_AVAILABLE:
+            return
+
+        try:
+            cls._ensure_loaded()
+            redis_client.zadd(LEADERBOARD_KEY, ratings)
+        except Exception as e:
+            logger.error(f"Error updating leaderboard: {str(e)}")
+
+    @classmethod
+    def total(cls):
+        if cls._use_redis():
+            return redis_client.zcard(LEADERBOARD_KEY)
+        return cls._ranked_profiles().count()
+
+    @classmethod
+    def rank(cls, user_id):
+        """1-based rank of a player, or None if they are not ranked"""
+        if cls._use_redis():
+            rank = redis_client.zrevrank(LEADERBOARD_KEY, user_id)
+            return None if rank is None else rank + 1
+
+        rating = cls._ranked_profiles().filter(user_id=user_id).values_list('rating', flat=True).first()
+        if rating is None:
+            return None
+        return cls._ranked_profiles().filter(rating__gt=rating).count() + 1
+
+    @classmethod
+    def page(cls, offset, limit):
+        """Up to limit (rank, user_id, rating) entries, starting at 0-based offset"""
+        if cls._use_redis():
+            entries = redis_client.zrevrange(LEADERBOARD_KEY, offset, offset + limit - 1, withscores=True)
+        else:
+            entries = cls._ranked_profiles().order_by('-rating', '-user_id').values_list('user_id', 'rating')[offset:offset + limit]
+
+        return [
+            (offset + index + 1, int(user_id), rating)
+            for index, (user_id, rating) in enumerate(entries)
+        ]
+
+    @classmethod
+    def around(cls, user_id, radius):
+        """The player's entry and up to radius entries on either side"""
+        rank = cls.rank(user_id)
+        if rank is None:
+            return []
+
+        offset = max(0, rank - 1 - radius)
+        return cls.page(offset, rank - offset + radius)
+
+    @classmethod
+    def rebuild(cls):
+        """Reload the sorted set from the ranked profiles' ratings, swapping it in atomically"""
+        if not REDIS_AVAILABLE:
+            return 0
+
+        staging_key = f"{LEADERBOARD_KEY}:rebuild"
+        redis_client.delete(staging_key)
+
+        count = 0
+        batch = {}
+        for user_id, rating in cls._ranked_profiles().values_list('user_id', 'rating').iterator(chunk_size=REBUILD_BATCH):
+            batch[user_id] = rating
+            if len(batch) >= REBUILD_BATCH:
+                redis_client.zadd(staging_key, batch)
+                count += len(batch)
+                batch = {}
+        if batch:
+            redis_client.zadd(staging_key, batch)
+            count += len(batch)
+
+        if count:
+            redis_client.rename(staging_key, LEADERBOARD_KEY)
+        else:
+            redis_client.delete(LEADERBOARD_KEY)
+
+        cls._loaded = True
+        logger.info(f"Leaderboard rebuilt with {count} players")
+        return count
+
+    @classmethod
+    def _use_redis(cls):
+        if not REDIS_AVAILABLE:
+            return False
+
+        try:
+            cls._ensure_loaded()
+            return True
+        except Exception as e:
+            logger.error(f"Leaderboard unavailable in Redis, using the database: {str(e)}")
+            return False
+
+    @classmethod
+    def _ensure_loaded(cls):
+        """Load the sorted set from the database the first time it is found empty"""
+        if cls._loaded:
+            return
+
+        if not redis_client.exists(LEADERBOARD_KEY) and cls._ranked_profiles().exists():
+            cls.rebuild()
+        cls._loaded = True
+
+    @classmethod
+    def _ranked_profiles(cls):
+        return Profile.objects.filter(stats__games_played__gt=0)
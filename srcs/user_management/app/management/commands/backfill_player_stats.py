@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from app.models import GameUserData, PlayerStats
+
+
+class Command(BaseCommand):
+	help = "Rebuild every player's PlayerStats from the recorded games"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000)
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+
+		# Points scored against the player: the other rows of the same game
+		against = (
+			GameUserData.objects
+			.filter(game=OuterRef('game'))
+			.exclude(user=OuterRef('user'))
+			.values('game')
+			.annotate(total=Sum('score'))
+			.values('total')
+		)
+
+		# Each player's games in the order they were played, with the opponent's score
+		rows = (
+			GameUserData.objects
+			.annotate(against=Coalesce(Subquery(against), Value(0)))
+			.order_by('user_id', 'game__date', 'game_id')
+			.values_list('user_id', 'game__date', 'score', 'against', 'is_winner')
+		)
+
+		with transaction.atomic():
+			# Games recorded while this runs wait for the swap, then update the new rows
+			if connection.vendor == 'postgresql':
+				with connection.cursor() as cursor:
+					cursor.execute(f'LOCK TABLE {PlayerStats._meta.db_table} IN EXCLUSIVE MODE')
+
+			stats = {}
+			for user_id, played_at, score, points_against, is_winner in rows.iterator(chunk_size=batch_size):
+				entry = stats.get(user_id)
+				if entry is None:
+					entry = stats[user_id] = PlayerStats(user_id=user_id)
+
+				entry.add_game(score, points_against, is_winner, played_at)
+
+			PlayerStats.objects.all().delete()
+			PlayerStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+
+		self.stdout.write(self.style.SUCCESS(f"Backfilled stats for {len(stats)} players"))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import Profile, GameUserData
+from app.rating import rate_game
+from app.leaderboard import Leaderboard
+
+
+class Command(BaseCommand):
+	help = "Recompute every rating by replaying GameHistory in date order, then reload the leaderboard"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000)
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+
+		rows = (
+			GameUserData.objects
+			.order_by('game__date', 'game_id', 'user_id')
+			.values_list('game_id', 'user_id', 'score')
+		)
+
+		ratings = {}
+		games_played = {}
+		current_game = None
+		players = []
+
+		def rate(game_players):
+			if len(game_players) != 2:
+				return
+			(user_1, score_1), (user_2, score_2) = game_players
+			ratings[user_1], ratings[user_2] = rate_game(
+				ratings.get(user_1, settings.ELO_DEFAULT_RATING), ratings.get(user_2, settings.ELO_DEFAULT_RATING),
+				score_1, score_2,
+				games_played.get(user_1, 0), games_played.get(user_2, 0)
+			)
+			games_played[user_1] = games_played.get(user_1, 0) + 1
+			games_played[user_2] = games_played.get(user_2, 0) + 1
+
+		for game_id, user_id, score in rows.iterator(chunk_size=batch_size):
+			if game_id != current_game:
+				rate(players)
+				current_game = game_id
+				players = []
+			players.append((user_id, score))
+		rate(players)
+
+		with transaction.atomic():
+			Profile.objects.update(rating=settings.ELO_DEFAULT_RATING)
+			profiles = [Profile(user_id=user_id, rating=rating) for user_id, rating in ratings.items()]
+			Profile.objects.bulk_update(profiles, ['rating'], batch_size=batch_size)
+
+		count = Leaderboard.rebuild()
+		self.stdout.write(self.style.SUCCESS(f"Rated {len(ratings)} players; {count} on the leaderboard"))
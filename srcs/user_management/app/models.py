@@ -1,4 +1,8 @@
 from django.db import models
+from django.conf import settings
+from django.db.models import F, Case, When, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 import os
@@ -19,6 +23,7 @@ class Profile(models.Model):
 	nickname = models.CharField(max_length=100, blank=True)
 	picture = models.ImageField(upload_to=upload_to, null=True, blank=True)
 	type = models.CharField(max_length=5, choices=USER_TYPE_CHOICES, default='PENG')
+	rating = models.FloatField(default=settings.ELO_DEFAULT_RATING, db_index=True)
 
 	def save(self, *args, **kwargs):
 		super().save(*args, **kwargs)
@@ -46,7 +51,9 @@ class Friendship(models.Model):
 
 class GameHistory(models.Model):
 	id = models.AutoField(primary_key=True)
-	date = models.DateTimeField(auto_now_add=True)
+	date = models.DateTimeField(default=timezone.now)
+	# Client-generated key of a batch-submitted result, so a retried submission is recorded once
+	idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
 	def __str__(self):
 		return f"Game {self.id} - {self.date}"
@@ -60,6 +67,74 @@ class GameUserData(models.Model):
 
 	class Meta:
 		unique_together = ('game', 'user')
+		indexes = [
+			# Covers a user's history: their rows, then the opponent's row of each game
+			models.Index(fields=['user', 'game'], include=['score', 'is_winner'], name='gameuserdata_user_game_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.user.nickname} - Game {self.game.id} - Score: {self.score}"
+
+
+class PlayerStats(models.Model):
+	"""
+	Running totals of a player's games, updated as each game is recorded.
+	current_streak counts consecutive wins when positive and consecutive
+	losses when negative; best_streak is the longest run of wins.
+	"""
+	user = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+	games_played = models.IntegerField(default=0)
+	wins = models.IntegerField(default=0)
+	points_for = models.IntegerField(default=0)
+	points_against = models.IntegerField(default=0)
+	current_streak = models.IntegerField(default=0)
+	best_streak = models.IntegerField(default=0)
+	last_played = models.DateTimeField(null=True, blank=True)
+
+	@property
+	def losses(self):
+		return self.games_played - self.wins
+
+	def add_game(self, points_for, points_against, is_winner, played_at):
+		"""Add one game to the totals in memory, as record_game does in the database"""
+		self.games_played += 1
+		self.points_for += points_for
+		self.points_against += points_against
+		self.last_played = played_at
+		if is_winner:
+			self.wins += 1
+			self.current_streak = self.current_streak + 1 if self.current_streak > 0 else 1
+			self.best_streak = max(self.best_streak, self.current_streak)
+		elif points_for == points_against:
+			self.current_streak = 0
+		else:
+			self.current_streak = self.current_streak - 1 if self.current_streak < 0 else -1
+
+	@classmethod
+	def record_game(cls, user, points_for, points_against, is_winner, played_at):
+		"""
+		Add one game to a player's totals in a single UPDATE, so concurrent
+		games of the same player cannot overwrite each other's counts.
+		"""
+		cls.objects.get_or_create(user=user)
+
+		if is_winner:
+			streak = Case(When(current_streak__gt=0, then=F('current_streak') + 1), default=Value(1))
+		elif points_for == points_against:
+			streak = Value(0)
+		else:
+			streak = Case(When(current_streak__lt=0, then=F('current_streak') - 1), default=Value(-1))
+
+		cls.objects.filter(user=user).update(
+			games_played=F('games_played') + 1,
+			wins=F('wins') + (1 if is_winner else 0),
+			points_for=F('points_for') + points_for,
+			points_against=F('points_against') + points_against,
+			current_streak=streak,
+			best_streak=Greatest(F('best_streak'), streak) if is_winner else F('best_streak'),
+			last_played=played_at,
+		)
+
+	def __str__(self):
+		return f"{self.user.nickname} - {self.wins}/{self.games_played} wins"
+
@@ -1,59 +1,185 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 import logging
+import time
+import uuid
+from app.redis_client import redis_client, async_redis_client, REDIS_AVAILABLE
+
+logger = logging.getLogger(__name__)
 
 EXPIRATION_THRESHOLD = timedelta(seconds=10)
 
+# Redis layout
+#
+#   presence:user:<id>   zset  connection id -> time its heartbeat expires
+#   presence:online      zset  user id -> latest expiry of any of their connections
+#
+# Expired entries are pruned by the scripts below whenever a user's
+# connections change, so a worker that dies without removing its
+# connections only leaves entries that already read as offline.
+ONLINE_KEY = "presence:online"
+
+# Adds or refreshes connection ARGV[2] of user ARGV[1] until ARGV[4], at time
+# ARGV[3]. With ARGV[5] == '1' only a live connection is refreshed.
+# Returns 1 if the connection is live afterwards.
+TOUCH_SCRIPT = """
+local now = tonumber(ARGV[3])
+if ARGV[5] == '1' then
+    local expiry = redis.call('ZSCORE', KEYS[1], ARGV[2])
+    if not expiry or tonumber(expiry) < now then
+        return 0
+    end
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. now)
+local latest = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+redis.call('PEXPIREAT', KEYS[1], math.ceil(tonumber(latest[2]) * 1000))
+redis.call('ZADD', KEYS[2], latest[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. now)
+return 1
+"""
+
+# Removes connection ARGV[2] of user ARGV[1] at time ARGV[3]
+REMOVE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[3])
+local latest = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #latest == 0 then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[2], latest[2], ARGV[1])
+end
+return 1
+"""
+
+
+def connections_key(userId):
+    return f"presence:user:{userId}"
+
 
 class PresenceService:
+    """
+    Which users have a live presence socket, shared by every worker.
+
+    Each socket is a connection with a random id whose heartbeat expires
+    EXPIRATION_THRESHOLD after its last pong. Connections are kept in Redis
+    and changed only through atomic scripts, so presence is the same on
+    every worker; without Redis it falls back to this worker's sockets.
+    Connection lifecycle methods are async, for the consumer; lookups are
+    sync, for views.
+    """
+
     def __init__(self):
         self.connection_store = {}
+        self._touch = None
+        self._remove = None
 
     def _get_current_time(self):
-        return datetime.now()
+        return time.time()
 
-    def register_connection(self, userId):
-        userConnections = self.connection_store.setdefault(userId, {}).setdefault("connections", {})
-        connectionId = len(userConnections) + 1
-        userConnections[connectionId] = {"last_seen": self._get_current_time()}
-        return connectionId
-
-    def ping_connection(self, userId, connectionId):
-        userConnections = self.connection_store.setdefault(userId, {}).setdefault("connections", {})
-        userConnections[connectionId] = {"last_seen": self._get_current_time()}
+    def _scripts(self):
+        if self._touch is None:
+            self._touch = async_redis_client.register_script(TOUCH_SCRIPT)
+            self._remove = async_redis_client.register_script(REMOVE_SCRIPT)
+        return self._touch, self._remove
 
-    def is_connection_valid(self, userId, connectionId):
-        user = self.connection_store.get(userId)
-        if not user or "connections" not in user:
-            return False
+    async def _touch_connection(self, userId, connectionId, existing_only):
+        now = self._get_current_time()
+        expiry = now + EXPIRATION_THRESHOLD.total_seconds()
+
+        if not REDIS_AVAILABLE:
+            connections = self.connection_store.setdefault(userId, {})
+            if existing_only and connections.get(connectionId, 0) < now:
+                return False
+            connections[connectionId] = expiry
+            return True
+
+        try:
+            touch, _ = self._scripts()
+            live = await touch(
+                keys=[connections_key(userId), ONLINE_KEY],
+                args=[userId, connectionId, now, expiry, 1 if existing_only else 0]
+            )
+        except Exception as e:
+            # A Redis outage should not drop the socket; it reads as offline until the next ping
+            logger.error(f"Error updating presence: {str(e)}")
+            return True
+
+        return bool(live)
+
+    async def register_connection(self, userId):
+        """Add a live connection for a user and return its id"""
+        connectionId = uuid.uuid4().hex
+        await self._touch_connection(userId, connectionId, existing_only=False)
+        return connectionId
 
-        connection = user["connections"].get(connectionId)
-        if not connection:
-            return False
+    async def ping_connection(self, userId, connectionId):
+        """
+        Extend a connection's heartbeat. Returns False if it had already
+        expired; a failed update counts as still valid.
+        """
+        return await self._touch_connection(userId, connectionId, existing_only=True)
 
+    async def is_connection_valid(self, userId, connectionId):
         now = self._get_current_time()
-        return now - connection["last_seen"] <= EXPIRATION_THRESHOLD
 
-    def is_user_connected(self, userId):
-        user = self.connection_store.get(userId)
-        if not user:
-            return False
+        if not REDIS_AVAILABLE:
+            return self.connection_store.get(userId, {}).get(connectionId, 0) >= now
+
+        try:
+            expiry = await async_redis_client.zscore(connections_key(userId), connectionId)
+        except Exception as e:
+            logger.error(f"Error reading presence: {str(e)}")
+            return True
+
+        return expiry is not None and expiry >= now
+
+    async def remove_connection(self, userId, connectionId):
+        if not REDIS_AVAILABLE:
+            connections = self.connection_store.get(userId)
+            if connections is not None:
+                connections.pop(connectionId, None)
+                if not connections:
+                    self.connection_store.pop(userId, None)
+            return
+
+        try:
+            _, remove = self._scripts()
+            await remove(
+                keys=[connections_key(userId), ONLINE_KEY],
+                args=[userId, connectionId, self._get_current_time()]
+            )
+        except Exception as e:
+            # The connection's heartbeat still expires on its own
+            logger.error(f"Error removing presence: {str(e)}")
+
+    def are_users_connected(self, userIds):
+        """{user id: whether they have a live connection}, in one round trip"""
+        userIds = list(userIds)
+        if not userIds:
+            return {}
 
         now = self._get_current_time()
-        for connection in user.get("connections", {}).values():
-            if now - connection["last_seen"] <= EXPIRATION_THRESHOLD:
-                return True
-        return False
-    
-    def remove_connection(self, userId, connectionId):
-        user = self.connection_store.get(userId)
-        if user and "connections" in user:
-            user["connections"].pop(connectionId, None)
-            if not user["connections"]:
-                self.connection_store.pop(userId, None)
-    
 
+        if not REDIS_AVAILABLE:
+            return {
+                userId: any(expiry >= now for expiry in self.connection_store.get(userId, {}).values())
+                for userId in userIds
+            }
 
+        try:
+            expiries = redis_client.zmscore(ONLINE_KEY, userIds)
+        except Exception as e:
+            logger.error(f"Error reading presence: {str(e)}")
+            return {userId: False for userId in userIds}
 
-presenceService = PresenceService()
+        return {
+            userId: expiry is not None and expiry >= now
+            for userId, expiry in zip(userIds, expiries)
+        }
+
+    def is_user_connected(self, userId):
+        return self.are_users_connected([userId])[userId]
 
 
+presenceService = PresenceService()
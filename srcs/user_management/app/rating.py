@@ -0,0 +1,33 @@
+from django.conf import settings
+
+
+def k_factor(games_played):
+    """How far one game can move a player's rating"""
+    if games_played < settings.ELO_PROVISIONAL_GAMES:
+        return settings.ELO_PROVISIONAL_K_FACTOR
+    return settings.ELO_K_FACTOR
+
+
+def expected_score(rating, opponent_rating):
+    """Probability, under Elo, that a player beats their opponent"""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def rate_game(rating_1, rating_2, score_1, score_2, games_1=0, games_2=0):
+    """
+    New ratings of both players after a game they scored score_1 and
+    score_2 in. games_1 and games_2 are the games each had played before.
+    """
+    if score_1 > score_2:
+        outcome = 1.0
+    elif score_1 < score_2:
+        outcome = 0.0
+    else:
+        outcome = 0.5
+
+    expected = expected_score(rating_1, rating_2)
+
+    return (
+        rating_1 + k_factor(games_1) * (outcome - expected),
+        rating_2 + k_factor(games_2) * (expected - outcome),
+    )
@@ -0,0 +1,28 @@
+import logging
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    redis_client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+    async_redis_client = aioredis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+    redis_client.ping()
+    REDIS_AVAILABLE = True
+    logger.info("Redis connection established")
+except Exception as e:
+    redis_client = None
+    async_redis_client = None
+    REDIS_AVAILABLE = False
+    logger.error(f"Redis connection failed: {str(e)}")
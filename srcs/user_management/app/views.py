@@ -6,7 +6,9 @@ from django.http import JsonResponse
 from .serializers import UserSerializer, GameHistorySerializer
 from django.contrib.auth.models import User
 from . import models
-from .models import Profile, Friendship, GameHistory, GameUserData
+from .models import Profile, Friendship, GameHistory, GameUserData, PlayerStats
+from .rating import rate_game
+from .leaderboard import Leaderboard
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 from django.shortcuts import get_object_or_404
@@ -22,6 +24,11 @@ from rest_framework_simplejwt.tokens import AccessToken
 import os
 from urllib.parse import urlencode
 from rest_framework.exceptions import ValidationError
+from django.db.models import Q, FilteredRelation
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 from .serializers import UserSerializer
 
@@ -29,6 +36,8 @@ from django.http import JsonResponse
 
 from app.presence_registry import presenceService
 
+HISTORY_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -155,6 +164,7 @@ def get_user_info(request):
 	user = request.user
 	image_url = API_URL + user.profile.picture.url if user.profile.picture and user.profile.picture.url else None
 	response = Response({
+		"id": user.id,
 		"nickname": user.username,
 		"avatar_url": image_url
 	})
@@ -227,11 +237,12 @@ def add_friend(request):
 
 	Friendship.objects.create(user=user_profile, friend=friend_profile)
 
-	friendships = Friendship.objects.filter(user=user_profile).select_related("friend")
+	friendships = list(Friendship.objects.filter(user=user_profile).select_related("friend"))
+	online = presenceService.are_users_connected(friendship.friend.user_id for friendship in friendships)
 	API_URL = os.getenv('API_URL')
 
 	friends_data = [
-		{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": presenceService.is_user_connected(friendship.friend.user.id)}
+		{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": online[friendship.friend.user_id]}
 		for friendship in friendships
 	]
 
@@ -256,10 +267,11 @@ def remove_friend(request):
 
 	if deleted:
 		API_URL = os.getenv('API_URL')
-		friendships = Friendship.objects.filter(user=user_profile).select_related("friend")
+		friendships = list(Friendship.objects.filter(user=user_profile).select_related("friend"))
+		online = presenceService.are_users_connected(friendship.friend.user_id for friendship in friendships)
 
 		friends_data = [
-			{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": presenceService.is_user_connected(friendship.friend.user.id)}
+			{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": online[friendship.friend.user_id]}
 			for friendship in friendships
 		]
 
@@ -276,10 +288,11 @@ def list_friends(request):
 
 	user_profile = request.user.profile
 
-	friendships = Friendship.objects.filter(user=user_profile).select_related("friend")
+	friendships = list(Friendship.objects.filter(user=user_profile).select_related("friend"))
+	online = presenceService.are_users_connected(friendship.friend.user_id for friendship in friendships)
 
 	friends_data = [
-		{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": presenceService.is_user_connected(friendship.friend.user.id)}
+		{"nickname": friendship.friend.nickname, "avatar_url": API_URL + friendship.friend.picture.url if friendship.friend.picture else None, "is_online": online[friendship.friend.user_id]}
 		for friendship in friendships
 	]
 
@@ -321,37 +334,323 @@ def create_game(request):
     player_1_wins = int(score_1) > int(score_2)
     player_2_wins = int(score_2) > int(score_1)
 
-    game_history = GameHistory.objects.create()
+    score_1 = int(score_1)
+    score_2 = int(score_2)
+
+    with transaction.atomic():
+        # Lock both profiles, in id order, so concurrent games of a player rate one after the other
+        locked = {profile.pk: profile for profile in Profile.objects.select_for_update().filter(pk__in=[player_1.pk, player_2.pk]).order_by('pk')}
+        player_1 = locked[player_1.pk]
+        player_2 = locked[player_2.pk]
+
+        games_played = dict(PlayerStats.objects.filter(user__in=[player_1, player_2]).values_list('user_id', 'games_played'))
+        player_1.rating, player_2.rating = rate_game(
+            player_1.rating, player_2.rating, score_1, score_2,
+            games_played.get(player_1.pk, 0), games_played.get(player_2.pk, 0)
+        )
+        Profile.objects.filter(pk=player_1.pk).update(rating=player_1.rating)
+        Profile.objects.filter(pk=player_2.pk).update(rating=player_2.rating)
+
+        game_history = GameHistory.objects.create()
 
-    GameUserData.objects.create(game=game_history, user=player_1, score=score_1, is_winner=player_1_wins)
-    GameUserData.objects.create(game=game_history, user=player_2, score=score_2, is_winner=player_2_wins)
+        GameUserData.objects.create(game=game_history, user=player_1, score=score_1, is_winner=player_1_wins)
+        GameUserData.objects.create(game=game_history, user=player_2, score=score_2, is_winner=player_2_wins)
+
+        PlayerStats.record_game(player_1, score_1, score_2, player_1_wins, game_history.date)
+        PlayerStats.record_game(player_2, score_2, score_1, player_2_wins, game_history.date)
+
+        ratings = {player_1.pk: player_1.rating, player_2.pk: player_2.rating}
+        transaction.on_commit(lambda: Leaderboard.update(ratings))
 
     return Response({
         "message": "Game recorded successfully.",
         "game": GameHistorySerializer(game_history).data
     }, status=status.HTTP_201_CREATED)
 
+def _parse_game_result(result):
+    """Validate one entry of a results batch. Returns (game, error)"""
+    if not isinstance(result, dict):
+        return None, "Result must be an object."
+
+    key = result.get('idempotency_key')
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        return None, "idempotency_key must be a string of 1 to 64 characters."
+
+    try:
+        game = {
+            'idempotency_key': key,
+            'player_1': int(result['player_1']),
+            'player_2': int(result['player_2']),
+            'score_1': int(result['score_1']),
+            'score_2': int(result['score_2']),
+        }
+    except (KeyError, ValueError, TypeError):
+        return None, "player_1, player_2, score_1 and score_2 must be integers."
+
+    if game['player_1'] == game['player_2']:
+        return None, "A user cannot play against themselves."
+
+    finished_at = result.get('finished_at')
+    try:
+        game['played_at'] = datetime.fromtimestamp(float(finished_at), tz=dt_timezone.utc) if finished_at is not None else timezone.now()
+    except (ValueError, TypeError, OverflowError, OSError):
+        return None, "finished_at must be a UNIX timestamp."
+
+    return game, None
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def create_games_batch(request):
+    """
+    Record many game results in one transaction. Each result carries a
+    client-generated idempotency_key; a result whose key is already recorded
+    is reported as a duplicate instead of being stored again, so a batch can
+    be retried safely after a timeout.
+    """
+    api_key = os.getenv('INTERNAL_API_TOKEN')
+
+    if api_key != request.headers.get('X-API-Key'):
+        return Response({"error": "Invalid API key"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    results = request.data.get('results')
+    if not isinstance(results, list) or not results:
+        return Response({"error": "results must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(results) > settings.GAME_RESULT_MAX_BATCH:
+        return Response({"error": f"At most {settings.GAME_RESULT_MAX_BATCH} results per batch."}, status=status.HTTP_400_BAD_REQUEST)
+
+    outcomes = []
+    games = []
+    for result in results:
+        game, error = _parse_game_result(result)
+        key = result.get('idempotency_key') if isinstance(result, dict) else None
+        outcome = {"idempotency_key": key, "status": "rejected", "error": error}
+        outcomes.append(outcome)
+        if game:
+            games.append((game, outcome))
+
+    player_ids = {game[field] for game, _ in games for field in ('player_1', 'player_2')}
+
+    with transaction.atomic():
+        # Same lock order as create_game, so ratings and stats are updated one game at a time
+        profiles = {profile.pk: profile for profile in Profile.objects.select_for_update().filter(pk__in=player_ids).order_by('pk')}
+        stats = {entry.pk: entry for entry in PlayerStats.objects.filter(user_id__in=profiles.keys())}
+        recorded = set(GameHistory.objects.filter(
+            idempotency_key__in=[game['idempotency_key'] for game, _ in games]
+        ).values_list('idempotency_key', flat=True))
+
+        new_games = []
+        for game, outcome in games:
+            if game['idempotency_key'] in recorded:
+                outcome.update(status="duplicate", error=None)
+            elif game['player_1'] not in profiles or game['player_2'] not in profiles:
+                outcome["error"] = "One or both users not found."
+            else:
+                recorded.add(game['idempotency_key'])
+                outcome.update(status="created", error=None)
+                new_games.append(game)
+
+        histories = GameHistory.objects.bulk_create([
+            GameHistory(date=game['played_at'], idempotency_key=game['idempotency_key']) for game in new_games
+        ])
+
+        rows = []
+        new_stats = {}
+        for game, history in zip(new_games, histories):
+            player_1 = profiles[game['player_1']]
+            player_2 = profiles[game['player_2']]
+            score_1 = game['score_1']
+            score_2 = game['score_2']
+
+            stats_1 = stats.get(player_1.pk) or new_stats.setdefault(player_1.pk, PlayerStats(user=player_1))
+            stats_2 = stats.get(player_2.pk) or new_stats.setdefault(player_2.pk, PlayerStats(user=player_2))
+
+            player_1.rating, player_2.rating = rate_game(
+                player_1.rating, player_2.rating, score_1, score_2, stats_1.games_played, stats_2.games_played
+            )
+            stats_1.add_game(score_1, score_2, score_1 > score_2, history.date)
+            stats_2.add_game(score_2, score_1, score_2 > score_1, history.date)
+
+            rows.append(GameUserData(game=history, user=player_1, score=score_1, is_winner=score_1 > score_2))
+            rows.append(GameUserData(game=history, user=player_2, score=score_2, is_winner=score_2 > score_1))
+
+        if rows:
+            GameUserData.objects.bulk_create(rows)
+
+            rated = {game[field] for game in new_games for field in ('player_1', 'player_2')}
+            Profile.objects.bulk_update([profiles[pk] for pk in rated], ['rating'])
+            PlayerStats.objects.bulk_update(
+                [entry for pk, entry in stats.items() if pk in rated],
+                ['games_played', 'wins', 'points_for', 'points_against', 'current_streak', 'best_streak', 'last_played']
+            )
+            PlayerStats.objects.bulk_create(new_stats.values())
+
+            ratings = {pk: profiles[pk].rating for pk in rated}
+            transaction.on_commit(lambda: Leaderboard.update(ratings))
+
+    return Response({"results": outcomes})
+
+def _encode_history_cursor(game_date, game_id):
+	"""Opaque keyset cursor for the (date, id) of the last game on a page"""
+	micros = (game_date - HISTORY_EPOCH) // timedelta(microseconds=1)
+	return f"{micros}.{game_id}"
+
+def _decode_history_cursor(cursor):
+	micros, game_id = cursor.split('.')
+	return HISTORY_EPOCH + timedelta(microseconds=int(micros)), int(game_id)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_game_history(request):
+	"""
+	The user's games, newest first, with the opponent of each game joined in
+	the same query. Paginated by keyset on (date, id): pass the returned
+	next_cursor as ?cursor= for the following page.
+	"""
 	user = request.user.profile
 
-	games = GameUserData.objects.filter(user=user).select_related('game', 'user')
+	try:
+		limit = min(int(request.query_params.get('limit', settings.GAME_HISTORY_PAGE_SIZE)), settings.GAME_HISTORY_MAX_PAGE_SIZE)
+	except ValueError:
+		return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+	if limit < 1:
+		return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+
+	# Opponents' rows, each joined to the user's own row of the same game
+	games = (
+		GameUserData.objects
+		.annotate(mine=FilteredRelation('game__players', condition=Q(game__players__user=user)))
+		.filter(mine__isnull=False)
+		.exclude(user=user)
+		.order_by('-game__date', '-game_id')
+	)
+
+	cursor = request.query_params.get('cursor')
+	if cursor:
+		try:
+			cursor_date, cursor_id = _decode_history_cursor(cursor)
+		except (ValueError, OverflowError):
+			return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+		games = games.filter(Q(game__date__lt=cursor_date) | Q(game__date=cursor_date, game_id__lt=cursor_id))
+
+	rows = list(games.values_list(
+		'game_id', 'game__date', 'mine__score', 'mine__is_winner', 'user__nickname', 'score'
+	)[:limit + 1])
+
+	next_cursor = None
+	if len(rows) > limit:
+		rows = rows[:limit]
+		next_cursor = _encode_history_cursor(rows[-1][1], rows[-1][0])
+
+	game_history = [
+		{
+			"game_id": game_id,
+			"game_date": game_date,
+			"PlayerA_nickname": user.nickname,
+			"PlayerA_score": score,
+			"PlayerA_isWinner": is_winner,
+			"PlayerB_nickname": opponent_nickname,
+			"PlayerB_score": opponent_score,
+		}
+		for game_id, game_date, score, is_winner, opponent_nickname, opponent_score in rows
+	]
 
-	game_history = []
+	return Response({"games": game_history, "next_cursor": next_cursor})
 
-	for game_data in games:
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_user_stats(request, user_id):
+	try:
+		profile = Profile.objects.select_related('stats').get(user_id=user_id)
+	except Profile.DoesNotExist:
+		return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
-		opponent_game_data = GameUserData.objects.filter(game=game_data.game).exclude(user=user).first()
+	try:
+		stats = profile.stats
+	except PlayerStats.DoesNotExist:
+		stats = PlayerStats(user=profile)
 
-		if opponent_game_data:
-			game_history.append({
-				"game_date": game_data.game.date,
-				"PlayerA_nickname": game_data.user.nickname,
-				"PlayerA_score": game_data.score,
-				"PlayerA_isWinner": game_data.is_winner,
-				"PlayerB_nickname": opponent_game_data.user.nickname,
-				"PlayerB_score": opponent_game_data.score,
-			})
+	return Response({
+		"user_id": user_id,
+		"games_played": stats.games_played,
+		"wins": stats.wins,
+		"losses": stats.losses,
+		"points_for": stats.points_for,
+		"points_against": stats.points_against,
+		"current_streak": stats.current_streak,
+		"best_streak": stats.best_streak,
+		"last_played": stats.last_played
+	})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_user_rating(request, user_id):
+    api_key = os.getenv('INTERNAL_API_TOKEN')
+
+    if api_key != request.headers.get('X-API-Key'):
+        return Response({"error": "Invalid API key"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        profile = Profile.objects.select_related('stats').get(user_id=user_id)
+    except Profile.DoesNotExist:
+        return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        stats = profile.stats
+    except PlayerStats.DoesNotExist:
+        stats = PlayerStats(user=profile)
+
+    return Response({
+        "user_id": user_id,
+        "games": stats.games_played,
+        "wins": stats.wins,
+        "rating": round(profile.rating)
+    })
 
-	return Response({"games": game_history})
\ No newline at end of file
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_leaderboard(request):
+	"""
+	Players ranked by rating. ?offset= and ?limit= page through the ranking;
+	?around=me (or a user id) returns the window of players around one
+	player instead. The requesting user's own rank is always included.
+	"""
+	around = request.query_params.get('around')
+
+	try:
+		if around:
+			user_id = request.user.id if around == 'me' else int(around)
+			radius = min(int(request.query_params.get('radius', settings.LEADERBOARD_AROUND_RADIUS)), settings.LEADERBOARD_MAX_PAGE_SIZE // 2)
+			if radius < 0:
+				raise ValueError
+			entries = Leaderboard.around(user_id, radius)
+		else:
+			offset = int(request.query_params.get('offset', 0))
+			limit = min(int(request.query_params.get('limit', settings.LEADERBOARD_PAGE_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+			if offset < 0 or limit < 1:
+				raise ValueError
+			entries = Leaderboard.page(offset, limit)
+	except ValueError:
+		return Response({"error": "Invalid leaderboard query"}, status=status.HTTP_400_BAD_REQUEST)
+
+	API_URL = os.getenv('API_URL')
+	profiles = Profile.objects.in_bulk([user_id for _, user_id, _ in entries])
+
+	players = []
+	for rank, user_id, rating in entries:
+		profile = profiles.get(user_id)
+		if profile is None:
+			continue
+		players.append({
+			"rank": rank,
+			"user_id": user_id,
+			"nickname": profile.nickname,
+			"avatar_url": API_URL + profile.picture.url if profile.picture else None,
+			"rating": round(rating)
+		})
+
+	return Response({
+		"players": players,
+		"total": Leaderboard.total(),
+		"my_rank": Leaderboard.rank(request.user.id),
+		"my_rating": round(request.user.profile.rating)
+	})
@@ -67,6 +67,10 @@ DATABASES = {
     }
 }
 
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_DB = 2
+
 AUTH_PASSWORD_VALIDATORS = [
 	{
 		'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -113,4 +117,25 @@ SIMPLE_JWT = {
 }
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Game history pages: default and largest number of games per request
+GAME_HISTORY_PAGE_SIZE = 20
+GAME_HISTORY_MAX_PAGE_SIZE = 100
+
+# Largest number of results accepted by one /api/game/add-batch/ request
+GAME_RESULT_MAX_BATCH = 500
+
+# Elo ratings: every profile starts at ELO_DEFAULT_RATING. Players with fewer
+# than ELO_PROVISIONAL_GAMES games move by ELO_PROVISIONAL_K_FACTOR per game,
+# established players by ELO_K_FACTOR.
+ELO_DEFAULT_RATING = 1000
+ELO_K_FACTOR = 24
+ELO_PROVISIONAL_K_FACTOR = 48
+ELO_PROVISIONAL_GAMES = 20
+
+# Leaderboard pages: default and largest number of players per request, and
+# how many players above and below are shown around a player
+LEADERBOARD_PAGE_SIZE = 20
+LEADERBOARD_MAX_PAGE_SIZE = 100
+LEADERBOARD_AROUND_RADIUS = 5
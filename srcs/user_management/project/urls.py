@@ -37,8 +37,14 @@ urlpatterns = [
 
 	# Game
 	path('api/game/add/', views.create_game),
+	path('api/game/add-batch/', views.create_games_batch),
+	path('api/users/<int:user_id>/rating/', views.get_user_rating),
+	path('api/users/<int:user_id>/stats/', views.get_user_stats),
 	path('api/game/list/', views.get_game_history),
 
+	# Leaderboard
+	path('api/leaderboard/', views.get_leaderboard),
+
 ]
 
 if settings.DEBUG: